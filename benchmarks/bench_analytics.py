@@ -0,0 +1,64 @@
+"""Analytics overview: first open, reopening, and reopening after an edit.
+
+For generated data (USERS users over YEARS years) it times building the
+overview of the current year with a new Analytics, which builds a
+YearStats per user per year, then with every YearStats kept, and then
+right after marking one day, which rebuilds a single one. The screen
+asks for exactly this overview when it opens.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import best_ms  # noqa: E402
+from datagen import write  # noqa: E402
+from comtrua import archive  # noqa: E402
+from comtrua.analytics import Analytics  # noqa: E402
+from comtrua.core import LunchApp  # noqa: E402
+from comtrua.storage import JournalStorage  # noqa: E402
+
+USERS = 300
+YEARS = 10
+RUNS = 5
+
+
+def main():
+    default = archive.ARCHIVE_AFTER_MONTHS
+    archive.ARCHIVE_AFTER_MONTHS = None
+    today = date.today()
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "data.json")
+        write(path, users=USERS, years=YEARS)
+        app = LunchApp(JournalStorage(path))
+        cold_ms = best_ms(lambda: Analytics(app).overview(today.year))
+        analytics = Analytics(app)
+        overview = analytics.overview(today.year)
+        warm_ms = best_ms(lambda: analytics.overview(today.year))
+        name = app.get_names()[0]
+        total = 0.0
+        for i in range(RUNS):
+            app.mark_attendance(name, f"{today.year}-01-{i % 28 + 1:02d}", i % 2 == 0)
+            start = time.perf_counter()
+            analytics.overview(today.year)
+            total += time.perf_counter() - start
+        app.close()
+    archive.ARCHIVE_AFTER_MONTHS = default
+    print(json.dumps({
+        "users": USERS,
+        "years": YEARS,
+        "runs": RUNS,
+        "year_stats": len(analytics),
+        "first_open_ms": cold_ms,
+        "reopen_ms": warm_ms,
+        "after_edit_ms": round(total / RUNS * 1000, 3),
+        "group_rate": round(overview.rate, 3),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Startup and save cost with closed months archived, as the years pile up.
+
+For 1, 5 and 10 years of generated data it times load_data and save_data
+with archiving off (everything in data.json) and on (closed months in
+data-archive/<year>.json.gz, already written by an earlier start), and
+the monthly report of the oldest January: the first call reads that
+year's archive, the second finds it in memory.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import best_ms  # noqa: E402
+from datagen import write  # noqa: E402
+from comtrua import archive  # noqa: E402
+from comtrua.core import LunchApp, monthly_report  # noqa: E402
+from comtrua.storage import JournalStorage  # noqa: E402
+
+USERS = 100
+YEARS = (1, 5, 10)
+RUNS = 5
+
+
+def run_case(workdir, source, archive_after):
+    archive.ARCHIVE_AFTER_MONTHS = archive_after
+    path = os.path.join(workdir, "data.json")
+    directory = archive.archive_dir(path)
+    for leftover in (path, os.path.join(workdir, "data.journal")):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    shutil.rmtree(directory, ignore_errors=True)
+    shutil.copy(source, path)
+    # The first start does the archiving; the timings are for later starts
+    LunchApp(JournalStorage(path)).close()
+
+    case = {"data_json_bytes": os.path.getsize(path)}
+    if os.path.isdir(directory):
+        case["archive_bytes"] = sum(
+            os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)
+        )
+    case["load_data_ms"] = best_ms(lambda: LunchApp(JournalStorage(path)).close(), RUNS)
+    app = LunchApp(JournalStorage(path))
+    case["save_data_ms"] = best_ms(app.save_data, RUNS)
+    oldest = min(app.data['attendance'].years())
+    # Only the first call reads the archive, so it is timed once
+    case["old_report_first_ms"] = best_ms(lambda: monthly_report(app, 1, oldest), runs=1)
+    case["old_report_cached_ms"] = best_ms(lambda: monthly_report(app, 1, oldest), RUNS)
+    app.close()
+    return case
+
+
+def main():
+    default = archive.ARCHIVE_AFTER_MONTHS
+    result = {"users": USERS, "today": date.today().isoformat(), "cases": []}
+    for years in YEARS:
+        with tempfile.TemporaryDirectory() as workdir:
+            source = os.path.join(workdir, "source.json")
+            write(source, users=USERS, years=years)
+            result["cases"].append({
+                "years": years,
+                "plain": run_case(workdir, source, None),
+                "archived": run_case(workdir, source, default),
+            })
+    archive.ARCHIVE_AFTER_MONTHS = default
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
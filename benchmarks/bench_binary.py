@@ -0,0 +1,89 @@
+"""Binary snapshot against data.json: file size and load time.
+
+For several data sizes it writes a ``current`` data.json with datagen,
+imports it into a BinaryStorage once, and then times, for both formats:
+starting the app, the first monthly report for one user right after
+starting, and reading every user's bitsets once (best of RUNS each).
+The binary format only decodes a user when it is read, so the first
+report and the full read are where the saving of its load shows up
+again; for data.json they are plain dict lookups.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import best_ms  # noqa: E402
+from datagen import write  # noqa: E402
+from comtrua import archive  # noqa: E402
+from comtrua.core import LunchApp  # noqa: E402
+from comtrua.storage import BinaryStorage, JournalStorage  # noqa: E402
+
+SIZES = ((20, 1), (100, 5), (300, 10))
+RUNS = 3
+
+
+def read_all(app):
+    """Read every user's bitsets, which decodes them all in data.bin"""
+    store = app.data['attendance']
+    for user_id in store:
+        store.bitsets(user_id)
+
+
+def measure(make_storage):
+    apps = []  # the app started last, closed before the next start
+
+    def close():
+        while apps:
+            apps.pop().close()
+
+    def start():
+        apps.append(LunchApp(make_storage()))
+
+    def restart():
+        close()
+        start()
+
+    year = time.localtime().tm_year
+    result = {
+        "load_ms": best_ms(start, RUNS, setup=close),
+        "first_report_ms": best_ms(
+            lambda: apps[-1].get_monthly_report(apps[-1].get_names()[0], 1, year),
+            RUNS, setup=restart,
+        ),
+        "read_all_ms": best_ms(lambda: read_all(apps[-1]), RUNS, setup=restart),
+    }
+    close()
+    return result
+
+
+def main():
+    # Compare whole histories, not just the months kept after archiving
+    default = archive.ARCHIVE_AFTER_MONTHS
+    archive.ARCHIVE_AFTER_MONTHS = None
+    result = {"runs": RUNS, "cases": []}
+    for users, years in SIZES:
+        with tempfile.TemporaryDirectory() as workdir:
+            json_path = os.path.join(workdir, "data.json")
+            bin_path = os.path.join(workdir, "data.bin")
+            write(json_path, users=users, years=years, layout="current")
+            # Rewritten by the app itself, so both files hold the same data
+            LunchApp(JournalStorage(json_path)).save_data()
+            LunchApp(BinaryStorage(bin_path, import_from=json_path)).close()
+            result["cases"].append({
+                "users": users,
+                "years": years,
+                "json_bytes": os.path.getsize(json_path),
+                "binary_bytes": os.path.getsize(bin_path),
+                "json": measure(lambda: JournalStorage(json_path)),
+                "binary": measure(lambda: BinaryStorage(bin_path, import_from=None)),
+            })
+    archive.ARCHIVE_AFTER_MONTHS = default
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compare the dict-of-dates attendance layout with per-year bitsets"""
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comtrua.attendance import AttendanceStore  # noqa: E402
+
+USERS = 200
+YEARS = 10
+DENSITY = 0.6
+
+
+def make_dict_layout(users=USERS, years=YEARS, density=DENSITY, seed=1):
+    """{name: {date_str: bool}} including explicit False entries"""
+    rng = random.Random(seed)
+    start = date(date.today().year - years + 1, 1, 1)
+    days = [(start + timedelta(days=i)).isoformat() for i in range(365 * years)]
+    return {
+        f"User {u}": {day: rng.random() < density for day in days}
+        for u in range(users)
+    }
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+
+def dict_month_count(user_data, month, year):
+    """The original get_monthly_report scan"""
+    prefix = f"{year}-{month:02d}"
+    return sum(1 for d, a in user_data.items() if d.startswith(prefix) and a)
+
+
+def time_reports(count_month, names, year):
+    start = time.perf_counter()
+    for month in range(1, 13):
+        for name in names:
+            count_month(name, month, year)
+    return (time.perf_counter() - start) / 12 * 1000
+
+
+def main():
+    attendance, dict_bytes = measure_memory(make_dict_layout)
+    store, store_bytes = measure_memory(lambda: AttendanceStore.from_dict(attendance))
+    names = list(attendance)
+    year = date.today().year - 1
+
+    dict_ms = time_reports(
+        lambda n, m, y: dict_month_count(attendance[n], m, y), names, year)
+    store_ms = time_reports(
+        lambda n, m, y: store.count_month(n, y, m), names, year)
+
+    for name in names:
+        for month in range(1, 13):
+            assert dict_month_count(attendance[name], month, year) == \
+                store.count_month(name, year, month)
+
+    print(json.dumps({
+        "users": USERS,
+        "years": YEARS,
+        "dict_memory_mb": round(dict_bytes / 2**20, 2),
+        "bitset_memory_mb": round(store_bytes / 2**20, 3),
+        "dict_month_report_ms": round(dict_ms, 2),
+        "bitset_month_report_ms": round(store_ms, 3),
+        "dict_json_mb": round(len(json.dumps(attendance)) / 2**20, 2),
+        "bitset_json_mb": round(len(json.dumps(store.to_json())) / 2**20, 3),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Cost of the diagnostics hooks, off and on.
+
+Times mark_attendance on an in-memory backend (so the hooks' own cost is
+not hidden behind disk writes) with diagnostics never enabled, enabled,
+and disabled again, plus a bare @timed function and span() while off.
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comtrua import diagnostics  # noqa: E402
+from comtrua.core import LunchApp  # noqa: E402
+from comtrua.storage import Storage, default_data  # noqa: E402
+
+CALLS = 100_000
+
+
+class MemoryStorage(Storage):
+    def load(self):
+        return default_data()
+
+    def save(self, data):
+        pass
+
+    def apply(self, record):
+        pass
+
+
+def per_call_ns(fn, calls=CALLS):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return round((time.perf_counter() - start) / calls * 1e9, 1)
+
+
+def main():
+    app = LunchApp(MemoryStorage())
+    mark = lambda: app.mark_attendance("Hưng", "2024-05-02", True)  # noqa: E731
+
+    def plain():
+        pass
+
+    timed_plain = diagnostics.timed("plain")(plain)
+
+    def with_span():
+        with diagnostics.span("block"):
+            pass
+
+    result = {"calls": CALLS}
+    result["mark_never_enabled_ns"] = per_call_ns(mark)
+    diagnostics.enable()
+    result["mark_enabled_ns"] = per_call_ns(mark)
+    diagnostics.disable()
+    result["mark_disabled_ns"] = per_call_ns(mark)
+    result["plain_call_ns"] = per_call_ns(plain)
+    result["timed_call_off_ns"] = per_call_ns(timed_plain)
+    result["span_off_ns"] = per_call_ns(with_span)
+    diagnostics.enable()
+    result["timed_call_on_ns"] = per_call_ns(timed_plain)
+    diagnostics.disable()
+    result["samples"] = diagnostics.timings()["LunchApp.mark_attendance"]["count"]
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Peak memory and time of streaming exports, 1 year vs 5 years of data.
+
+If exports stream, the peak stays flat as years (and rows) grow.
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_bitmap import make_dict_layout  # noqa: E402
+from comtrua.attendance import AttendanceStore  # noqa: E402
+from comtrua.core import LunchApp  # noqa: E402
+from comtrua.export import data_years, export  # noqa: E402
+from comtrua.storage import JsonStorage  # noqa: E402
+from comtrua.users import UserRegistry  # noqa: E402
+
+USERS = 500
+
+
+def make_app(workdir, years):
+    app = LunchApp(JsonStorage(os.path.join(workdir, f"data{years}.json")))
+    attendance = make_dict_layout(users=USERS, years=years)
+    users = app.data['settings']['users'] = UserRegistry.from_names(list(attendance))
+    app.data['attendance'] = AttendanceStore.from_dict(
+        {users.id_of(name): days for name, days in attendance.items()}
+    )
+    return app
+
+
+def measure(app, kind, path):
+    first, last = data_years(app)
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = export(app, kind, path, first, last)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rows": rows - 1,
+        "seconds": round(seconds, 2),
+        "peak_kb": round(peak / 1024),
+        "file_kb": round(os.path.getsize(path) / 1024),
+    }
+
+
+def main():
+    result = {"users": USERS}
+    with tempfile.TemporaryDirectory() as workdir:
+        for years in (1, 5):
+            app = make_app(workdir, years)
+            for kind in ("attendance", "monthly", "yearly"):
+                path = os.path.join(workdir, f"{kind}{years}.csv")
+                result[f"{kind}_{years}y"] = measure(app, kind, path)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Measure how long importing the headless core takes in a fresh interpreter"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 10
+
+
+def time_python(code):
+    """Median wall time of `python -c code` over RUNS runs, in milliseconds"""
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    baseline = time_python("pass")
+    core = time_python("import comtrua.core")
+    result = {
+        "interpreter_ms": round(baseline, 1),
+        "import_core_ms": round(core - baseline, 1),
+        "flet_loaded": subprocess.run(
+            [sys.executable, "-c",
+             "import sys, comtrua.core; print('flet' in sys.modules)"],
+            cwd=ROOT, check=True, capture_output=True, text=True,
+        ).stdout.strip() == "True",
+    }
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
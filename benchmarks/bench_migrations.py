@@ -0,0 +1,73 @@
+"""Schema migration cost per file layout, and startup once migrated.
+
+For 1 and 10 years of generated data (100 users) and each layout datagen
+writes, it loads the file once, which runs the steps from its version up
+to SCHEMA_VERSION, and reports each step's time as the migration report
+records it. It then times loading the migrated file, which should run no
+step and cost the same as loading a ``current`` file.
+"""
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import best_ms  # noqa: E402
+from datagen import LAYOUTS, write  # noqa: E402
+from comtrua import archive  # noqa: E402
+from comtrua.core import LunchApp  # noqa: E402
+from comtrua.storage import JournalStorage  # noqa: E402
+
+USERS = 100
+YEARS = (1, 10)
+RUNS = 3
+
+
+def measure(path):
+    """(first load ms, its migration report, best later load ms, steps those ran)"""
+    apps = []
+    steps = []
+
+    def start():
+        apps.append(LunchApp(JournalStorage(path)))
+
+    def close():
+        while apps:
+            app = apps.pop()
+            steps.append(app.storage.migrations)
+            app.close()
+
+    migrate_ms = best_ms(start, runs=1)
+    close()
+    report = steps.pop()
+    load_ms = best_ms(start, RUNS, setup=close)
+    close()
+    return migrate_ms, report, load_ms, max(len(s) for s in steps)
+
+
+def main():
+    # Archiving on the first start would be timed along with the migration
+    default = archive.ARCHIVE_AFTER_MONTHS
+    archive.ARCHIVE_AFTER_MONTHS = None
+    result = {"users": USERS, "runs": RUNS, "cases": []}
+    for years in YEARS:
+        with tempfile.TemporaryDirectory() as workdir:
+            for layout in LAYOUTS:
+                path = os.path.join(workdir, f"{layout}.json")
+                case = {"years": years, "layout": layout}
+                case["file_bytes"] = write(path, users=USERS, years=years, layout=layout)
+                migrate_ms, report, load_ms, steps_after = measure(path)
+                case["migrate_ms"] = migrate_ms
+                case["steps_ms"] = {
+                    f"v{step['version']}": round(step['seconds'] * 1000, 3) for step in report
+                }
+                case["load_migrated_ms"] = load_ms
+                case["steps_after"] = steps_after
+                result["cases"].append(case)
+    archive.ARCHIVE_AFTER_MONTHS = default
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
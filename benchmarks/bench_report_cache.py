@@ -0,0 +1,85 @@
+"""Monthly reports through ReportCache: cold, cached, and after an edit.
+
+For a generated year (USERS users) it times computing the twelve
+monthly reports of the current year cold, reading them back from the
+cache, and, after marking one day in March, reading January (still
+cached) and March (recomputed). Controls are left out: the UI caches its
+built rows the same way, on top of these numbers.
+"""
+import json
+import os
+import sys
+import tempfile
+from calendar import monthrange
+from datetime import date
+from itertools import count
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import best_ms  # noqa: E402
+from datagen import write  # noqa: E402
+from comtrua import archive  # noqa: E402
+from comtrua.core import LunchApp, monthly_report  # noqa: E402
+from comtrua.reports import ReportCache, report_key  # noqa: E402
+from comtrua.storage import JournalStorage  # noqa: E402
+
+USERS = 100
+YEARS = 2
+RUNS = 20
+
+
+def cached_report(app, cache, year, month):
+    start = date(year, month, 1)
+    end = date(year, month, monthrange(year, month)[1])
+    key, months = report_key(app, "month", start, end, app.get_names())
+    return cache.get_or_compute(key, months, lambda: monthly_report(app, month, year))
+
+
+def main():
+    default = archive.ARCHIVE_AFTER_MONTHS
+    archive.ARCHIVE_AFTER_MONTHS = None
+    year = date.today().year
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "data.json")
+        write(path, users=USERS, years=YEARS)
+        app = LunchApp(JournalStorage(path))
+
+        def cold():
+            cache = ReportCache(app)
+            for month in range(1, 13):
+                cached_report(app, cache, year, month)
+
+        cache = ReportCache(app)
+        cold_ms = best_ms(cold, RUNS)
+        for month in range(1, 13):
+            cached_report(app, cache, year, month)
+        warm_ms = best_ms(
+            lambda: [cached_report(app, cache, year, month) for month in range(1, 13)], RUNS
+        )
+        edits = count()
+
+        def edit_march():
+            cached_report(app, cache, year, 1)  # both months cached
+            cached_report(app, cache, year, 3)
+            i = next(edits)
+            app.mark_attendance(app.get_names()[0], f"{year}-03-{i % 28 + 1:02d}", i % 2 == 0)
+
+        edit_ms = {
+            label: best_ms(lambda: cached_report(app, cache, year, month), RUNS, setup=edit_march)
+            for label, month in (("january", 1), ("march", 3))
+        }
+        app.close()
+    archive.ARCHIVE_AFTER_MONTHS = default
+    print(json.dumps({
+        "users": USERS,
+        "runs": RUNS,
+        "twelve_months_cold_ms": cold_ms,
+        "twelve_months_cached_ms": warm_ms,
+        "after_march_edit_ms": edit_ms,
+        "hits": cache.hits,
+        "misses": cache.misses,
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Time a full-year range report for 200 users, NumPy and pure Python.
+
+The price changes every week to exercise cost splitting at price changes.
+"""
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_bitmap import make_dict_layout  # noqa: E402
+from bench_suite import best_ms  # noqa: E402
+from comtrua.attendance import AttendanceStore  # noqa: E402
+from comtrua.prices import FIRST_DATE, PriceHistory  # noqa: E402
+from comtrua.reports import np, range_report, year_range  # noqa: E402
+from comtrua.users import UserRegistry  # noqa: E402
+
+RUNS = 20
+
+
+class FakeApp:
+    """Just enough of LunchApp for range_report"""
+
+    def __init__(self, attendance, price_history):
+        self.names = list(attendance)
+        self.users = UserRegistry.from_names(self.names)
+        store = AttendanceStore.from_dict(attendance)
+        store.rekey({name: self.users.id_of(name) for name in self.names})
+        self.data = {'attendance': store}
+        self.prices = PriceHistory(price_history)
+
+    def get_names(self):
+        return self.names
+
+    def get_users(self):
+        return self.users
+
+    def get_prices(self):
+        return self.prices
+
+
+def weekly_prices(year):
+    history = [[FIRST_DATE, 40000]]
+    day = date(year, 1, 1)
+    for week in range(52):
+        history.append([(day + timedelta(weeks=week)).isoformat(), 40000 + 100 * week])
+    return history
+
+
+def main():
+    year = date.today().year - 1
+    app = FakeApp(make_dict_layout(users=200, years=2), weekly_prices(year))
+    start, end = year_range(year)
+    result = {
+        "users": len(app.names),
+        "price_changes": len(app.prices.dates) - 1,
+        "numpy_available": np is not None,
+    }
+    result["pure_python_ms"] = round(
+        best_ms(lambda: range_report(app, start, end, use_numpy=False), RUNS), 2)
+    if np is not None:
+        result["numpy_ms"] = round(
+            best_ms(lambda: range_report(app, start, end, use_numpy=True), RUNS), 2)
+        a = range_report(app, start, end, use_numpy=False)
+        b = range_report(app, start, end, use_numpy=True)
+        assert a.days == b.days and a.costs == b.costs
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Load test: many simulated web sessions marking attendance at once.
+
+Each session is a thread subscribed to one SharedLunchApp (as main.py
+does) that ticks random cells. Afterwards the data on disk must match the
+data in memory, and every session must have been told about every edit.
+The old model, one LunchApp with its own whole-file JsonStorage per
+session, runs a smaller interleaved load for comparison and counts the
+cells whose final tick it lost.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comtrua.core import LunchApp  # noqa: E402
+from comtrua.shared import SharedLunchApp  # noqa: E402
+from comtrua.storage import JournalStorage, JsonStorage  # noqa: E402
+
+SESSIONS = 50
+MARKS_PER_SESSION = 400
+USERS = 100
+DAYS = 30
+OLD_MODEL_SESSIONS = 8
+OLD_MODEL_MARKS = 25
+
+
+def session_edits(seed, count):
+    rng = random.Random(seed)
+    first = date.today() - timedelta(days=DAYS)
+    return [
+        (f"User {rng.randrange(USERS)}",
+         (first + timedelta(days=rng.randrange(DAYS))).isoformat(),
+         rng.random() < 0.5)
+        for _ in range(count)
+    ]
+
+
+def run_threads(target, count):
+    barrier = threading.Barrier(count)
+    threads = [
+        threading.Thread(target=target, args=(i, barrier)) for i in range(count)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def cells(data):
+    attendance = data['attendance']
+    return {name: sorted(attendance[name]) for name in attendance if len(attendance[name])}
+
+
+def shared_model(workdir):
+    path = os.path.join(workdir, "shared.json")
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+    app = SharedLunchApp(JournalStorage(path), loop=loop, watch_interval=0)
+    for i in range(USERS):
+        app.add_name(f"User {i}")
+
+    received = [0] * SESSIONS
+
+    def session(i, barrier):
+        def on_change(record, i=i):
+            received[i] += 1
+        app.subscribe(on_change)
+        barrier.wait()
+        for name, date_str, value in session_edits(i, MARKS_PER_SESSION):
+            app.mark_attendance(name, date_str, value)
+
+    # Every session subscribes before any of them starts marking
+    seconds = run_threads(session, SESSIONS)
+    app.close()
+    loop.call_soon_threadsafe(loop.stop)
+    loop_thread.join()
+    # close() already flushed; drop the idle flush task
+    tasks = asyncio.all_tasks(loop)
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    loop.close()
+
+    on_disk = JournalStorage(path).load()
+    marks = SESSIONS * MARKS_PER_SESSION
+    return {
+        "sessions": SESSIONS,
+        "marks": marks,
+        "seconds": round(seconds, 3),
+        "marks_per_second": round(marks / seconds),
+        "min_notifications_per_session": min(received),
+        "disk_matches_memory": cells(on_disk) == cells(app.data),
+    }
+
+
+def old_model(workdir):
+    path = os.path.join(workdir, "old.json")
+    setup = LunchApp(JsonStorage(path))
+    for i in range(USERS):
+        setup.add_name(f"User {i}")
+    apps = [LunchApp(JsonStorage(path)) for _ in range(OLD_MODEL_SESSIONS)]
+    edits = [session_edits(1000 + i, OLD_MODEL_MARKS) for i in range(OLD_MODEL_SESSIONS)]
+
+    # Sessions take turns; each one rewrites the file from its own copy
+    last = {}
+    start = time.perf_counter()
+    for step in range(OLD_MODEL_MARKS):
+        for app, session in zip(apps, edits):
+            name, date_str, value = session[step]
+            app.mark_attendance(name, date_str, value)
+            last[(name, date_str)] = value
+    seconds = time.perf_counter() - start
+
+    on_disk = JsonStorage(path).load()['attendance']
+    lost = sum(
+        1 for (name, date_str), value in last.items()
+        if bool(on_disk.get(name, {}).get(date_str, False)) != value
+    )
+    return {
+        "sessions": OLD_MODEL_SESSIONS,
+        "marks": OLD_MODEL_SESSIONS * OLD_MODEL_MARKS,
+        "seconds": round(seconds, 3),
+        "cells_lost": lost,
+    }
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        result = {
+            "shared": shared_model(workdir),
+            "per_session_app": old_model(workdir),
+        }
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Time LunchApp and the main screens on generated data of several sizes.
+
+    python benchmarks/bench_suite.py -o before.json
+    python benchmarks/bench_suite.py --compare before.json
+
+For every users x years case it writes data.json in each datagen layout
+and times load_data (with the migration for older layouts), then on the
+current layout save_data, mark_attendance, the monthly report and the
+attendance / report screens built by main.py on a Page with a fake
+connection. Output is one JSON document with the commit it ran on;
+--compare lines the timings up with an earlier run and exits 1 when any
+got slower than --threshold times.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datagen import LAYOUTS, write  # noqa: E402
+from comtrua.core import LunchApp, monthly_report  # noqa: E402
+from comtrua.shared import SharedLunchApp  # noqa: E402
+from comtrua.storage import JournalStorage  # noqa: E402
+
+try:
+    import flet as ft
+    from flet.messaging.connection import Connection
+    from flet.messaging.session import Session
+    from flet.pubsub.pubsub_hub import PubSubHub
+
+    import main as app_main
+except ImportError:
+    ft = None
+
+RUNS = 5
+MARKS = 50
+
+
+def best_ms(fn, runs=RUNS, setup=None):
+    best = float('inf')
+    for _ in range(runs):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def entry_count(app):
+    store = app.data['attendance']
+    return sum(len(store[name]) for name in store)
+
+
+def time_core(workdir, users, years, density):
+    """{layout: timings}; the app operations only run on the current layout"""
+    results = {}
+    for layout in LAYOUTS:
+        source = os.path.join(workdir, f"{layout}.json")
+        size = write(source, users=users, years=years, density=density, layout=layout)
+        path = os.path.join(workdir, "data.json")
+
+        def fresh_copy():
+            # Loading an old layout rewrites the file, so start from a copy
+            for leftover in (path, os.path.join(workdir, "data.journal")):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            shutil.copy(source, path)
+
+        case = {"file_bytes": size}
+        case["load_data_ms"] = best_ms(
+            lambda: LunchApp(JournalStorage(path)), setup=fresh_copy
+        )
+        if layout == "current":
+            fresh_copy()
+            app = LunchApp(JournalStorage(path))
+            case["entries"] = entry_count(app)
+            case["save_data_ms"] = best_ms(app.save_data)
+            names = app.get_names()
+            today = date.today().isoformat()
+            start = time.perf_counter()
+            for i in range(MARKS):
+                app.mark_attendance(names[i % len(names)], today, i % 2 == 0)
+            case["mark_attendance_ms"] = round(
+                (time.perf_counter() - start) * 1000 / MARKS, 3
+            )
+            case["monthly_report_ms"] = best_ms(
+                lambda: monthly_report(app, 1, date.today().year)
+            )
+            app.close()
+            if ft is not None:
+                case["screens"] = asyncio.run(time_screens(path))
+        results[layout] = case
+    return results
+
+
+if ft is not None:
+    class FakeConnection(Connection):
+        """Accepts the page's patches and drops them"""
+
+        def __init__(self, loop):
+            super().__init__()
+            self.loop = loop
+            self.executor = ThreadPoolExecutor()
+            self.pubsubhub = PubSubHub(loop=loop)
+
+        def send_message(self, message):
+            pass
+
+
+def make_page():
+    """A Page and its connection; the page only holds its session weakly"""
+    connection = FakeConnection(asyncio.get_running_loop())
+    session = Session(connection)
+    connection.session = session
+    session.get_page_patch()
+    return session.page, connection
+
+
+def find_button(control, label):
+    if getattr(control, 'content', None) == label and getattr(control, 'on_click', None):
+        return control
+    children = getattr(control, 'controls', None)
+    if not isinstance(children, list):
+        content = getattr(control, 'content', None)
+        children = [content] if hasattr(content, '_i') else []
+    for child in children:
+        found = find_button(child, label)
+        if found is not None:
+            return found
+    return None
+
+
+async def time_screens(path):
+    """First (build) and repeat timings of the attendance and report screens"""
+    apps = []
+
+    def open_app(loop=None):
+        apps.append(SharedLunchApp(JournalStorage(path), loop=loop, watch_interval=0))
+        return apps[-1]
+
+    page, connection = make_page()
+    app_main.get_shared_app = open_app
+    app_main.SPLASH_MIN_SECONDS = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        await app_main.main(page)
+        timings = {"startup_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+    def click(label):
+        find_button(page, label).on_click(None)
+
+    for key, label in (("show_attendance", "📝 Điểm danh"),
+                       ("show_report", "📊 Xem báo cáo tháng")):
+        start = time.perf_counter()
+        click(label)
+        timings[f"{key}_first_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        timings[f"{key}_ms"] = best_ms(lambda: click(label))
+    for app in apps:
+        app.close()
+    return timings
+
+
+def flatten(results):
+    """{'100x5/current/load_data_ms': 12.3, ...} for comparing runs"""
+    flat = {}
+    for case in results["cases"]:
+        prefix = f"{case['users']}x{case['years']}"
+        for layout, timings in case["layouts"].items():
+            for key, value in timings.items():
+                if isinstance(value, dict):
+                    for sub_key, sub_value in value.items():
+                        flat[f"{prefix}/{layout}/{key}.{sub_key}"] = sub_value
+                elif key.endswith("_ms"):
+                    flat[f"{prefix}/{layout}/{key}"] = value
+    return flat
+
+
+def compare(old, new, threshold):
+    old_flat, new_flat = flatten(old), flatten(new)
+    rows = {}
+    for key in sorted(old_flat.keys() & new_flat.keys()):
+        if old_flat[key]:
+            rows[key] = {
+                "old": old_flat[key],
+                "new": new_flat[key],
+                "ratio": round(new_flat[key] / old_flat[key], 3),
+            }
+    return {
+        "against": old.get("commit"),
+        "timings": rows,
+        "regressions": sorted(k for k, row in rows.items() if row["ratio"] > threshold),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--density", type=float, default=0.6)
+    parser.add_argument("-o", "--output", help="also write the results here")
+    parser.add_argument("--compare", help="an earlier results file")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "flet": getattr(ft, "__version__", None) if ft else None,
+        "density": args.density,
+        "cases": [],
+    }
+    for users in args.users:
+        for years in args.years:
+            with tempfile.TemporaryDirectory() as workdir:
+                results["cases"].append({
+                    "users": users,
+                    "years": years,
+                    "layouts": time_core(workdir, users, years, args.density),
+                })
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            results["comparison"] = compare(json.load(f), results, args.threshold)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False))
+    if args.compare and results["comparison"]["regressions"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
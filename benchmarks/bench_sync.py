@@ -0,0 +1,81 @@
+"""Time merging two years of attendance for 100 users between two devices.
+
+Device A has every cell tracked (each day edited through LunchApp), device
+B starts empty. Measures the first full merge, then a merge after a few
+edits on each side, which only exchanges the changed cells and never
+echoes back what came from the other device.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comtrua.core import LunchApp  # noqa: E402
+from comtrua.storage import JournalStorage  # noqa: E402
+from comtrua.sync import make_delta, merge, peer_state  # noqa: E402
+
+USERS = 100
+YEARS = 2
+DENSITY = 0.6
+
+
+def fill(app, seed=1):
+    """Mark every day of YEARS years, one write per day like the bulk UI"""
+    rng = random.Random(seed)
+    names = [f"User {u}" for u in range(USERS)]
+    first = date(date.today().year - YEARS + 1, 1, 1)
+    for i in range(365 * YEARS):
+        day = (first + timedelta(days=i)).isoformat()
+        ate = [name for name in names if rng.random() < DENSITY]
+        app.mark_many(ate, [day], True)
+    for name in names:
+        app.add_name(name)
+
+
+def timed_merge(source, target):
+    since = peer_state(target.data['sync'], source.data['sync']['device'])['seq']
+    start = time.perf_counter()
+    delta = make_delta(source.data, since, target.data['sync']['device'])
+    delta_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    audit = merge(target, delta)
+    target.flush()
+    merge_seconds = time.perf_counter() - start
+    return {
+        "cells": len(delta['cells']),
+        "delta_ms": round(delta_seconds * 1000, 1),
+        "merge_ms": round(merge_seconds * 1000, 1),
+        "conflicts": len(audit),
+    }
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        a = LunchApp(JournalStorage(os.path.join(workdir, "a.json")))
+        b = LunchApp(JournalStorage(os.path.join(workdir, "b.json")))
+        fill(a)
+        result = {"users": USERS, "years": YEARS}
+        result["first_merge"] = timed_merge(a, b)
+
+        today = date.today().isoformat()
+        a.mark_many([f"User {u}" for u in range(10)], [today], True)
+        b.mark_many([f"User {u}" for u in range(5, 15)], [today], False)
+        result["incremental_a_to_b"] = timed_merge(a, b)
+        result["incremental_b_to_a"] = timed_merge(b, a)
+        # Nothing left to send once both sides merged each other
+        result["idle_a_to_b"] = timed_merge(a, b)
+        result["converged"] = (
+            a.data['attendance'].to_json() == b.data['attendance'].to_json()
+        )
+        a.close()
+        b.close()
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Sync two devices through a local sync server and count the bytes sent.
+
+Device A holds two years of attendance for 100 users; device B starts
+empty. Both sync with a server on localhost, then A marks one day and
+syncs again. Bytes on the wire are compared with uploading the whole
+data.json (plain and gzipped). Finally a burst of edits on A goes out
+through BackgroundSync, which should batch it into a request or two.
+
+Exits with status 1, naming the failed checks under "failures", if the
+devices end up different, a one-day push is not a small fraction of the
+gzipped data.json, or the burst takes more than two requests.
+"""
+import asyncio
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_sync import USERS, YEARS, fill  # noqa: E402
+from comtrua.shared import SharedLunchApp  # noqa: E402
+from comtrua.storage import JournalStorage, write_snapshot  # noqa: E402
+from comtrua.sync_client import BackgroundSync, SyncClient  # noqa: E402
+from comtrua.sync_server import open_server_app, start_server  # noqa: E402
+
+BURST = 20
+# A one-day push may be at most this share of the gzipped data.json
+MAX_ONE_DAY_SHARE = 0.01
+MAX_BURST_REQUESTS = 2
+
+
+def whole_file_bytes(app, workdir):
+    """Size of data.json as a full upload would send it"""
+    path = os.path.join(workdir, "whole.json")
+    write_snapshot(app.data, path)
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return len(raw), len(gzip.compress(raw))
+
+
+def timed_sync(client):
+    start = time.perf_counter()
+    result = client.sync()
+    result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def background_burst(app, url, peer):
+    """Mark BURST cells one by one and count the requests that carry them"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    background = BackgroundSync(app, url, delay=0.3, interval=60)
+    calls = []
+    sync = background.client.sync
+    background.client.sync = lambda: calls.append(1) or sync()
+    background.start(loop)
+    day = date.today().replace(day=1).isoformat()
+    start = time.perf_counter()
+    for u in range(BURST):
+        app.mark_attendance(f"User {u}", day, False)
+    # Wait until the other device can pull every edit
+    while True:
+        time.sleep(0.05)
+        peer.sync()
+        if all(not peer.app.get_user_data(f"User {u}").get(day) for u in range(BURST)):
+            break
+    seconds = time.perf_counter() - start
+    background.stop()
+    # One more loop turn lets the cancelled task finish before the loop stops
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0.01), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+    return {"edits": BURST, "requests": len(calls), "seconds": round(seconds, 2)}
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_server(open_server_app(os.path.join(workdir, "server.json")))
+        a = SharedLunchApp(JournalStorage(os.path.join(workdir, "a.json")), watch_interval=0)
+        b = SharedLunchApp(JournalStorage(os.path.join(workdir, "b.json")), watch_interval=0)
+        fill(a)
+        client_a = SyncClient(a, server.url)
+        client_b = SyncClient(b, server.url)
+
+        result = {"users": USERS, "years": YEARS}
+        raw, compressed = whole_file_bytes(a, workdir)
+        result["whole_file_bytes"] = raw
+        result["whole_file_gzip_bytes"] = compressed
+        result["first_push"] = timed_sync(client_a)
+        result["first_pull"] = timed_sync(client_b)
+
+        today = date.today().isoformat()
+        a.mark_many([f"User {u}" for u in range(0, USERS, 3)], [today], True)
+        result["one_day_push"] = timed_sync(client_a)
+        result["one_day_pull"] = timed_sync(client_b)
+        result["idle"] = timed_sync(client_a)
+        result["one_day_bytes_vs_whole_file"] = round(
+            result["one_day_push"]["bytes_sent"] / raw, 5
+        )
+        result["background_burst"] = background_burst(a, server.url, client_b)
+        result["converged"] = (
+            a.data['attendance'].to_json() == b.data['attendance'].to_json()
+            and a.get_users().to_json() == b.get_users().to_json()
+        )
+        server.shutdown()
+        server.server_close()
+        for app in (a, b, server.app):
+            app.close()
+    result["failures"] = failures(result)
+    print(json.dumps(result))
+    if result["failures"]:
+        sys.exit(1)
+
+
+def failures(result):
+    """Names of the checks result fails"""
+    failed = []
+    if not result["converged"]:
+        failed.append("devices did not converge")
+    if result["first_push"]["bytes_sent"] > result["whole_file_gzip_bytes"]:
+        failed.append("first push larger than the gzipped data.json")
+    one_day = result["one_day_push"]["bytes_sent"]
+    if one_day > MAX_ONE_DAY_SHARE * result["whole_file_gzip_bytes"]:
+        failed.append(f"one-day push over {MAX_ONE_DAY_SHARE:.0%} of the gzipped data.json")
+    if result["one_day_pull"]["cells_received"] != result["one_day_push"]["cells_sent"]:
+        failed.append("one-day pull did not receive the cells pushed")
+    if result["background_burst"]["requests"] > MAX_BURST_REQUESTS:
+        failed.append(f"burst of {BURST} edits took over {MAX_BURST_REQUESTS} requests")
+    return failed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Rename and delete cost as history grows, and the one-off id migration.
+
+For 1 and 10 years of generated data (100 users) it times rename_name,
+delete_name and add_name (which brings the deleted user back) on a
+journaled app: each is one registry entry and one journal line, so the
+timings should not move with the years. It also times loading a file
+written before user ids, which runs the migration, against loading the
+migrated file.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datagen import write  # noqa: E402
+from comtrua import archive  # noqa: E402
+from comtrua.core import LunchApp  # noqa: E402
+from comtrua.storage import JournalStorage  # noqa: E402
+
+USERS = 100
+YEARS = (1, 10)
+RUNS = 50
+
+
+def per_call_ms(fn, runs=RUNS):
+    start = time.perf_counter()
+    for i in range(runs):
+        fn(i)
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def load_ms(workdir, source, runs=3):
+    """Best of runs, each from a fresh copy since loading migrates the file"""
+    path = os.path.join(workdir, "data.json")
+    best = float('inf')
+    for _ in range(runs):
+        for leftover in (path, os.path.join(workdir, "data.journal")):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        shutil.copy(source, path)
+        start = time.perf_counter()
+        LunchApp(JournalStorage(path)).close()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def main():
+    # Archiving would hide the migration cost of old years behind the gzip files
+    default = archive.ARCHIVE_AFTER_MONTHS
+    archive.ARCHIVE_AFTER_MONTHS = None
+    result = {"users": USERS, "runs": RUNS, "cases": []}
+    for years in YEARS:
+        with tempfile.TemporaryDirectory() as workdir:
+            case = {"years": years}
+            for layout in ("names", "current"):
+                source = os.path.join(workdir, f"{layout}.json")
+                write(source, users=USERS, years=years, layout=layout)
+                case[f"load_{layout}_ms"] = load_ms(workdir, source)
+            app = LunchApp(JournalStorage(os.path.join(workdir, "data.json")))
+            name = app.get_names()[0]
+            names = [name] + [f"{name} ({i})" for i in range(RUNS)]
+            case["rename_ms"] = round(
+                per_call_ms(lambda i: app.rename_name(names[i], names[i + 1])), 3
+            )
+            name = names[-1]
+            case["delete_restore_ms"] = round(
+                per_call_ms(lambda i: app.delete_name(name) and app.add_name(name)), 3
+            )
+            case["user_id_ns"] = round(per_call_ms(lambda i: app.user_id(name), 10000) * 1e6)
+            app.close()
+            result["cases"].append(case)
+    archive.ARCHIVE_AFTER_MONTHS = default
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
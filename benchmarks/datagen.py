@@ -0,0 +1,128 @@
+"""Generate realistic data.json files for benchmarks.
+
+    python benchmarks/datagen.py --users 50 --years 3 --layout legacy -o data.json
+
+Each user eats on a weekday with their own probability around ``density``
+and rarely at weekends; the price goes up once a year. ``layout`` picks
+one of the formats the app has written over time, so loading it also
+exercises the migration path:
+
+* ``current``: schema_version, a user registry, price history, bitset
+  attendance keyed by user id, sync state
+* ``names``: like ``current`` but keyed by name, before user ids
+* ``dates``: settings with a price history, {name: {date: true}} attendance
+* ``int-price``: like ``dates`` but a single int meal_price
+* ``legacy``: the original {name: {date: bool}} with no settings at all
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comtrua.attendance import AttendanceStore  # noqa: E402
+from comtrua.prices import FIRST_DATE  # noqa: E402
+from comtrua.storage import encode_data  # noqa: E402
+from comtrua.sync import new_sync_state  # noqa: E402
+from comtrua.users import UserRegistry  # noqa: E402
+
+LAYOUTS = ("current", "names", "dates", "int-price", "legacy")
+FAMILY = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Vũ", "Đặng", "Bùi", "Đỗ", "Hồ"]
+GIVEN = ["An", "Bình", "Dương", "Hưng", "Long", "Vinh", "Thảo", "Linh", "Đức", "Hà"]
+WEEKEND_DENSITY = 0.05
+
+
+def make_names(users):
+    return [
+        f"{FAMILY[u % len(FAMILY)]} {GIVEN[u // len(FAMILY) % len(GIVEN)]} {u + 1}"
+        for u in range(users)
+    ]
+
+
+def make_attendance(names, years, density, seed=1):
+    """{name: {date: bool}} for every day of the last ``years`` years"""
+    rng = random.Random(seed)
+    first = date(date.today().year - years + 1, 1, 1)
+    days = [first + timedelta(days=i) for i in range((date.today() - first).days + 1)]
+    attendance = {}
+    for name in names:
+        weekday_density = min(1.0, max(0.0, rng.gauss(density, 0.15)))
+        attendance[name] = {
+            day.isoformat(): rng.random() < (
+                weekday_density if day.weekday() < 5 else WEEKEND_DENSITY
+            )
+            for day in days
+        }
+    return attendance
+
+
+def make_prices(years):
+    first_year = date.today().year - years + 1
+    history = [[FIRST_DATE, 35000]]
+    for i, year in enumerate(range(first_year, date.today().year + 1)):
+        history.append([f"{year}-01-01", 35000 + 2500 * (i + 1)])
+    return history
+
+
+def generate(users=20, years=2, density=0.6, layout="current", seed=1):
+    """A data.json document (plain JSON types) in the given layout"""
+    if layout not in LAYOUTS:
+        raise ValueError(f"unknown layout {layout!r}, expected one of {LAYOUTS}")
+    names = make_names(users)
+    attendance = make_attendance(names, years, density, seed)
+    if layout == "legacy":
+        return attendance
+    marked = {
+        name: {day: True for day, ate in days.items() if ate}
+        for name, days in attendance.items()
+    }
+    prices = make_prices(years)
+    settings = {'names': names, 'meal_price': prices}
+    if layout == "int-price":
+        settings['meal_price'] = prices[-1][1]
+    if layout in ("dates", "int-price"):
+        return {'settings': settings, 'attendance': marked}
+    sync = new_sync_state()
+    if layout == "names":
+        sync['names'] = sync.pop('users')
+    else:
+        users = settings['users'] = UserRegistry.from_names(settings.pop('names'))
+        marked = {users.id_of(name): days for name, days in marked.items()}
+    encoded = encode_data({
+        'settings': settings,
+        'attendance': AttendanceStore.from_dict(marked),
+        'sync': sync,
+    })
+    if layout == "names":
+        del encoded['schema_version']
+    return encoded
+
+
+def write(path, **kwargs):
+    """Write generate(**kwargs) to path; returns the file size in bytes"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(generate(**kwargs), f, ensure_ascii=False)
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--density", type=float, default=0.6)
+    parser.add_argument("--layout", choices=LAYOUTS, default="current")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--output", default="data.json")
+    args = parser.parse_args()
+    size = write(
+        args.output, users=args.users, years=args.years, density=args.density,
+        layout=args.layout, seed=args.seed,
+    )
+    print(json.dumps({"path": args.output, "bytes": size}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Data layer for App Cơm Trưa"""
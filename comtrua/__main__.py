@@ -0,0 +1,186 @@
+"""Command line interface: python -m comtrua <command>"""
+import argparse
+import csv
+import json
+import sys
+from datetime import date
+
+from comtrua.core import LunchApp, date_range, monthly_report
+from comtrua.export import EXPORTS, export
+from comtrua.migrations import SCHEMA_VERSION
+from comtrua.storage import STORAGE_BACKENDS, open_storage
+from comtrua.sync_client import SYNC_URL, SyncClient
+from comtrua.sync_server import SERVER_DATA_FILE, SYNC_PORT, serve
+
+
+def iso_date(text):
+    """argparse type for YYYY-MM-DD dates"""
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{text}' is not a date YYYY-MM-DD") from None
+
+
+def cmd_names(app, args):
+    for name in app.get_names():
+        print(name)
+
+
+def cmd_rename(app, args):
+    if app.user_id(args.name) is None:
+        sys.exit(f"rename: không có tên '{args.name}'")
+    if not app.rename_name(args.name, args.new_name):
+        sys.exit(f"rename: tên '{args.new_name}' đã tồn tại")
+    print(f"{args.name} -> {args.new_name}")
+
+
+def cmd_mark(app, args):
+    start = args.date or date.today()
+    if args.to:
+        dates = date_range(start, args.to, args.weekdays)
+    else:
+        dates = [start.isoformat()]
+    names = list(app.get_names()) if args.all else args.names
+    if not names:
+        sys.exit("mark: give names or --all")
+    if not dates:
+        sys.exit("mark: --to is before --date")
+    # All names x dates go to disk as a single record
+    app.mark_many(names, dates, not args.absent)
+    state = "vắng" if args.absent else "có ăn"
+    period = dates[0] if len(dates) == 1 else f"{dates[0]}..{dates[-1]} ({len(dates)} ngày)"
+    print(f"{period}: {', '.join(names)} - {state}")
+
+
+def cmd_report(app, args):
+    today = date.today()
+    month = args.month or today.month
+    year = args.year or today.year
+    rows, total_all_users = monthly_report(app, month, year)
+    print(f"BÁO CÁO THÁNG {month}/{year}")
+    for name, days_attended, total_cost in rows:
+        print(f"{name}\t{days_attended} ngày\t{total_cost:,} VND")
+    print(f"TỔNG TẤT CẢ\t{total_all_users:,} VND")
+
+
+def cmd_export(app, args):
+    if args.kind != "json":
+        if args.output:
+            try:
+                count = export(app, args.kind, args.output, args.from_year, args.to_year)
+            except RuntimeError as e:
+                sys.exit(str(e))
+            print(f"{args.output}: {count - 1} dòng")
+        else:
+            rows = EXPORTS[args.kind](app, args.from_year, args.to_year)
+            csv.writer(sys.stdout).writerows(rows)
+        return
+    # Plain {user id: {date: true}} layout, readable without this package;
+    # settings.users gives each id's name
+    settings = dict(app.data['settings'], users=app.get_users().to_json())
+    data = dict(app.data, settings=settings, attendance=app.data['attendance'].to_dict())
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(data, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+def cmd_sync(app, args):
+    url = args.url or SYNC_URL
+    if not url:
+        sys.exit("sync: give the server URL")
+    try:
+        result = SyncClient(app, url).sync()
+    except (OSError, ValueError) as e:
+        sys.exit(f"sync: {e}")
+    print(
+        f"gửi {result['cells_sent']} ô ({result['bytes_sent']:,} byte), "
+        f"nhận {result['cells_received']} ô ({result['bytes_received']:,} byte), "
+        f"{result['conflicts']} xung đột"
+    )
+
+
+def cmd_migrate(app, args):
+    # Loading the app has already run any pending step
+    steps = app.storage.migrations
+    for step in steps:
+        print(f"v{step['version']}\t{step['description']}\t{step['seconds'] * 1000:.1f} ms")
+    if not steps:
+        print(f"dữ liệu đã ở phiên bản {SCHEMA_VERSION}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m comtrua")
+    parser.add_argument(
+        "--backend", choices=sorted(STORAGE_BACKENDS), default=None,
+        help="storage backend (default: the app's STORAGE_BACKEND)",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("names", help="list user names")
+    p.set_defaults(func=cmd_names)
+
+    p = sub.add_parser("rename", help="rename a user, keeping their attendance")
+    p.add_argument("name")
+    p.add_argument("new_name")
+    p.set_defaults(func=cmd_rename)
+
+    p = sub.add_parser("mark", help="mark attendance")
+    p.add_argument("names", nargs="*")
+    p.add_argument("--all", action="store_true", help="every user")
+    p.add_argument("--date", type=iso_date, help="YYYY-MM-DD (default: today)")
+    p.add_argument("--to", type=iso_date, help="last date YYYY-MM-DD, marks --date..--to")
+    p.add_argument("--weekdays", action="store_true", help="only Mon-Fri in the range")
+    p.add_argument("--absent", action="store_true", help="unmark instead")
+    p.set_defaults(func=cmd_mark)
+
+    p = sub.add_parser("report", help="print the monthly report")
+    p.add_argument("--month", type=int)
+    p.add_argument("--year", type=int)
+    p.set_defaults(func=cmd_report)
+
+    p = sub.add_parser("export", help="export all data as JSON, or a table as CSV/XLSX")
+    p.add_argument(
+        "--kind", choices=["json"] + sorted(EXPORTS), default="json",
+        help="json (everything) or a table: raw attendance, monthly or yearly report",
+    )
+    p.add_argument("-o", "--output", help="output file, .csv or .xlsx for tables (default: stdout)")
+    p.add_argument("--from-year", type=int, help="first year for tables")
+    p.add_argument("--to-year", type=int, help="last year for tables")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("sync", help="push and pull changes with a sync server once")
+    p.add_argument("url", nargs="?", help="server URL (default: SYNC_URL)")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("migrate", help="upgrade the data files and show the steps run")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("serve", help="run the sync server")
+    p.add_argument("--host", default="127.0.0.1",
+                   help="address to listen on; 0.0.0.0 for other devices (no authentication)")
+    p.add_argument("--port", type=int, default=SYNC_PORT)
+    p.add_argument("--data", default=SERVER_DATA_FILE, help="the server's own data file")
+    p.set_defaults(func=None)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "serve":
+        # The server keeps its own data, not this device's
+        serve(args.data, args.host, args.port)
+        return
+    storage = open_storage(args.backend) if args.backend else None
+    app = LunchApp(storage)
+    try:
+        args.func(app, args)
+    finally:
+        app.close()
+
+
+if __name__ == "__main__":
+    main()
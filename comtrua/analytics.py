@@ -0,0 +1,296 @@
+"""Attendance statistics: streaks, weekdays, participation and trends.
+
+Everything is derived from one YearStats per user per year, built from
+that year's bitset in a single pass: days eaten per month and per
+weekday, the working days (Monday to Friday) there were, and the runs of
+consecutive working days eaten. Streaks count working days only, so a
+weekend neither adds to nor breaks one, and today does not break a
+streak before it has been marked.
+
+For the runs, the working days of a year are lined up as one string of
+'0'/'1' without the weekends: the bitset is written out as binary, read
+back as hex so every day becomes a hex digit, and a per-year constant
+adds 2 to each weekend digit, which is then removed with str.replace.
+
+Analytics keeps each user's YearStats and streaks, with the
+app.data_version they were built at. An edit only makes the (user id,
+year) pairs it touched stale (app.changed_since), so after a day is
+marked the next overview rebuilds that one YearStats and that user's
+streaks, and adds up the rest again.
+"""
+import threading
+from datetime import date
+from functools import lru_cache
+
+from comtrua.attendance import month_bit_range
+
+
+@lru_cache(maxsize=64)
+def year_calendar(year):
+    """(days, weekday masks, month masks, working day mask, weekend digits)
+
+    weekday masks are the bits of each weekday, Monday first; weekend
+    digits is the int with hex digit 2 on every Saturday and Sunday, day 0
+    being the most significant digit.
+    """
+    days = date(year + 1, 1, 1).toordinal() - date(year, 1, 1).toordinal()
+    first = date(year, 1, 1).weekday()
+    weekday_masks = [0] * 7
+    for day in range(days):
+        weekday_masks[(first + day) % 7] |= 1 << day
+    month_masks = []
+    for month in range(1, 13):
+        start, end = month_bit_range(year, month)
+        month_masks.append(((1 << (end - start)) - 1) << start)
+    working = 0
+    for mask in weekday_masks[:5]:
+        working |= mask
+    weekend = int(''.join(
+        '2' if (first + day) % 7 >= 5 else '0' for day in range(days)
+    ), 16)
+    return days, weekday_masks, month_masks, working, weekend
+
+
+class YearStats:
+    """One user's numbers for one year, up to the last day counted
+
+    ``leading`` and ``trailing`` are the runs of working days eaten from
+    the start and up to the end of the counted days, ``longest`` the
+    longest run within them; ``full`` means no working day was missed.
+    """
+
+    __slots__ = ('months', 'weekdays', 'workdays', 'leading', 'trailing', 'longest', 'full')
+
+    def __init__(self, months, weekdays, workdays, leading, trailing, longest, full):
+        self.months = months
+        self.weekdays = weekdays
+        self.workdays = workdays
+        self.leading = leading
+        self.trailing = trailing
+        self.longest = longest
+        self.full = full
+
+    @property
+    def days(self):
+        return sum(self.months)
+
+    @property
+    def attended_workdays(self):
+        return sum(self.weekdays[:5])
+
+
+def year_stats(bits, year, last=None, open_day=False):
+    """YearStats of a year's bitset, counting days 0..last (default: all)
+
+    open_day: day ``last`` is today, so not having eaten yet is no miss.
+    """
+    days, weekday_masks, month_masks, working, weekend = year_calendar(year)
+    if last is None:
+        last = days - 1
+    bits &= (1 << (last + 1)) - 1
+    months = [(bits & mask).bit_count() for mask in month_masks]
+    weekdays = [(bits & mask).bit_count() for mask in weekday_masks]
+    # One digit per day, weekends turned into 2 and dropped
+    line = format(bits & working, f'0{days}b')[::-1]
+    line = format(int(line, 16) + weekend, f'0{days}x')[:last + 1].replace('2', '')
+    if open_day and line.endswith('0'):
+        line = line[:-1]
+    first_miss = line.find('0')
+    if first_miss < 0:
+        run = len(line)
+        return YearStats(months, weekdays, run, run, run, run, True)
+    # Runs are strings of '1' only, so the greatest is the longest
+    longest = len(max(line.split('0')))
+    trailing = len(line) - 1 - line.rfind('0')
+    return YearStats(months, weekdays, len(line), first_miss, trailing, longest, False)
+
+
+class PersonStats:
+    """A user's numbers on the analytics screen"""
+
+    __slots__ = ('days', 'workdays', 'attended_workdays', 'current_streak',
+                 'longest_streak', 'month', 'previous_month')
+
+    def __init__(self, days, workdays, attended_workdays, current_streak,
+                 longest_streak, month, previous_month):
+        self.days = days
+        self.workdays = workdays
+        self.attended_workdays = attended_workdays
+        self.current_streak = current_streak
+        self.longest_streak = longest_streak
+        self.month = month
+        self.previous_month = previous_month
+
+    @property
+    def rate(self):
+        """Share of the year's working days so far eaten, 0..1"""
+        return self.attended_workdays / self.workdays if self.workdays else 0.0
+
+
+class Overview:
+    """Statistics of one year for a list of users
+
+    ``people`` maps names to PersonStats; ``months`` and ``weekdays`` are
+    everyone's days per month and per weekday (Monday first). ``month``
+    is the month the per-person trend looks at, compared with the one
+    before it. Streaks run over all years up to today, not just ``year``.
+    """
+
+    def __init__(self, year, month, people, months, weekdays, workdays, attended_workdays):
+        self.year = year
+        self.month = month
+        self.people = people
+        self.names = list(people)
+        self.months = months
+        self.weekdays = weekdays
+        self.workdays = workdays
+        self.attended_workdays = attended_workdays
+
+    @property
+    def rate(self):
+        return self.attended_workdays / self.workdays if self.workdays else 0.0
+
+    @property
+    def days(self):
+        return sum(self.months)
+
+    def month_change(self, index):
+        """Change of month index (0 = January) against the month before, or None"""
+        if index == 0 or not self.months[index - 1]:
+            return None
+        return (self.months[index] - self.months[index - 1]) / self.months[index - 1]
+
+
+def year_span(year, today):
+    """(last, open_day) for year_stats: a past year whole, today's up to today
+
+    Only a working day can be open: on a weekend the last working day in
+    the line is Friday, whose miss counts.
+    """
+    if year < today.year:
+        return None, False
+    if year == today.year:
+        return today.timetuple().tm_yday - 1, today.weekday() < 5
+    return -1, False
+
+
+@lru_cache(maxsize=64)
+def empty_stats(year, today):
+    """YearStats of a year without attendance"""
+    return year_stats(0, year, *year_span(year, today))
+
+
+def streaks(years):
+    """(current, longest) working-day runs over consecutive years' YearStats"""
+    run = longest = 0
+    for stats in years:
+        if stats.full:
+            # The run goes on into the next year
+            run += stats.leading
+            continue
+        longest = max(longest, run + stats.leading, stats.longest)
+        run = stats.trailing
+    return run, max(longest, run)
+
+
+class UserStats:
+    """A user's YearStats from their first year up to today, and streaks"""
+
+    __slots__ = ('version', 'today', 'years', 'current_streak', 'longest_streak')
+
+    def __init__(self, version, today, years):
+        self.version = version
+        self.today = today
+        self.years = years
+        self.current_streak, self.longest_streak = streaks(years.values())
+
+    def year(self, year):
+        stats = self.years.get(year)
+        return stats if stats is not None else empty_stats(year, self.today)
+
+
+class Analytics:
+    """Builds Overviews from UserStats kept per user id
+
+    A user's entry is reused until one of its (user id, year)s is edited
+    or the day changes; then only the years edited (and the current one,
+    on a new day) get a new YearStats.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.hits = 0
+        self.misses = 0
+        self._users = {}  # user id -> UserStats
+        self._lock = threading.Lock()
+
+    def user_stats(self, user_id, today):
+        """The UserStats of user_id as of today"""
+        app = self.app
+        bitsets = app.data['attendance'].bitsets(user_id)
+        first = min((year for year in bitsets if year <= today.year), default=today.year)
+        wanted = range(first, today.year + 1)
+        entry = self._users.get(user_id)
+        if entry is not None:
+            keys = [(user_id, year) for year in wanted]
+            if (entry.today == today and len(entry.years) == len(wanted)
+                    and first in entry.years
+                    and not app.changed_since(entry.version, keys, users=False)):
+                self.hits += 1
+                return entry
+        self.misses += 1
+        # Taken first: an edit made while building makes it stale
+        version = app.data_version
+        years = {}
+        for year in wanted:
+            if (entry is not None and year in entry.years
+                    and not (year == today.year and entry.today != today)
+                    and not app.changed_since(entry.version, ((user_id, year),), users=False)):
+                years[year] = entry.years[year]
+            else:
+                years[year] = year_stats(bitsets.get(year, 0), year, *year_span(year, today))
+        entry = self._users[user_id] = UserStats(version, today, years)
+        return entry
+
+    def overview(self, year, names=None, today=None):
+        """Overview of year for names (default: every active user)"""
+        app = self.app
+        if names is None:
+            names = list(app.get_names())
+        if today is None:
+            today = date.today()
+        # Streaks read every year, archived ones included
+        app.data['attendance'].load_all()
+        month = today.month if year == today.year else 12
+        users = app.get_users()
+        people = {}
+        months = [0] * 12
+        weekdays = [0] * 7
+        workdays = attended_workdays = 0
+        with self._lock:
+            for name in names:
+                entry = self.user_stats(users.id_of(name), today)
+                stats = entry.year(year)
+                if month > 1:
+                    previous = stats.months[month - 2]
+                else:
+                    previous = entry.year(year - 1).months[11]
+                people[name] = PersonStats(
+                    stats.days, stats.workdays, stats.attended_workdays,
+                    entry.current_streak, entry.longest_streak,
+                    stats.months[month - 1], previous,
+                )
+                for i, count in enumerate(stats.months):
+                    months[i] += count
+                for i, count in enumerate(stats.weekdays):
+                    weekdays[i] += count
+                workdays += stats.workdays
+                attended_workdays += stats.attended_workdays
+        return Overview(year, month, people, months, weekdays, workdays, attended_workdays)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def __len__(self):
+        return len(self._users)
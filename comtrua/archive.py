@@ -0,0 +1,168 @@
+"""Closed months moved out of data.json into compressed per-year files.
+
+Months older than ARCHIVE_AFTER_MONTHS are written to
+``<data>-archive/<year>.json.gz`` (``data.bin-archive/`` for the binary
+snapshot), which holds the archived months of that year: attendance
+bitsets and the sync versions of their cells. data.json
+keeps the recent months plus the list of archived ones, so loading and
+saving it cost the same however many years have gone by.
+
+Archived years are read back lazily (AttendanceStore.load_years) the first
+time a report or an edit needs them, and then stay in memory.
+"""
+import gzip
+import json
+import os
+import shutil
+from datetime import date
+
+from comtrua.attendance import months_mask
+
+# Months before the current one kept in data.json; older ones are
+# archived. None turns archiving off.
+ARCHIVE_AFTER_MONTHS = 3
+
+
+def archive_dir(data_path):
+    """data-archive for data.json, <file>-archive for any other snapshot
+
+    so that a data.bin next to data.json keeps its own archives.
+    """
+    root, ext = os.path.splitext(data_path)
+    if ext == '.json':
+        return root + "-archive"
+    return data_path + "-archive"
+
+
+def year_path(directory, year):
+    return os.path.join(directory, f"{year}.json.gz")
+
+
+def first_hot_month(today=None, age=ARCHIVE_AFTER_MONTHS):
+    """(year, month) of the oldest month kept in data.json"""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - age
+    return index // 12, index % 12 + 1
+
+
+def read_year(directory, year):
+    """A year's archive as written by write_year, or None"""
+    path = year_path(directory, year)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_year(directory, year, payload):
+    """Atomically replace a year's archive file"""
+    os.makedirs(directory, exist_ok=True)
+    path = year_path(directory, year)
+    tmp_path = path + ".tmp"
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    with open(tmp_path, 'wb') as f:
+        f.write(gzip.compress(raw, mtime=0))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def copy_archives(source, target):
+    """Copy every year's archive file from directory source to target"""
+    if not os.path.isdir(source):
+        return
+    os.makedirs(target, exist_ok=True)
+    for name in os.listdir(source):
+        if name.endswith('.json.gz'):
+            shutil.copyfile(os.path.join(source, name), os.path.join(target, name))
+
+
+def attach(data, directory):
+    """Let data['attendance'] read archived years from directory"""
+    store = data['attendance']
+
+    def load_year(year):
+        payload = read_year(directory, year)
+        if payload is None:
+            return {}
+        archived = {f"{year:04d}-{month:02d}" for month in store.archived_months().get(year, [])}
+        if 'sync' in data:
+            cells = data['sync']['cells']
+            for name, days in payload['cells'].items():
+                user_cells = cells.setdefault(name, {})
+                for date_str, version in days.items():
+                    # A month edited since it was archived has newer versions
+                    if date_str[:7] in archived:
+                        user_cells.setdefault(date_str, version)
+        return {name: int(bits, 16) for name, bits in payload['attendance_bits'].items()}
+
+    store.attach_archive(load_year)
+
+
+def due_months(store, first_hot):
+    """{year: months} that are closed but still in data.json"""
+    hot_year, hot_month = first_hot
+    archived = store.archived_months()
+    due = {}
+    for year in store.years():
+        if year > hot_year:
+            continue
+        closed = range(1, 13) if year < hot_year else range(1, hot_month)
+        months = set(closed) - set(archived.get(year, ()))
+        if months:
+            due[year] = months
+    return due
+
+
+def archive_closed_months(data, directory, first_hot=None):
+    """Write closed months to their year's archive; returns how many moved
+
+    The caller saves data afterwards, which drops them from data.json.
+    """
+    store = data['attendance']
+    due = due_months(store, first_hot or first_hot_month())
+    state = data.get('sync')
+    for year, new_months in sorted(due.items()):
+        # The file is rewritten whole, with the months archived before
+        store.load_years((year,))
+        months = set(store.archived_months().get(year, ())) | new_months
+        mask = months_mask(year, months)
+        bits = {}
+        for name in list(store):
+            year_bits = store.bitsets(name).get(year, 0) & mask
+            if year_bits:
+                bits[name] = format(year_bits, 'x')
+        cells = {}
+        max_seq = 0
+        if state is not None:
+            keys = {f"{year:04d}-{month:02d}" for month in months}
+            for name, days in state['cells'].items():
+                kept = {d: v for d, v in days.items() if d[:7] in keys}
+                if kept:
+                    cells[name] = kept
+                    max_seq = max(max_seq, max(seq for _, seq in kept.values()))
+        write_year(directory, year, {
+            'year': year,
+            'months': sorted(months),
+            'attendance_bits': bits,
+            'cells': cells,
+        })
+        store.archive_months(year, new_months)
+        if state is not None:
+            state['archived_seq'] = max(state.get('archived_seq', 0), max_seq)
+    return sum(len(months) for months in due.values())
+
+
+def hot_sync_state(data):
+    """data['sync'] without the versions of archived cells, for data.json"""
+    state = data['sync']
+    archived = data['attendance'].archived_months()
+    if not archived:
+        return state
+    keys = {f"{year:04d}-{month:02d}" for year, months in archived.items() for month in months}
+    cells = {}
+    for name, days in list(state['cells'].items()):
+        kept = {d: v for d, v in list(days.items()) if d[:7] not in keys}
+        if kept:
+            cells[name] = kept
+    return dict(state, cells=cells)
@@ -0,0 +1,327 @@
+"""Compact attendance store: one bitset per user per year.
+
+Bit ``i`` of a year's integer is set when the user ate on day-of-year
+``i`` (0 = 1 January). Days without a set bit read as False, so absent
+days cost nothing. The store and its per-user views behave like the
+original ``{name: {"YYYY-MM-DD": bool}}`` dicts, keyed by user id (see
+comtrua.users) instead of by name.
+
+Closed months can live in archive files (see comtrua.archive). The store
+then knows which months are archived and reads a year back the first time
+something asks for it; editing an archived day makes its month hot again.
+"""
+from collections.abc import MutableMapping
+from datetime import date
+
+
+def parse_date_key(date_str):
+    """Split 'YYYY-MM-DD' into (year, day_of_year index)"""
+    year = int(date_str[:4])
+    day = date(year, int(date_str[5:7]), int(date_str[8:10]))
+    return year, day.toordinal() - date(year, 1, 1).toordinal()
+
+
+def month_bit_range(year, month):
+    """Bit range [start, end) covering a month in its year's bitset"""
+    first = date(year, 1, 1).toordinal()
+    start = date(year, month, 1).toordinal() - first
+    if month == 12:
+        end = date(year + 1, 1, 1).toordinal() - first
+    else:
+        end = date(year, month + 1, 1).toordinal() - first
+    return start, end
+
+
+def months_mask(year, months):
+    """Bits of a year's bitset covering the given months"""
+    mask = 0
+    for month in months:
+        start, end = month_bit_range(year, month)
+        mask |= ((1 << (end - start)) - 1) << start
+    return mask
+
+
+def count_bits(bits, start, end):
+    """Number of set bits in [start, end)"""
+    return ((bits >> start) & ((1 << (end - start)) - 1)).bit_count()
+
+
+class UserAttendance(MutableMapping):
+    """Dict-style view {date_str: True} over one user's yearly bitsets
+
+    ``store`` is only given when some months are archived, so that reads
+    load them and writes un-archive them.
+    """
+
+    __slots__ = ('_years', '_store')
+
+    def __init__(self, years, store=None):
+        self._years = years
+        self._store = store
+
+    def __getitem__(self, date_str):
+        year, index = parse_date_key(date_str)
+        if self._store is not None:
+            self._store.load_years((year,))
+        if (self._years.get(year, 0) >> index) & 1:
+            return True
+        raise KeyError(date_str)
+
+    def get(self, date_str, default=None):
+        year, index = parse_date_key(date_str)
+        if self._store is not None:
+            self._store.load_years((year,))
+        if (self._years.get(year, 0) >> index) & 1:
+            return True
+        return default
+
+    def __setitem__(self, date_str, attended):
+        year, index = parse_date_key(date_str)
+        if self._store is not None:
+            self._store.unarchive(year, 1 << index)
+        bits = self._years.get(year, 0)
+        if attended:
+            bits |= 1 << index
+        else:
+            bits &= ~(1 << index)
+        if bits:
+            self._years[year] = bits
+        else:
+            self._years.pop(year, None)
+
+    def __delitem__(self, date_str):
+        if self.get(date_str) is None:
+            raise KeyError(date_str)
+        self[date_str] = False
+
+    def __iter__(self):
+        if self._store is not None:
+            self._store.load_all()
+        for year in sorted(self._years):
+            first = date(year, 1, 1).toordinal()
+            bits = self._years[year]
+            while bits:
+                low = bits & -bits
+                yield date.fromordinal(first + low.bit_length() - 1).isoformat()
+                bits ^= low
+
+    def __len__(self):
+        if self._store is not None:
+            self._store.load_all()
+        return sum(bits.bit_count() for bits in self._years.values())
+
+    def count_month(self, year, month):
+        """Days attended in a month"""
+        if self._store is not None:
+            self._store.load_years((year,))
+        bits = self._years.get(year, 0)
+        if not bits:
+            return 0
+        start, end = month_bit_range(year, month)
+        return count_bits(bits, start, end)
+
+
+class AttendanceStore(MutableMapping):
+    """Mapping {user id: UserAttendance} backed by {user id: {year: int}}"""
+
+    def __init__(self, bits=None):
+        self._bits = bits if bits is not None else {}
+        # Archived months per year, the same as bit masks, the function
+        # reading a year's archive back and the years already read
+        self._archived = {}
+        self._archived_masks = {}
+        self._loader = None
+        self._loaded = set()
+
+    @classmethod
+    def from_dict(cls, attendance):
+        """Build from the {name: {date_str: bool}} layout"""
+        store = cls()
+        for name, days in attendance.items():
+            store[name] = days
+        return store
+
+    def to_dict(self):
+        """Expand to the {name: {date_str: True}} layout"""
+        self.load_all()
+        return {name: dict.fromkeys(self[name], True) for name in self._bits}
+
+    @classmethod
+    def from_json(cls, encoded):
+        """Decode {name: {"YYYY": hex}} as written by to_json"""
+        return cls({
+            name: {int(year): int(bits, 16) for year, bits in years.items()}
+            for name, years in encoded.items()
+        })
+
+    def hot_bits(self):
+        """Yield (name, {year: bits}) for the snapshot file
+
+        Archived months are left out; they are in their archive files.
+        """
+        masks = self._archived_masks
+        # list() copies in one step, so marks from other threads cannot
+        # resize the dict mid-iteration
+        for name, years in list(self._bits.items()):
+            hot = {}
+            for year, bits in sorted(years.items()):
+                if year in masks:
+                    bits &= ~masks[year]
+                if bits:
+                    hot[year] = bits
+            yield name, hot
+
+    def to_json(self):
+        """Encode hot_bits() as {name: {"YYYY": hex}}"""
+        return {
+            name: {str(year): format(bits, 'x') for year, bits in years.items()}
+            for name, years in self.hot_bits()
+        }
+
+    def __getitem__(self, name):
+        return UserAttendance(self._bits[name], self if self._archived_masks else None)
+
+    def __setitem__(self, name, days):
+        if isinstance(days, UserAttendance):
+            years = dict(days._years)
+        else:
+            years = {}
+            view = UserAttendance(years)
+            for date_str, attended in days.items():
+                if attended:
+                    view[date_str] = True
+        self._bits[name] = years
+
+    def setdefault(self, name, default=None):
+        if name not in self._bits:
+            self[name] = default or {}
+        return self[name]
+
+    def __delitem__(self, name):
+        del self._bits[name]
+
+    def __contains__(self, name):
+        return name in self._bits
+
+    def __iter__(self):
+        return iter(self._bits)
+
+    def __len__(self):
+        return len(self._bits)
+
+    def rekey(self, keys):
+        """Replace every key k by keys[k], e.g. names by user ids"""
+        self._bits = {keys[key]: years for key, years in self._bits.items()}
+
+    def years(self):
+        """Sorted years in which anyone attended, archived ones included"""
+        # A lazily decoded mapping (comtrua.binary) knows them without decoding
+        known = getattr(self._bits, 'years', None)
+        if known is not None:
+            years = known()
+        else:
+            years = {year for years in list(self._bits.values()) for year in years}
+        return sorted(years | self._archived.keys())
+
+    def bitsets(self, name):
+        """Raw {year: bits} for a user, empty if unknown
+
+        Archived years are only included once read with load_years().
+        """
+        return self._bits.get(name, {})
+
+    def attach_archive(self, loader):
+        """Set loader(year) -> {name: bits}, which reads a year's archive"""
+        self._loader = loader
+
+    def set_archived(self, months):
+        """Mark {year: [month, ...]} as living in the archive files"""
+        self._archived = {int(year): set(ms) for year, ms in months.items() if ms}
+        self._archived_masks = {
+            year: months_mask(year, ms) for year, ms in self._archived.items()
+        }
+
+    def archived_months(self):
+        """{year: sorted months} currently archived"""
+        return {year: sorted(months) for year, months in sorted(self._archived.items())}
+
+    def archive_months(self, year, months):
+        """Record that months of year were written to its archive
+
+        The bits stay in memory, so the year counts as already loaded.
+        """
+        self._archived.setdefault(year, set()).update(months)
+        self._archived_masks[year] = months_mask(year, self._archived[year])
+        self._loaded.add(year)
+
+    def load_years(self, years):
+        """Read the archives of any of these years not read yet"""
+        if not self._archived_masks:
+            return
+        for year in years:
+            if year in self._archived_masks and year not in self._loaded:
+                self._loaded.add(year)
+                if self._loader is None:
+                    continue
+                mask = self._archived_masks[year]
+                for name, bits in self._loader(year).items():
+                    years_bits = self._bits.setdefault(name, {})
+                    merged = years_bits.get(year, 0) | (bits & mask)
+                    if merged:
+                        years_bits[year] = merged
+
+    def load_all(self):
+        self.load_years(list(self._archived_masks))
+
+    def unarchive(self, year, mask):
+        """Make the months overlapping mask hot again before they are edited"""
+        archived = self._archived_masks.get(year, 0)
+        if not archived & mask:
+            return
+        self.load_years((year,))
+        months = self._archived[year]
+        for month in list(months):
+            if months_mask(year, (month,)) & mask:
+                months.discard(month)
+        if months:
+            self._archived_masks[year] = months_mask(year, months)
+        else:
+            del self._archived[year]
+            del self._archived_masks[year]
+
+    def mark_many(self, names, dates, attended):
+        """Set or clear every date for every name with one mask per year"""
+        masks = {}
+        for date_str in dates:
+            year, index = parse_date_key(date_str)
+            masks[year] = masks.get(year, 0) | (1 << index)
+        for year, mask in masks.items():
+            self.unarchive(year, mask)
+        for name in names:
+            years = self._bits.setdefault(name, {})
+            for year, mask in masks.items():
+                if attended:
+                    bits = years.get(year, 0) | mask
+                else:
+                    bits = years.get(year, 0) & ~mask
+                if bits:
+                    years[year] = bits
+                else:
+                    years.pop(year, None)
+
+    def month_bits(self, name, year, month):
+        """A user's month as an int, bit d - 1 set if they ate on day d"""
+        self.load_years((year,))
+        bits = self._bits.get(name, {}).get(year, 0)
+        if not bits:
+            return 0
+        start, end = month_bit_range(year, month)
+        return (bits >> start) & ((1 << (end - start)) - 1)
+
+    def count_month(self, name, year, month):
+        """Days a user attended in a month, by popcount over the month's bits"""
+        self.load_years((year,))
+        years = self._bits.get(name)
+        if not years:
+            return 0
+        return UserAttendance(years).count_month(year, month)
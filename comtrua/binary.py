@@ -0,0 +1,305 @@
+"""Packed binary snapshot, an alternative to data.json.
+
+Layout (little-endian):
+
+* header: magic ``CTRB``, FORMAT_VERSION, the schema version of the data
+  (see comtrua.migrations), counts and the offset of each section
+* string table: user ids and names, as offsets into one UTF-8 blob
+* user index: per user its id and name (string numbers), whether it is
+  active, deleted or only has attendance, and the offset of its block
+* attendance blocks: per user the years it has, each as the year's
+  bitset in the fewest bytes (see comtrua.attendance)
+* cell versions: (user, year, day, ts, seq) per sync cell
+* everything else (meal prices, the rest of the sync state, archived
+  months) as compact JSON
+
+The file is read into memory in one go and closed: loading decodes the
+header, strings, index and the small sections, and a user's block is only
+turned into ints the first time something reads that user. Nothing keeps
+the file open, so writing, which goes to a temporary file that replaces
+the old one, works on Windows too.
+"""
+import json
+import os
+import struct
+from collections.abc import MutableMapping
+from datetime import date
+
+from comtrua import archive, migrations
+from comtrua.attendance import AttendanceStore, parse_date_key
+from comtrua.diagnostics import span
+from comtrua.users import UserRegistry
+
+MAGIC = b'CTRB'
+FORMAT_VERSION = 1
+
+# magic, format version, schema version, users, strings, then the offsets
+# of the string table, index, cell versions and JSON sections
+HEADER = struct.Struct('<4sHHIIQQQQ')
+OFFSET = struct.Struct('<I')
+# id string, name string, state, block offset (0: no attendance)
+INDEX_ENTRY = struct.Struct('<IIBQ')
+YEAR_COUNT = struct.Struct('<H')
+YEAR_ENTRY = struct.Struct('<HH')  # year, bytes of bitset that follow
+CELL = struct.Struct('<IHHQI')  # user index, year, day of year, ts, seq
+
+DELETED, ACTIVE, UNLISTED = 0, 1, 2
+
+
+class UserBlocks(MutableMapping):
+    """{user id: {year: bits}} decoding each user's block on first use
+
+    Holds the file's bytes until every block has been decoded.
+    """
+
+    def __init__(self, view, offsets):
+        self._view = view
+        self._pending = len(offsets)
+        # A user's value is its block offset until decoded
+        self._data = offsets
+
+    def _decode(self, user_id, offset):
+        view = self._view
+        (count,) = YEAR_COUNT.unpack_from(view, offset)
+        offset += YEAR_COUNT.size
+        years = {}
+        for _ in range(count):
+            year, size = YEAR_ENTRY.unpack_from(view, offset)
+            offset += YEAR_ENTRY.size
+            years[year] = int.from_bytes(view[offset:offset + size], 'little')
+            offset += size
+        self._data[user_id] = years
+        self._settle()
+        return years
+
+    def _settle(self):
+        self._pending -= 1
+        if not self._pending:
+            self._view = None
+
+    def years(self):
+        """Years anyone has bits in; pending blocks only have their headers read"""
+        years = set()
+        view = self._view
+        for value in list(self._data.values()):
+            if not isinstance(value, int):
+                years.update(value)
+                continue
+            (count,) = YEAR_COUNT.unpack_from(view, value)
+            offset = value + YEAR_COUNT.size
+            for _ in range(count):
+                year, size = YEAR_ENTRY.unpack_from(view, offset)
+                years.add(year)
+                offset += YEAR_ENTRY.size + size
+        return years
+
+    def release(self):
+        """Decode anything left, which frees the file's bytes"""
+        for user_id, value in list(self._data.items()):
+            if isinstance(value, int):
+                self._decode(user_id, value)
+
+    def __getitem__(self, user_id):
+        value = self._data[user_id]
+        if isinstance(value, int):
+            value = self._decode(user_id, value)
+        return value
+
+    def __setitem__(self, user_id, years):
+        pending = isinstance(self._data.get(user_id), int)
+        self._data[user_id] = years
+        if pending:
+            self._settle()
+
+    def __delitem__(self, user_id):
+        if isinstance(self._data.pop(user_id), int):
+            self._settle()
+
+    def __contains__(self, user_id):
+        return user_id in self._data
+
+    def __iter__(self):
+        # A copy, so users added from other threads cannot break iteration
+        return iter(list(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+
+def encode(data):
+    """The binary snapshot of data, as bytes"""
+    settings = data['settings']
+    users = settings['users']
+    store = data['attendance']
+    state = data.get('sync')
+    cells = {}
+    meta = {key: value for key, value in data.items() if key not in ('attendance', 'sync')}
+    meta['settings'] = {key: value for key, value in settings.items() if key != 'users'}
+    archived = store.archived_months()
+    if archived:
+        meta['archive'] = {str(year): months for year, months in archived.items()}
+    if state is not None:
+        hot = archive.hot_sync_state(data) if archived else state
+        cells = hot['cells']
+        meta['sync'] = {key: value for key, value in hot.items() if key != 'cells'}
+
+    hot_bits = dict(store.hot_bits())
+    ids = list(dict.fromkeys([*users, *hot_bits, *cells]))
+    strings = {}
+    for user_id in ids:
+        strings.setdefault(user_id, len(strings))
+        strings.setdefault(users.name_of(user_id) or "", len(strings))
+
+    blocks = bytearray()
+    block_offsets = []
+    for user_id in ids:
+        years = hot_bits.get(user_id)
+        if years is None:
+            block_offsets.append(None)
+            continue
+        block_offsets.append(len(blocks))
+        blocks += YEAR_COUNT.pack(len(years))
+        for year, bits in years.items():
+            raw = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+            blocks += YEAR_ENTRY.pack(year, len(raw)) + raw
+
+    blob = bytearray()
+    string_offsets = bytearray()
+    for text in strings:
+        string_offsets += OFFSET.pack(len(blob))
+        blob += text.encode('utf-8')
+    string_offsets += OFFSET.pack(len(blob))
+    string_table = bytes(string_offsets + blob)
+
+    strings_offset = HEADER.size
+    index_offset = strings_offset + len(string_table)
+    blocks_offset = index_offset + INDEX_ENTRY.size * len(ids)
+    index = bytearray()
+    for user_id, offset in zip(ids, block_offsets):
+        if user_id not in users:
+            state_flag = UNLISTED
+        else:
+            state_flag = ACTIVE if users.is_active(user_id) else DELETED
+        index += INDEX_ENTRY.pack(
+            strings[user_id], strings[users.name_of(user_id) or ""], state_flag,
+            0 if offset is None else blocks_offset + offset,
+        )
+
+    user_numbers = {user_id: i for i, user_id in enumerate(ids)}
+    cell_rows = bytearray()
+    count = 0
+    for user_id, days in list(cells.items()):
+        number = user_numbers[user_id]
+        for date_str, (ts, seq) in list(days.items()):
+            year, day = parse_date_key(date_str)
+            cell_rows += CELL.pack(number, year, day, ts, seq)
+            count += 1
+    cells_section = OFFSET.pack(count) + cell_rows
+
+    cells_offset = blocks_offset + len(blocks)
+    meta_offset = cells_offset + len(cells_section)
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, migrations.SCHEMA_VERSION, len(ids), len(strings),
+        strings_offset, index_offset, cells_offset, meta_offset,
+    )
+    meta_bytes = json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return b''.join((header, string_table, index, blocks, cells_section, meta_bytes))
+
+
+def write_binary(data, path):
+    """Atomically replace the binary snapshot at path with data"""
+    tmp_path = path + ".tmp"
+    with span('binary.encode'):
+        raw = encode(data)
+    with span('disk.write'):
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def read_binary(path, journals=()):
+    """Read a binary snapshot; returns (data, migration report) like read_json"""
+    with open(path, 'rb') as f:
+        view = f.read()
+    with span('binary.decode'):
+        (magic, format_version, schema_version, user_count, string_count,
+         strings_offset, index_offset, cells_offset, meta_offset) = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary snapshot")
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f"{path} has binary format {format_version}, expected {FORMAT_VERSION}")
+
+        offsets = [
+            OFFSET.unpack_from(view, strings_offset + i * OFFSET.size)[0]
+            for i in range(string_count + 1)
+        ]
+        blob_start = strings_offset + OFFSET.size * (string_count + 1)
+        blob = view[blob_start:blob_start + offsets[-1]]
+        strings = [
+            blob[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])
+        ]
+
+        registry = {}
+        ids = []
+        block_offsets = {}
+        for id_string, name_string, state_flag, offset in INDEX_ENTRY.iter_unpack(
+            view[index_offset:index_offset + INDEX_ENTRY.size * user_count]
+        ):
+            user_id = strings[id_string]
+            ids.append(user_id)
+            if state_flag != UNLISTED:
+                registry[user_id] = {
+                    'name': strings[name_string], 'active': state_flag == ACTIVE,
+                }
+            if offset:
+                block_offsets[user_id] = offset
+
+        (count,) = OFFSET.unpack_from(view, cells_offset)
+        first = cells_offset + OFFSET.size
+        cells = {}
+        dates = {}
+        for number, year, day, ts, seq in CELL.iter_unpack(
+            view[first:first + CELL.size * count]
+        ):
+            date_str = dates.get((year, day))
+            if date_str is None:
+                date_str = dates[year, day] = date.fromordinal(
+                    date(year, 1, 1).toordinal() + day
+                ).isoformat()
+            cells.setdefault(ids[number], {})[date_str] = [ts, seq]
+
+        data = json.loads(view[meta_offset:].decode('utf-8'))
+
+    if schema_version != migrations.SCHEMA_VERSION:
+        # Older data goes through the same steps as a JSON snapshot
+        blocks = UserBlocks(view, block_offsets)
+        data['settings']['users'] = registry
+        data['attendance_bits'] = {
+            user_id: {str(year): format(bits, 'x') for year, bits in blocks[user_id].items()}
+            for user_id in blocks
+        }
+        blocks.release()
+        if 'sync' in data:
+            data['sync']['cells'] = cells
+        data['schema_version'] = schema_version
+        data, report = migrations.upgrade_snapshot(
+            data, migrations.SnapshotFiles(path, journals)
+        )
+        from comtrua.storage import decode_data
+
+        return decode_data(data, archive.archive_dir(path)), report
+
+    if block_offsets:
+        store = AttendanceStore(UserBlocks(view, block_offsets))
+    else:
+        store = AttendanceStore()
+    data['settings']['users'] = UserRegistry(registry)
+    data['attendance'] = store
+    if 'archive' in data:
+        store.set_archived(data.pop('archive'))
+    if 'sync' in data:
+        data['sync']['cells'] = cells
+    archive.attach(data, archive.archive_dir(path))
+    return data, []
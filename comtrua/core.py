@@ -0,0 +1,345 @@
+"""Data and reporting core of App Cơm Trưa (stdlib only, no Flet)"""
+from contextlib import nullcontext
+from datetime import date, timedelta
+from itertools import count
+
+from comtrua.attendance import UserAttendance, count_bits
+from comtrua.prices import PriceHistory
+from comtrua.storage import WriteBehindStorage, apply_record, open_storage
+from comtrua.sync import next_timestamp
+
+# Storage backend: "json", "journal", "binary" or "sqlite"
+STORAGE_BACKEND = "journal"
+# Queue edits in memory and flush them from an asyncio task (needs a loop)
+WRITE_BEHIND = True
+
+# Vietnamese day names
+WEEKDAYS_VN = {
+    0: "Thứ Hai",
+    1: "Thứ Ba",
+    2: "Thứ Tư",
+    3: "Thứ Năm",
+    4: "Thứ Sáu",
+    5: "Thứ Bảy",
+    6: "Chủ Nhật"
+}
+
+def format_date_with_weekday(date_obj):
+    """Format date as 'Thứ X, DD/MM/YYYY'"""
+    weekday_name = WEEKDAYS_VN[date_obj.weekday()]
+    date_str = date_obj.strftime("%d/%m/%Y")
+    return f"{weekday_name}, {date_str}"
+
+def date_range(start, end, weekdays_only=False):
+    """'YYYY-MM-DD' strings for start..end inclusive, optionally Mon-Fri only"""
+    dates = []
+    day = start
+    while day <= end:
+        if not weekdays_only or day.weekday() < 5:
+            dates.append(day.isoformat())
+        day += timedelta(days=1)
+    return dates
+
+def leaf_records(record):
+    """The plain edits inside a record, unpacking batches and merges"""
+    if record['op'] in ('batch', 'sync'):
+        for sub_record in record['records']:
+            yield from leaf_records(sub_record)
+        if record['op'] == 'sync':
+            yield record  # peers and audit live with the settings
+    else:
+        yield record
+
+def monthly_report(app, month, year):
+    """Rows of (name, days_attended, total_cost) for all users, plus the total"""
+    rows = []
+    total_all_users = 0
+    for name in app.get_names():
+        days_attended, total_cost = app.get_monthly_report(name, month, year)
+        rows.append((name, days_attended, total_cost))
+        total_all_users += total_cost
+    return rows, total_all_users
+
+class LunchApp:
+    def __init__(self, storage=None, loop=None):
+        storage = storage or open_storage(STORAGE_BACKEND)
+        if loop is not None and WRITE_BEHIND:
+            storage = WriteBehindStorage(storage, loop, data_lock=self.locked)
+        self.storage = storage
+        # Bumped by every edit; _changed holds the version of the last edit
+        # to each (year, month), each (user id, year) and the user list, so
+        # cached results can tell whether what they were computed from has
+        # changed.
+        # Versions come from one counter, so concurrent edits never share one
+        self._versions = count(1)
+        self.data_version = 0
+        self._changed = {}
+        self._loaded_version = 0
+        self.data = self.load_data()
+        self._prices = None
+        
+    def load_data(self):
+        """Load data from storage with migration support"""
+        data = self.storage.load()
+        # Roll months that closed since the last start into the archives
+        self.storage.archive_closed_months(data)
+        # Anything computed from the data before this load is stale
+        self._loaded_version = self.data_version = next(self._versions)
+        self._changed = {}
+        return data
+    
+    def save_data(self):
+        """Save all data to storage"""
+        self.storage.save(self.data)
+    
+    def flush(self):
+        """Force queued edits to disk"""
+        self.storage.flush()
+    
+    def close(self):
+        """Flush and release the storage backend"""
+        self.storage.close()
+    
+    def locked(self):
+        """Keep other threads from editing; single-threaded, so a no-op"""
+        return nullcontext()
+    
+    def _commit(self, record):
+        """Apply an edit in memory and persist it"""
+        if record['op'] != 'sync' and 'sync' in self.data:
+            # Merged deltas keep the timestamps they were made with
+            record['ts'] = next_timestamp(self.data['sync'])
+        apply_record(self.data, record)
+        if record['op'] in ('meal_price', 'sync'):
+            self._prices = None
+        self._note_edit(record)
+        self.storage.apply(record)
+    
+    def _note_edit(self, record):
+        """Bump data_version and the version of what record touched
+        
+        Marks note their (year, month)s and their (user id, year)s.
+        """
+        version = self.data_version = next(self._versions)
+        changed = self._changed
+        for leaf in leaf_records(record):
+            op = leaf['op']
+            if op == 'mark':
+                date_str = leaf['date']
+                changed[int(date_str[:4]), int(date_str[5:7])] = version
+                changed[leaf['user'], int(date_str[:4])] = version
+            elif op == 'mark_many':
+                years = set()
+                for date_str in leaf['dates']:
+                    changed[int(date_str[:4]), int(date_str[5:7])] = version
+                    years.add(int(date_str[:4]))
+                for user_id in leaf['users']:
+                    for year in years:
+                        changed[user_id, year] = version
+            elif op == 'user':
+                changed['users'] = version
+    
+    def changed_since(self, version, keys, users=True):
+        """True if any of keys, or the user list, was edited after version
+        
+        keys are (year, month) or (user id, year) pairs. users=False
+        ignores edits to the user list, for results kept per user id.
+        Price changes are not tracked here; results that depend on prices
+        should include them in their cache key.
+        """
+        if self._loaded_version > version:
+            return True
+        changed = self._changed
+        if users and changed.get('users', 0) > version:
+            return True
+        return any(changed.get(key, 0) > version for key in keys)
+    
+    def get_users(self):
+        """The UserRegistry: user ids, names and the name index"""
+        return self.data['settings']['users']
+    
+    def get_names(self):
+        """Get list of user names"""
+        return self.get_users().names()
+    
+    def user_id(self, name):
+        """Stable id of the user called name (deleted users too), or None"""
+        return self.get_users().id_of(name)
+    
+    def user_name(self, user_id):
+        """Current name of a user id, or None"""
+        return self.get_users().name_of(user_id)
+    
+    def _user_records(self, names):
+        """(ids, records registering unknown names as deleted users)
+        
+        Attendance can be marked for names not on the list; it is kept
+        under a deleted user and comes back if the name is added.
+        """
+        users = self.get_users()
+        ids = []
+        records = []
+        new = {}
+        for name in names:
+            user_id = users.id_of(name) or new.get(name)
+            if user_id is None:
+                user_id = new[name] = users.new_id(name)
+                records.append({'op': 'user', 'user': user_id, 'name': name, 'active': False})
+            ids.append(user_id)
+        return ids, records
+    
+    def _commit_with_users(self, record, user_records):
+        """Commit record, preceded by any user registrations, as one write"""
+        if user_records:
+            record = {'op': 'batch', 'records': user_records + [record]}
+        self._commit(record)
+    
+    def _name_taken(self, name):
+        user_id = self.user_id(name)
+        return user_id is not None and self.get_users().is_active(user_id)
+    
+    def add_name(self, name):
+        """Add a new user name; a deleted user of that name comes back"""
+        users = self.get_users()
+        if not name or self._name_taken(name):
+            return False
+        user_id = users.id_of(name) or users.new_id(name)
+        self._commit({'op': 'user', 'user': user_id, 'name': name, 'active': True})
+        return True
+    
+    def delete_name(self, name):
+        """Delete a user name (keeps attendance data)"""
+        users = self.get_users()
+        user_id = users.id_of(name)
+        if user_id is None or not users.is_active(user_id):
+            return False
+        self._commit({'op': 'user', 'user': user_id, 'name': name, 'active': False})
+        return True
+    
+    def rename_name(self, name, new_name):
+        """Rename a user; their attendance follows without being rewritten"""
+        users = self.get_users()
+        user_id = users.id_of(name)
+        if not new_name or user_id is None or self._name_taken(new_name):
+            return False
+        self._commit({
+            'op': 'user', 'user': user_id, 'name': new_name,
+            'active': users.is_active(user_id),
+        })
+        return True
+    
+    def get_price_history(self):
+        """Get [[effective_date, price], ...] sorted by date"""
+        return self.data['settings']['meal_price']
+    
+    def get_prices(self):
+        """Interval index over the price history"""
+        if self._prices is None:
+            self._prices = PriceHistory(self.get_price_history())
+        return self._prices
+    
+    def get_meal_price(self, date_str=None):
+        """Get meal price in effect on a date (default: today)"""
+        return self.get_prices().price_on(date_str or date.today().isoformat())
+    
+    def set_meal_price(self, price, effective_date=None):
+        """Set meal price from effective_date (default: today) onwards"""
+        try:
+            price_int = int(price)
+            if price_int > 0:
+                self._commit({
+                    'op': 'meal_price',
+                    'value': price_int,
+                    'from': effective_date or date.today().isoformat(),
+                })
+                return True
+        except ValueError:
+            pass
+        return False
+    
+    def get_user_data(self, name):
+        """Get a user's attendance as a {date_str: True} view"""
+        store = self.data['attendance']
+        user_id = self.user_id(name)
+        if user_id is None:
+            return UserAttendance({})
+        # A read adds no entry; months only in the archives are read first
+        view = store.get(user_id)
+        if view is None:
+            store.load_all()
+            view = store.get(user_id)
+        return view if view is not None else UserAttendance({})
+    
+    def mark_attendance(self, name, date_str, attended):
+        """Mark attendance for a specific date"""
+        (user_id,), user_records = self._user_records([name])
+        self._commit_with_users(
+            {'op': 'mark', 'user': user_id, 'date': date_str, 'value': attended},
+            user_records,
+        )
+    
+    def mark_many(self, names, dates, attended):
+        """Mark (or unmark) every name on every date as one write"""
+        names = list(names)
+        dates = list(dates)
+        if names and dates:
+            user_ids, user_records = self._user_records(names)
+            self._commit_with_users({
+                'op': 'mark_many',
+                'users': user_ids,
+                'dates': dates,
+                'value': bool(attended),
+            }, user_records)
+    
+    def copy_day(self, from_date, to_date, names=None):
+        """Make to_date match from_date for names (default: everyone), as one write"""
+        names = list(self.get_names() if names is None else names)
+        user_ids, user_records = self._user_records(names)
+        store = self.data['attendance']
+        ate = {i for i in user_ids if i in store and store[i].get(from_date)}
+        groups = (
+            (True, [i for i in user_ids if i in ate]),
+            (False, [i for i in user_ids if i not in ate]),
+        )
+        records = [
+            {'op': 'mark_many', 'users': group, 'dates': [to_date], 'value': value}
+            for value, group in groups
+            if group
+        ]
+        if records:
+            self._commit({'op': 'batch', 'records': user_records + records})
+        return [name for name, user_id in zip(names, user_ids) if user_id in ate]
+    
+    def get_month_grid(self, year, month, names=None):
+        """{name: month bits} for a users x days grid, bit d - 1 = day d"""
+        store = self.data['attendance']
+        users = self.get_users()
+        if names is None:
+            names = self.get_names()
+        return {
+            name: store.month_bits(users.id_of(name), year, month) for name in names
+        }
+    
+    def get_monthly_report(self, name, month, year):
+        """Generate monthly report for a user"""
+        # Popcount over the month's slice of the user's yearly bitset,
+        # split at price changes so each day is charged its own price
+        store = self.data['attendance']
+        store.load_years((year,))
+        bits = store.bitsets(self.user_id(name)).get(year, 0)
+        if not bits:
+            return 0, 0
+        jan1 = date(year, 1, 1)
+        month_start = date(year, month, 1)
+        if month == 12:
+            month_end = date(year, 12, 31)
+        else:
+            month_end = date(year, month + 1, 1) - timedelta(days=1)
+        
+        days_attended = 0
+        total_cost = 0
+        for first, last, price in self.get_prices().pieces(month_start, month_end):
+            days = count_bits(bits, (first - jan1).days, (last - jan1).days + 1)
+            days_attended += days
+            total_cost += days * price
+        return days_attended, total_cost
@@ -0,0 +1,224 @@
+"""Latency histograms for finding out what is slow on a given device.
+
+Hooks cover three layers, so a slow tap can be pinned on the disk, on
+JSON encoding or on page.update():
+
+* ``enable()`` wraps the public LunchApp methods and the storage backends'
+  load/save/apply in place; ``disable()`` puts the originals back, so the
+  app runs unwrapped code while diagnostics are off;
+* ``timed(name)`` decorates functions that can't be patched from outside,
+  like the screen handlers inside main(); off, it costs one flag check;
+* ``span(name)`` times a block, e.g. the JSON encoding and the fsync in
+  write_snapshot.
+
+Each name keeps a count and its last WINDOW samples, from which p50, p95
+and max are computed when asked. ``report(app)`` adds file sizes and
+entry counts and is what the hidden diagnostics screen shows and exports.
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+# Turn the hooks on at startup; the diagnostics screen can also switch them
+DIAGNOSTICS = False
+# Samples kept per name for the percentiles
+WINDOW = 512
+
+_enabled = False
+_histograms = {}
+_lock = threading.Lock()
+_patched = []  # (class, attribute, original) for disable()
+_null_span = nullcontext()
+
+
+class Histogram:
+    """Count of all samples, percentiles over the last ``window``"""
+
+    __slots__ = ('count', 'total', 'samples')
+
+    def __init__(self, window=WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {'count': self.count}
+
+        def percentile(p):
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3),
+            'p50_ms': round(percentile(0.50) * 1000, 3),
+            'p95_ms': round(percentile(0.95) * 1000, 3),
+            'max_ms': round(ordered[-1] * 1000, 3),
+        }
+
+
+def record(name, seconds):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(seconds)
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+
+
+def span(name):
+    """Context manager timing a block under ``name`` while enabled"""
+    return _Span(name) if _enabled else _null_span
+
+
+def _wrap(fn, name):
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def timed_coroutine(*args, **kwargs):
+            if not _enabled:
+                return await fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return timed_coroutine
+
+    @functools.wraps(fn)
+    def timed_call(*args, **kwargs):
+        if not _enabled:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+    return timed_call
+
+
+def timed(name):
+    """Decorator timing every call under ``name`` while enabled"""
+    return lambda fn: _wrap(fn, name)
+
+
+def _hooks():
+    """(class, method names) patched by enable()"""
+    from comtrua import storage
+    from comtrua.core import LunchApp
+    app_methods = [
+        'load_data', 'save_data', 'flush', 'add_name', 'delete_name', 'rename_name',
+        'set_meal_price', 'get_user_data', 'mark_attendance', 'mark_many',
+        'copy_day', 'get_month_grid', 'get_monthly_report', '_commit',
+    ]
+    storage_methods = ['load', 'save', 'apply', 'apply_many', 'flush']
+    return [(LunchApp, app_methods)] + [
+        (cls, storage_methods) for cls in (
+            storage.JsonStorage, storage.JournalStorage,
+            storage.SqliteStorage, storage.WriteBehindStorage,
+        )
+    ]
+
+
+def enable():
+    """Start timing; wraps LunchApp and storage methods in place"""
+    global _enabled
+    with _lock:
+        if _enabled:
+            return
+        for cls, methods in _hooks():
+            for attr in methods:
+                if attr in vars(cls):
+                    original = vars(cls)[attr]
+                    setattr(cls, attr, _wrap(original, f"{cls.__name__}.{attr}"))
+                    _patched.append((cls, attr, original))
+        _enabled = True
+
+
+def disable():
+    """Stop timing and restore the original methods; keeps the histograms"""
+    global _enabled
+    with _lock:
+        _enabled = False
+        while _patched:
+            cls, attr, original = _patched.pop()
+            setattr(cls, attr, original)
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def timings():
+    """{name: summary} sorted by name"""
+    with _lock:
+        return {name: _histograms[name].summary() for name in sorted(_histograms)}
+
+
+def data_stats(app):
+    """File sizes and entry counts behind an app"""
+    files = {}
+    for path in app.storage.files():
+        if os.path.exists(path):
+            files[path] = os.path.getsize(path)
+    with app.locked():
+        store = app.data['attendance']
+        entries = {
+            'users': len(app.get_names()),
+            'attendance_users': len(store),
+            # Counted from memory, so archived years not read yet are left out
+            'attendance_days': sum(
+                bits.bit_count() for name in list(store) for bits in store.bitsets(name).values()
+            ),
+            'archived_months': sum(len(m) for m in store.archived_months().values()),
+            'price_entries': len(app.get_price_history()),
+        }
+        if 'sync' in app.data:
+            entries['sync_cells'] = sum(len(c) for c in app.data['sync']['cells'].values())
+    return {'files': files, 'entries': entries}
+
+
+def report(app=None):
+    """Everything the diagnostics screen shows, as plain JSON types"""
+    result = {
+        'enabled': _enabled,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'timings': timings(),
+    }
+    if app is not None:
+        result.update(data_stats(app))
+    return result
+
+
+def export_json(path, app=None):
+    """Write report(app) to path"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report(app), f, ensure_ascii=False, indent=2)
+    return path
@@ -0,0 +1,129 @@
+"""Streaming CSV / XLSX export of attendance and reports.
+
+Every export is a generator of rows (header first) fed straight to a
+writer, so memory stays flat however many years are exported: raw
+attendance walks each user's bitsets day by day, monthly reports are one
+row per user per month, yearly reports one RangeReport per year.
+What a row reads is copied under app.locked() (a year at a time for the
+reports), and written out after the lock is let go, so a slow disk never
+holds up edits from other sessions.
+
+XLSX needs openpyxl (write-only mode); CSV is always available and is
+written as UTF-8 with a BOM so Excel shows Vietnamese names correctly.
+"""
+import csv
+from datetime import date
+
+from comtrua.attendance import UserAttendance
+from comtrua.reports import range_report, year_range
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+
+def data_years(app):
+    """(first, last) year with any attendance, or this year twice"""
+    with app.locked():
+        years = app.data['attendance'].years()
+    if not years:
+        this_year = date.today().year
+        return this_year, this_year
+    return years[0], years[-1]
+
+
+def attendance_rows(app, first_year=None, last_year=None):
+    """One row per (name, day eaten), oldest day first for each user"""
+    first, last = data_years(app)
+    first = first_year or first
+    last = last_year or last
+    yield ["Tên", "Ngày"]
+    store = app.data['attendance']
+    with app.locked():
+        # Only the years asked for are read, archived ones included
+        store.load_years(range(first, last + 1))
+        users = app.get_users()
+        snapshot = [
+            (users.name_of(user_id) or user_id, {
+                year: bits for year, bits in store.bitsets(user_id).items()
+                if first <= year <= last
+            })
+            for user_id in store
+        ]
+    for name, years in snapshot:
+        for date_str in UserAttendance(years):
+            yield [name, date_str]
+
+
+def monthly_rows(app, first_year=None, last_year=None):
+    """One row per user per month: days eaten and cost"""
+    first, last = data_years(app)
+    yield ["Năm", "Tháng", "Tên", "Số ngày ăn", "Tiền (VND)"]
+    for year in range(first_year or first, (last_year or last) + 1):
+        with app.locked():
+            rows = [
+                [year, month, name, *app.get_monthly_report(name, month, year)]
+                for month in range(1, 13)
+                for name in app.get_names()
+            ]
+        yield from rows
+
+
+def yearly_rows(app, first_year=None, last_year=None):
+    """One row per user per year with days per month and totals"""
+    first, last = data_years(app)
+    yield ["Năm", "Tên"] + [f"T{month}" for month in range(1, 13)] + [
+        "Số ngày ăn", "Tiền (VND)"
+    ]
+    for year in range(first_year or first, (last_year or last) + 1):
+        with app.locked():
+            report = range_report(app, *year_range(year))
+        for name, month_days, days, cost in report.rows():
+            yield [year, name] + list(month_days) + [days, cost]
+
+
+EXPORTS = {
+    'attendance': attendance_rows,
+    'monthly': monthly_rows,
+    'yearly': yearly_rows,
+}
+
+
+def write_csv(path, rows):
+    """Stream rows to a CSV file; returns the number of rows"""
+    count = 0
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_xlsx(path, rows, sheet_title="Dữ liệu"):
+    """Stream rows to a one-sheet XLSX file; returns the number of rows"""
+    if openpyxl is None:
+        raise RuntimeError("XLSX export needs openpyxl (pip install openpyxl)")
+    # Write-only workbooks stream rows to disk instead of keeping cells
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(path)
+    return count
+
+
+def export_formats():
+    """File extensions that can be written with what is installed"""
+    return ['csv', 'xlsx'] if openpyxl is not None else ['csv']
+
+
+def export(app, kind, path, first_year=None, last_year=None):
+    """Write an export to path (.csv or .xlsx); returns rows written, header included"""
+    rows = EXPORTS[kind](app, first_year, last_year)
+    if path.lower().endswith('.xlsx'):
+        return write_xlsx(path, rows)
+    return write_csv(path, rows)
@@ -0,0 +1,379 @@
+"""Versioned, one-time upgrades of the stored data.
+
+data.json carries ``schema_version`` and an SQLite database keeps it in
+``PRAGMA user_version``. Loading data at SCHEMA_VERSION costs one
+comparison; older data goes through every registered step above its
+version, in order, each exactly once, and is then written back at the
+current version.
+
+A snapshot step takes the parsed JSON (plain dicts and lists) and
+converts it in place, user by user, so the old and new layouts are not
+both held in full. Steps that also touch other files (journals, archived
+years) rewrite them line by line or year by year, each atomically, and
+leave a rewritten file recognisable, so a step interrupted halfway can
+simply run again. The snapshot itself is written last, by the caller.
+
+Files written before schema_version existed run every step; such steps
+check whether their change is still needed.
+
+Every step run is timed: the report goes into the diagnostics
+histograms (``migrate.<target>.v<version>``) and is kept on the storage
+backend as ``migrations``.
+"""
+import json
+import os
+import time
+
+from comtrua import archive
+from comtrua.attendance import parse_date_key
+from comtrua.diagnostics import record as record_timing
+from comtrua.prices import normalize_price_setting
+from comtrua.sync import new_sync_state
+from comtrua.users import UserRegistry
+
+SCHEMA_VERSION = 5
+
+
+class Migration:
+    """One registered step, bringing ``target`` data up to ``version``"""
+
+    def __init__(self, target, version, description, upgrade):
+        self.target = target
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+
+
+MIGRATIONS = []
+
+
+def migration(target, version, description):
+    """Register the decorated function as the step to ``version``"""
+    def register(upgrade):
+        MIGRATIONS.append(Migration(target, version, description, upgrade))
+        MIGRATIONS.sort(key=lambda m: (m.target, m.version))
+        return upgrade
+    return register
+
+
+def pending(target, version):
+    """Steps still to run for ``target`` data at ``version``, in order"""
+    return [m for m in MIGRATIONS if m.target == target and m.version > version]
+
+
+def _run(step, *args):
+    start = time.perf_counter()
+    result = step.upgrade(*args)
+    seconds = time.perf_counter() - start
+    record_timing(f"migrate.{step.target}.v{step.version}", seconds)
+    return result, {
+        'version': step.version,
+        'description': step.description,
+        'seconds': seconds,
+    }
+
+
+def check_version(version, what):
+    if version > SCHEMA_VERSION:
+        raise ValueError(
+            f"{what} has schema version {version}; this app reads up to {SCHEMA_VERSION}"
+        )
+
+
+class SnapshotFiles:
+    """The files that go with a snapshot, for steps that rewrite them"""
+
+    def __init__(self, path, journals=()):
+        self.path = path
+        self.journals = list(journals)
+        self.archive_dir = archive.archive_dir(path)
+
+
+def upgrade_snapshot(data, files):
+    """Bring a parsed data.json up to SCHEMA_VERSION
+
+    Returns (data, report): report lists the steps run, empty when the
+    file was already current.
+    """
+    # A pre-settings file is {name: {...}}, so only trust an int here
+    version = data.get('schema_version') if 'settings' in data else None
+    if version == SCHEMA_VERSION:
+        del data['schema_version']
+        return data, []
+    if version is None:
+        version = 0
+    else:
+        check_version(version, files.path)
+        del data['schema_version']
+    report = []
+    for step in pending('snapshot', version):
+        data, entry = _run(step, data, files)
+        report.append(entry)
+    return data, report
+
+
+@migration('snapshot', 1, "settings around the {name: {date: bool}} layout")
+def wrap_legacy(data, files):
+    if 'settings' in data:
+        return data
+    from comtrua.storage import DEFAULT_NAMES, MEAL_PRICE
+
+    return {
+        'settings': {'names': list(DEFAULT_NAMES), 'meal_price': MEAL_PRICE},
+        'attendance': data,
+    }
+
+
+@migration('snapshot', 2, "meal price as a dated history")
+def price_history(data, files):
+    from comtrua.storage import MEAL_PRICE
+
+    settings = data['settings']
+    settings['meal_price'] = normalize_price_setting(settings.get('meal_price', MEAL_PRICE))
+    return data
+
+
+@migration('snapshot', 3, "attendance as per-year bitsets")
+def attendance_bits(data, files):
+    if 'attendance_bits' in data:
+        return data
+    days_by_user = data.pop('attendance', {})
+    encoded = data['attendance_bits'] = {}
+    parsed = {}  # users share their dates, so each is parsed once
+    # Each user's dates are dropped as soon as they are encoded
+    for user in list(days_by_user):
+        years = {}
+        for date_str, attended in days_by_user.pop(user).items():
+            if attended:
+                key = parsed.get(date_str)
+                if key is None:
+                    key = parsed[date_str] = parse_date_key(date_str)
+                year, day = key
+                years[year] = years.get(year, 0) | (1 << day)
+        encoded[user] = {str(year): format(bits, 'x') for year, bits in sorted(years.items())}
+    return data
+
+
+@migration('snapshot', 4, "sync state")
+def sync_state(data, files):
+    # Created once so the device keeps the same id from now on
+    data.setdefault('sync', new_sync_state())
+    return data
+
+
+@migration('snapshot', 5, "user ids instead of names")
+def user_ids(data, files):
+    settings = data['settings']
+    if 'users' in settings:
+        return data
+    names = settings.pop('names', [])
+    state = data['sync']
+    old_versions = state.pop('names', {})
+    # Names with attendance or versions but not listed were deleted
+    hidden = [
+        name
+        for keys in (data['attendance_bits'], state['cells'], old_versions)
+        for name in keys
+    ]
+    registry = UserRegistry.from_names(names, hidden)
+    data['attendance_bits'] = _rekey(registry, data['attendance_bits'])
+    state['cells'] = _rekey(registry, state['cells'])
+    users = state.setdefault('users', {})
+    users.update(_rekey(registry, old_versions))
+    if 'archive' in data:
+        for year in data['archive']:
+            _upgrade_archive_year(registry, files.archive_dir, int(year))
+    settings['users'] = registry.to_json()
+    # Journal lines carry their own registrations, replayed after loading
+    replayed = UserRegistry.from_json(settings['users'])
+    for path in files.journals:
+        _upgrade_journal(replayed, path)
+    return data
+
+
+def _rekey(registry, by_name):
+    return {registry.id_of(name): value for name, value in by_name.items()}
+
+
+def _hidden_id(registry, name):
+    """Id of name, registering it as a deleted user if unknown"""
+    user_id = registry.id_of(name)
+    if user_id is None:
+        user_id = registry.new_id(name)
+        registry.set(user_id, name, False)
+    return user_id
+
+
+def _upgrade_archive_year(registry, directory, year):
+    payload = archive.read_year(directory, year)
+    if payload is None:
+        return
+    if payload.get('schema_version', 0) >= 5:
+        # Rewritten by an earlier, interrupted run: only learn its users
+        for user_id, name in payload['users'].items():
+            if user_id not in registry:
+                registry.set(user_id, name, False)
+        return
+    ids = {}
+    for keys in (payload['attendance_bits'], payload['cells']):
+        for name in keys:
+            ids[name] = _hidden_id(registry, name)
+    payload['attendance_bits'] = {ids[k]: v for k, v in payload['attendance_bits'].items()}
+    payload['cells'] = {ids[k]: v for k, v in payload['cells'].items()}
+    payload['schema_version'] = 5
+    payload['users'] = {user_id: name for name, user_id in ids.items()}
+    archive.write_year(directory, year, payload)
+
+
+def _upgrade_journal(registry, path):
+    """Rewrite a journal's name-keyed records by id, one line at a time
+
+    The registry is updated as the records go by, so later lines see the
+    users earlier ones added; a torn last line is dropped.
+    """
+    if not os.path.exists(path):
+        return
+    tmp_path = path + ".tmp"
+    with open(path, 'r', encoding='utf-8') as src, \
+            open(tmp_path, 'w', encoding='utf-8') as dst:
+        for line in src:
+            if not line.endswith('\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            for upgraded in upgrade_record(registry, record):
+                dst.write(json.dumps(upgraded, ensure_ascii=False) + "\n")
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp_path, path)
+
+
+def upgrade_record(registry, record):
+    """An edit record written before user ids, as records keyed by id
+
+    Returns a list: empty if there is nothing left to apply, and with a
+    registration in front when a mark names someone not in the registry
+    (such attendance was kept, under a deleted user). Records already
+    keyed by id come back unchanged, so a rewritten journal can go
+    through again. Updates registry as the records would.
+    """
+    op = record.get('op')
+    if op in ('batch', 'sync'):
+        sub_records = [
+            upgraded
+            for sub_record in record['records']
+            for upgraded in upgrade_record(registry, sub_record)
+        ]
+        return [dict(record, records=sub_records)]
+    if op == 'user':
+        registry.set(record['user'], record['name'], record['active'])
+        return [record]
+    if op in ('add_name', 'delete_name'):
+        name = record['name']
+        user_id = registry.id_of(name)
+        if user_id is None:
+            if op == 'delete_name':
+                return []
+            user_id = registry.new_id(name)
+        upgraded = {'op': 'user', 'user': user_id, 'name': name, 'active': op == 'add_name'}
+        if 'ts' in record:
+            upgraded['ts'] = record['ts']
+        registry.set(user_id, name, upgraded['active'])
+        return [upgraded]
+    if op == 'mark' and 'user' not in record:
+        names = [record['name']]
+    elif op == 'mark_many' and 'users' not in record:
+        names = record['names']
+    else:
+        return [record]
+    registrations = []
+    user_ids = []
+    for name in names:
+        if registry.id_of(name) is None:
+            user_id = _hidden_id(registry, name)
+            registrations.append({'op': 'user', 'user': user_id, 'name': name, 'active': False})
+        user_ids.append(registry.id_of(name))
+    if op == 'mark':
+        upgraded = {k: v for k, v in record.items() if k != 'name'}
+        upgraded['user'] = user_ids[0]
+    else:
+        upgraded = {k: v for k, v in record.items() if k != 'names'}
+        upgraded['users'] = user_ids
+    if registrations:
+        # Unstamped, so they do not count as edits when syncing
+        return [{'op': 'batch', 'records': registrations + [upgraded]}]
+    return [upgraded]
+
+
+def upgrade_database(conn):
+    """Bring an SQLite database up to SCHEMA_VERSION; returns the report
+
+    Each step commits together with the new user_version.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == SCHEMA_VERSION:
+        return []
+    check_version(version, "the database")
+    report = []
+    if version == 0 and conn.execute("SELECT 1 FROM settings LIMIT 1").fetchone() is None:
+        # A new database is created at the current version
+        return _set_version(conn, report)
+    for step in pending('sqlite', version):
+        with conn:
+            _, entry = _run(step, conn)
+            conn.execute(f"PRAGMA user_version = {step.version}")
+        report.append(entry)
+    return _set_version(conn, report)
+
+
+def _set_version(conn, report):
+    with conn:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return report
+
+
+def _get_setting(conn, key, default=None):
+    row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+
+def _put_setting(conn, key, value):
+    conn.execute(
+        "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+        (key, json.dumps(value, ensure_ascii=False)),
+    )
+
+
+@migration('sqlite', 2, "meal price as a dated history")
+def db_price_history(conn):
+    price = _get_setting(conn, 'meal_price')
+    if price is not None:
+        _put_setting(conn, 'meal_price', normalize_price_setting(price))
+
+
+@migration('sqlite', 4, "sync state")
+def db_sync_state(conn):
+    if _get_setting(conn, 'sync') is None:
+        _put_setting(conn, 'sync', new_sync_state())
+
+
+@migration('sqlite', 5, "user ids instead of names")
+def db_user_ids(conn):
+    names = _get_setting(conn, 'names')
+    if names is None:
+        return
+    state = _get_setting(conn, 'sync')
+    old_versions = state.pop('names', {})
+    others = [user for (user,) in conn.execute(
+        "SELECT user FROM attendance UNION SELECT user FROM cell_versions"
+    )]
+    registry = UserRegistry.from_names(names, others + list(old_versions))
+    ids = [(user_id, registry.name_of(user_id)) for user_id in registry]
+    for table in ('attendance', 'cell_versions'):
+        conn.executemany(f"UPDATE {table} SET user = ? WHERE user = ?", ids)
+    state.setdefault('users', {}).update(_rekey(registry, old_versions))
+    _put_setting(conn, 'sync', state)
+    _put_setting(conn, 'users', registry.to_json())
+    conn.execute("DELETE FROM settings WHERE key = 'names'")
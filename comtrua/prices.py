@@ -0,0 +1,60 @@
+"""Effective-dated meal prices.
+
+``settings['meal_price']`` holds ``[[effective_date, price], ...]`` sorted
+by date; each price applies from its date until the next entry. The first
+entry starts at FIRST_DATE so every day has a price. Older files stored a
+single int, which becomes a one-entry history.
+"""
+from bisect import bisect_right
+from datetime import date, timedelta
+
+FIRST_DATE = "0001-01-01"
+
+
+def normalize_price_setting(value):
+    """Return the history list for a stored meal_price (int or list)"""
+    if isinstance(value, (int, float)):
+        return [[FIRST_DATE, int(value)]]
+    return sorted([str(d), int(p)] for d, p in value)
+
+
+def schedule_price(history, effective_date, price):
+    """Insert or replace the entry starting on effective_date, in place"""
+    for entry in history:
+        if entry[0] == effective_date:
+            entry[1] = price
+            return
+    history.append([effective_date, price])
+    history.sort()
+
+
+class PriceHistory:
+    """Interval index over a price history list"""
+
+    def __init__(self, history):
+        self.dates = [d for d, _ in history]
+        self.prices = [p for _, p in history]
+
+    def price_on(self, date_str):
+        """Price in effect on a 'YYYY-MM-DD' day"""
+        i = bisect_right(self.dates, date_str) - 1
+        return self.prices[max(i, 0)]
+
+    def pieces(self, start, end):
+        """[(first, last, price)] covering start..end (date objects, inclusive)
+
+        Found by binary search, so cost is O(log n + pieces in range).
+        """
+        i = max(bisect_right(self.dates, start.isoformat()) - 1, 0)
+        pieces = []
+        first = start
+        while first <= end:
+            if i + 1 < len(self.dates):
+                next_change = date.fromisoformat(self.dates[i + 1])
+                last = min(end, next_change - timedelta(days=1))
+            else:
+                last = end
+            pieces.append((first, last, self.prices[i]))
+            first = last + timedelta(days=1)
+            i += 1
+        return pieces
@@ -0,0 +1,259 @@
+"""Multi-month reporting over any date range in one batched pass.
+
+Each user's yearly bitsets are stitched into one integer covering the
+range, i.e. one row of a users x days bit matrix. With NumPy installed
+the rows are unpacked into a uint8 matrix and month totals come from a
+single ``np.add.reduceat``; without it each month is a popcount over a
+masked slice of the row, which is already cheap in pure Python.
+
+Months are further split wherever the meal price changes, so costs come
+from a handful of (days x price) products per month rather than a price
+lookup per day.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Results a ReportCache keeps before dropping the least recently used
+REPORT_CACHE_SIZE = 24
+
+
+def month_segments(start, end):
+    """[(year, month, first_index, end_index)] for days start..end inclusive"""
+    segments = []
+    cursor = start
+    while cursor <= end:
+        if cursor.month == 12:
+            next_month = date(cursor.year + 1, 1, 1)
+        else:
+            next_month = date(cursor.year, cursor.month + 1, 1)
+        segment_end = min(next_month - timedelta(days=1), end)
+        segments.append((
+            cursor.year,
+            cursor.month,
+            (cursor - start).days,
+            (segment_end - start).days + 1,
+        ))
+        cursor = next_month
+    return segments
+
+
+def range_bits(years, start, end):
+    """One user's attendance for start..end as an int, bit 0 = start"""
+    bits = 0
+    for year in range(start.year, end.year + 1):
+        year_bits = years.get(year, 0)
+        if not year_bits:
+            continue
+        jan1 = date(year, 1, 1)
+        first = max(start, jan1)
+        last = min(end, date(year, 12, 31))
+        lo = (first - jan1).days
+        width = (last - first).days + 1
+        chunk = (year_bits >> lo) & ((1 << width) - 1)
+        bits |= chunk << (first - start).days
+    return bits
+
+
+def attendance_matrix(store, user_ids, start, end):
+    """users x days uint8 matrix for start..end (requires NumPy)"""
+    n_days = (end - start).days + 1
+    n_bytes = (n_days + 7) // 8
+    raw = b"".join(
+        range_bits(store.bitsets(user_id), start, end).to_bytes(n_bytes, 'little')
+        for user_id in user_ids
+    )
+    packed = np.frombuffer(raw, dtype=np.uint8).reshape(len(user_ids), n_bytes)
+    return np.unpackbits(packed, axis=1, bitorder='little')[:, :n_days]
+
+
+def price_segments(segments, prices, start, end):
+    """Split month segments at price changes.
+
+    Returns [(month_index, first_index, end_index, price)] in order.
+    """
+    pieces = [
+        ((first - start).days, (last - start).days + 1, price)
+        for first, last, price in prices.pieces(start, end)
+    ]
+    result = []
+    p = 0
+    for month_index, (_, _, first, stop) in enumerate(segments):
+        while first < stop:
+            while pieces[p][1] <= first:
+                p += 1
+            piece_stop = min(stop, pieces[p][1])
+            result.append((month_index, first, piece_stop, pieces[p][2]))
+            first = piece_stop
+    return result
+
+
+class RangeReport:
+    """Per-user, per-month day counts and costs for a date range"""
+
+    def __init__(self, start, end, names, months, days, costs):
+        self.start = start
+        self.end = end
+        self.names = names
+        self.months = months  # [(year, month)]
+        self.days = days      # {name: [days per month]}
+        self.costs = costs    # {name: [cost per month]}
+
+    def user_days(self, name):
+        return sum(self.days[name])
+
+    def user_cost(self, name):
+        return sum(self.costs[name])
+
+    def month_days(self, index):
+        """Days eaten by the whole group in the index-th month"""
+        return sum(self.days[name][index] for name in self.names)
+
+    def month_cost(self, index):
+        return sum(self.costs[name][index] for name in self.names)
+
+    @property
+    def total_days(self):
+        return sum(self.user_days(name) for name in self.names)
+
+    @property
+    def total_cost(self):
+        return sum(self.user_cost(name) for name in self.names)
+
+    def rows(self):
+        """(name, [days per month], total days, total cost) for each user"""
+        for name in self.names:
+            yield name, self.days[name], self.user_days(name), self.user_cost(name)
+
+
+def range_report(app, start, end, names=None, use_numpy=None):
+    """Compute a RangeReport for start..end (inclusive dates)"""
+    if names is None:
+        names = list(app.get_names())
+    if use_numpy is None:
+        use_numpy = np is not None
+    store = app.data['attendance']
+    store.load_years(range(start.year, end.year + 1))
+    # Rows are keyed by name, the bitsets by user id
+    users = app.get_users()
+    user_ids = [users.id_of(name) for name in names]
+    segments = month_segments(start, end)
+    months = [(year, month) for year, month, _, _ in segments]
+
+    pieces = price_segments(segments, app.get_prices(), start, end)
+    n_months = len(segments)
+
+    if use_numpy and names and segments:
+        matrix = attendance_matrix(store, user_ids, start, end)
+        starts = [first for _, first, _, _ in pieces]
+        counts = np.add.reduceat(matrix, starts, axis=1, dtype=np.int64)
+        piece_prices = np.array([price for _, _, _, price in pieces], dtype=np.int64)
+        # First piece of each month, to fold pieces back into months
+        month_starts = []
+        for i, (month_index, _, _, _) in enumerate(pieces):
+            if len(month_starts) == month_index:
+                month_starts.append(i)
+        month_days = np.add.reduceat(counts, month_starts, axis=1)
+        month_costs = np.add.reduceat(counts * piece_prices, month_starts, axis=1)
+        days = {name: month_days[i].tolist() for i, name in enumerate(names)}
+        costs = {name: month_costs[i].tolist() for i, name in enumerate(names)}
+    else:
+        days = {}
+        costs = {}
+        for name, user_id in zip(names, user_ids):
+            bits = range_bits(store.bitsets(user_id), start, end)
+            user_days = days[name] = [0] * n_months
+            user_costs = costs[name] = [0] * n_months
+            for month_index, first, stop, price in pieces:
+                count = ((bits >> first) & ((1 << (stop - first)) - 1)).bit_count()
+                user_days[month_index] += count
+                user_costs[month_index] += count * price
+
+    return RangeReport(start, end, names, months, days, costs)
+
+
+def year_range(year):
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def quarter_range(year, quarter):
+    first_month = 3 * (quarter - 1) + 1
+    start = date(year, first_month, 1)
+    if quarter == 4:
+        end = date(year, 12, 31)
+    else:
+        end = date(year, first_month + 3, 1) - timedelta(days=1)
+    return start, end
+
+
+def report_key(app, kind, start, end, names):
+    """Cache key of a report: its period, the users shown and their prices
+
+    Returns (key, months), months being the (year, month) list the report
+    reads, for ReportCache.
+    """
+    pieces = tuple(app.get_prices().pieces(start, end))
+    months = [(year, month) for year, month, _, _ in month_segments(start, end)]
+    return (kind, start, end, tuple(names), pieces), months
+
+
+class ReportCache:
+    """LRU of computed reports, or anything built from one (e.g. controls)
+
+    An entry remembers app.data_version from before it was computed and
+    the months it read. It is reused until one of those months or the
+    user list is edited (app.changed_since), so an edit in March leaves
+    January's entry alone. Prices are part of the key instead.
+    """
+
+    def __init__(self, app, maxsize=REPORT_CACHE_SIZE):
+        self.app = app
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (version, months, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The cached value for key if still current, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, months, value = entry
+                if not self.app.changed_since(version, months):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, months, value, version):
+        """Store value, computed from the data as of version"""
+        with self._lock:
+            self._entries[key] = (version, list(months), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, months, compute):
+        """Cached value for key, or compute() stored under it"""
+        value = self.get(key)
+        if value is None:
+            # Taken first: an edit made while computing makes it stale
+            version = self.app.data_version
+            value = compute()
+            self.put(key, months, value, version)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,172 @@
+"""One LunchApp shared by every session in the process.
+
+Under ``flet run --web`` each browser session runs ``main(page)`` in the
+same process. Instead of one LunchApp (and one copy of data.json) per
+session, they all use the SharedLunchApp from ``get_shared_app()``:
+
+* a mark only locks its own user, so sessions ticking different people
+  never wait on each other; names and prices share one settings lock.
+  A backend that rewrites the whole file on every edit takes every lock,
+  as the dict must not change while it is written out. Stamping an edit
+  (its ts and seq) and handing it to the backend happen under one commit
+  lock, so the journal holds edits in seq order;
+* every edit is handed to the subscribers, which lets other sessions
+  repaint just the changed cell;
+* a watcher thread compares the data files' mtime and size with what this
+  process last wrote and reloads when another process changed them.
+"""
+import atexit
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+
+from comtrua.core import LunchApp, leaf_records
+
+# Seconds between checks for changes made by other processes, 0 to disable
+WATCH_INTERVAL = 2.0
+
+logger = logging.getLogger(__name__)
+
+
+class SharedLunchApp(LunchApp):
+    """Thread-safe LunchApp that notifies subscribers of every edit"""
+
+    def __init__(self, storage=None, loop=None, watch_interval=WATCH_INTERVAL):
+        self._settings_lock = threading.RLock()
+        self._user_locks = {}
+        # Taken last, around the ts/seq stamp and storage.apply
+        self._commit_lock = threading.Lock()
+        self._listeners = []
+        self._listeners_lock = threading.Lock()
+        self._closed = threading.Event()
+        super().__init__(storage, loop)
+        if watch_interval:
+            threading.Thread(
+                target=self._watch, args=(watch_interval,), daemon=True
+            ).start()
+
+    def _user_lock(self, user_id):
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            with self._settings_lock:
+                lock = self._user_locks.setdefault(user_id, threading.RLock())
+        return lock
+
+    def _locks_for(self, record):
+        """Locks an edit needs, in the order they must be taken"""
+        users = set()
+        settings = False
+        for leaf in leaf_records(record):
+            if leaf['op'] == 'mark':
+                users.add(leaf['user'])
+            elif leaf['op'] == 'mark_many':
+                users.update(leaf['users'])
+            else:
+                settings = True
+        # Settings lock first, then users in sorted order (as in a reload);
+        # every lock object exists before any of them is taken
+        locks = [self._settings_lock] if settings else []
+        return locks + [self._user_lock(user_id) for user_id in sorted(users)]
+
+    def _commit(self, record):
+        # Memory and storage are updated under the same locks, so the
+        # journal sees edits to a cell in the order they were applied
+        with ExitStack() as stack:
+            # Also creates the record's user locks, which locked() then takes
+            locks = self._locks_for(record)
+            if self.storage.rewrites_snapshot:
+                stack.enter_context(self.locked())
+            else:
+                for lock in locks:
+                    stack.enter_context(lock)
+            # Edits to different users stamp and persist one at a time
+            with self._commit_lock:
+                super()._commit(record)
+        self._notify(record)
+
+    @contextmanager
+    def locked(self):
+        """Hold every lock, e.g. to read the whole dict or edit it in steps"""
+        with ExitStack() as stack:
+            stack.enter_context(self._settings_lock)
+            # No new user lock appears while the settings lock is held
+            for user_id in sorted(self._user_locks):
+                stack.enter_context(self._user_locks[user_id])
+            yield
+
+    def save_data(self):
+        with self.locked():
+            super().save_data()
+
+    def get_user_data(self, name):
+        user_id = self.user_id(name)
+        if user_id is None:
+            return super().get_user_data(name)
+        with self._user_lock(user_id):
+            return super().get_user_data(name)
+
+    def subscribe(self, callback):
+        """Call callback(record) after every edit; {'op': 'reload'} after a reload
+
+        Callbacks run on the thread that made the edit and must not block.
+        """
+        with self._listeners_lock:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._listeners_lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify(self, record):
+        with self._listeners_lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback(record)
+
+    def reload_if_changed(self):
+        """Reload when another process changed the files; True if reloaded"""
+        # Hold every lock so no edit lands in the dict being replaced
+        with self.locked():
+            if not self.storage.changed_on_disk():
+                return False
+            self.data = self.load_data()
+            self._prices = None
+        self._notify({'op': 'reload'})
+        return True
+
+    def _watch(self, interval):
+        while not self._closed.wait(interval):
+            try:
+                self.reload_if_changed()
+            except OSError:
+                # A file being replaced mid-check; try again next round
+                logger.exception("Data file check failed")
+
+    def close(self):
+        self._closed.set()
+        super().close()
+
+
+_shared_app = None
+_shared_app_lock = threading.Lock()
+
+
+def get_shared_app(loop=None):
+    """The process-wide SharedLunchApp, created on first use
+
+    With sync_client.SYNC_URL set and a loop given, it also starts syncing
+    with that server in the background.
+    """
+    global _shared_app
+    with _shared_app_lock:
+        if _shared_app is None:
+            _shared_app = SharedLunchApp(loop=loop)
+            atexit.register(_shared_app.close)
+            from comtrua import sync_client
+            if sync_client.SYNC_URL and loop is not None:
+                _shared_app.background_sync = sync_client.BackgroundSync(
+                    _shared_app, sync_client.SYNC_URL
+                )
+                _shared_app.background_sync.start(loop)
+        return _shared_app
@@ -0,0 +1,846 @@
+"""Storage backends for LunchApp data
+
+asyncio and sqlite3 are imported where they are used so that importing
+this module (and comtrua.core) stays cheap for scripts and the CLI.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from comtrua import archive, binary, migrations
+from comtrua.attendance import AttendanceStore
+from comtrua.diagnostics import span
+from comtrua.prices import normalize_price_setting, schedule_price
+from comtrua.sync import new_sync_state, note_change, note_merge
+from comtrua.users import UserRegistry
+
+# File to store data
+DATA_FILE = "data.json"
+MEAL_PRICE = 40000
+DEFAULT_NAMES = ["Anh Dương", "Anh Long", "Anh Vinh", "Hưng"]
+
+# Append-only journal of edits, replayed on top of DATA_FILE at startup
+JOURNAL_FILE = "data.journal"
+JOURNAL_COMPACT_THRESHOLD = 500  # entries before folding into DATA_FILE
+
+# SQLite database used by SqliteStorage
+DB_FILE = "data.db"
+
+# Packed snapshot used by BinaryStorage (see comtrua.binary)
+BINARY_FILE = "data.bin"
+
+# Write-behind: flush after FLUSH_DELAY seconds without edits, and never
+# hold an edit in memory longer than FLUSH_MAX_DELAY seconds
+FLUSH_DELAY = 0.5
+FLUSH_MAX_DELAY = 2.0
+
+
+def default_data():
+    """Default data structure for a new installation"""
+    return {
+        'settings': {
+            'users': UserRegistry.from_names(DEFAULT_NAMES),
+            'meal_price': normalize_price_setting(MEAL_PRICE)
+        },
+        'attendance': AttendanceStore(),
+        'sync': new_sync_state(),
+    }
+
+
+def decode_data(data, archive_dir=None):
+    """Turn a parsed snapshot at SCHEMA_VERSION into the in-memory layout
+
+    archive_dir is where the snapshot's archived months live.
+    """
+    settings = data['settings']
+    settings['users'] = UserRegistry.from_json(settings['users'])
+    data['attendance'] = AttendanceStore.from_json(data.pop('attendance_bits'))
+    if 'archive' in data:
+        data['attendance'].set_archived(data.pop('archive'))
+    if archive_dir is not None:
+        archive.attach(data, archive_dir)
+    return data
+
+
+def encode_data(data):
+    """Snapshot layout: attendance stored as per-year bitsets"""
+    encoded = {'schema_version': migrations.SCHEMA_VERSION}
+    encoded.update((key, value) for key, value in data.items() if key != 'attendance')
+    settings = data['settings']
+    if isinstance(settings.get('users'), UserRegistry):
+        encoded['settings'] = dict(settings, users=settings['users'].to_json())
+    attendance = data.get('attendance', {})
+    if not isinstance(attendance, AttendanceStore):
+        attendance = AttendanceStore.from_dict(attendance)
+    encoded['attendance_bits'] = attendance.to_json()
+    archived = attendance.archived_months()
+    if archived:
+        encoded['archive'] = {str(year): months for year, months in archived.items()}
+        if 'sync' in data:
+            encoded['sync'] = archive.hot_sync_state(data)
+    return encoded
+
+
+def apply_record(data, record):
+    """Apply one edit record to the data dict"""
+    settings = data['settings']
+    op = record.get('op')
+    ts = record.get('ts')
+    if ts is not None and op not in ('batch', 'sync') and 'sync' in data:
+        note_change(data['sync'], record, ts)
+    if op == 'mark':
+        attendance = data.setdefault('attendance', {})
+        attendance.setdefault(record['user'], {})[record['date']] = record['value']
+    elif op == 'mark_many':
+        attendance = data.setdefault('attendance', AttendanceStore())
+        attendance.mark_many(record['users'], record['dates'], record['value'])
+    elif op == 'batch':
+        # Several edits stored as one record, so they persist all or nothing
+        for sub_record in record['records']:
+            if ts is not None and 'ts' not in sub_record:
+                sub_record = dict(sub_record, ts=ts)
+            apply_record(data, sub_record)
+    elif op == 'sync':
+        # A merged delta: the peer's winning edits, each with its own ts
+        first_seq = data['sync']['seq'] if 'sync' in data else 0
+        for sub_record in record['records']:
+            apply_record(data, sub_record)
+        if 'sync' in data:
+            note_merge(data['sync'], record, first_seq)
+    elif op == 'user':
+        settings['users'].set(record['user'], record['name'], record['active'])
+    elif op == 'meal_price':
+        if 'from' in record:
+            schedule_price(settings['meal_price'], record['from'], record['value'])
+        else:
+            # Written before price history existed: one price for every day
+            settings['meal_price'] = normalize_price_setting(record['value'])
+
+
+def read_json(path, journals=()):
+    """Read a data.json file; returns (data, migration report)
+
+    A file from an older version is upgraded in memory, along with its
+    archives and the given journals on disk; the caller writes it back.
+    """
+    with span('disk.read'):
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    with span('json.decode'):
+        data = json.loads(text)
+    data, report = migrations.upgrade_snapshot(
+        data, migrations.SnapshotFiles(path, journals)
+    )
+    return decode_data(data, archive.archive_dir(path)), report
+
+
+def write_snapshot(data, path=DATA_FILE):
+    """Atomically replace the snapshot file with data"""
+    tmp_path = path + ".tmp"
+    with span('json.encode'):
+        text = json.dumps(encode_data(data), ensure_ascii=False, indent=2)
+    with span('disk.write'):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def read_journal(path):
+    """Yield records from a journal file, skipping a torn last line"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                # Incomplete write from a crash, never acknowledged
+                break
+            try:
+                yield json.loads(line)
+            except ValueError:
+                break
+
+
+def file_signature(paths):
+    """(mtime_ns, size) of each path, None for missing files"""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((st.st_mtime_ns, st.st_size))
+    return tuple(signature)
+
+
+def repair_journal(path):
+    """Truncate a torn last line so later appends start on a clean line"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        content = f.read()
+        end = content.rfind(b'\n') + 1
+        if end != len(content):
+            f.truncate(end)
+
+
+class Storage:
+    """Interface LunchApp uses to load and persist its data.
+
+    Edits reach the backend as records ({'op': ..., ...}) already applied
+    to the in-memory dict, so a backend only has to make them durable.
+    ``migrations`` reports the schema upgrades the last load ran.
+    ``rewrites_snapshot`` backends write the whole dict on every edit, so
+    no other thread may change it while they do.
+    """
+
+    migrations = ()
+    rewrites_snapshot = False
+
+    def load(self):
+        """Return the full data dict"""
+        raise NotImplementedError
+
+    def save(self, data):
+        """Persist the full data dict"""
+        raise NotImplementedError
+
+    def apply(self, record):
+        """Persist a single edit"""
+        raise NotImplementedError
+
+    def apply_many(self, records):
+        """Persist several edits, in order"""
+        for record in records:
+            self.apply(record)
+
+    def flush(self):
+        """Write out anything still held in memory"""
+
+    def archive_closed_months(self, data):
+        """Move closed months out of the main file; returns how many moved"""
+        return 0
+
+    def files(self):
+        """Paths this backend reads and writes"""
+        return []
+
+    def changed_on_disk(self):
+        """True if another process changed files() since our last load or write"""
+        return False
+
+    def close(self):
+        """Release any open resources"""
+
+
+class JsonStorage(Storage):
+    """Whole-file JSON storage, rewritten on every edit"""
+
+    rewrites_snapshot = True
+
+    def __init__(self, path=DATA_FILE):
+        self.path = path
+        self.data = None
+        self._lock = threading.RLock()
+        self._signature = None
+
+    def _note_write(self):
+        """Remember the files as we left them; call with _lock held"""
+        self._signature = file_signature(self.files())
+
+    def load(self):
+        with self._lock:
+            if not os.path.exists(self.path):
+                # New installation - default structure, written right away
+                # so the sync device id stays the same across restarts
+                self.data = self._initial_data()
+                self._write_snapshot(self.data)
+                self._note_write()
+                return self.data
+
+            data, self.migrations = self._read_snapshot()
+            if self.migrations:
+                self._write_snapshot(data)  # Save migrated data
+            self.data = data
+            self._note_write()
+            return data
+
+    def _initial_data(self):
+        return default_data()
+
+    def _read_snapshot(self):
+        """(data, migration report) from the snapshot file"""
+        return read_json(self.path, self.journal_files())
+
+    def _write_snapshot(self, data):
+        write_snapshot(data, self.path)
+
+    def save(self, data):
+        with self._lock:
+            self.data = data
+            self._write_snapshot(data)
+            self._note_write()
+
+    def archive_closed_months(self, data):
+        if archive.ARCHIVE_AFTER_MONTHS is None:
+            return 0
+        with self._lock:
+            moved = archive.archive_closed_months(
+                data, archive.archive_dir(self.path),
+                archive.first_hot_month(age=archive.ARCHIVE_AFTER_MONTHS),
+            )
+            if moved:
+                self.save(data)
+        return moved
+
+    def files(self):
+        return [self.path]
+
+    def journal_files(self):
+        """Journals replayed on top of the snapshot, oldest first"""
+        return []
+
+    def changed_on_disk(self):
+        with self._lock:
+            return file_signature(self.files()) != self._signature
+
+    def apply(self, record):
+        self.save(self.data)
+
+    def apply_many(self, records):
+        if records:
+            self.save(self.data)
+
+
+class JournalStorage(JsonStorage):
+    """JSON snapshot plus an append-only journal of edits.
+
+    Each edit appends one fsynced line, so the cost does not grow with
+    history. Past a threshold the journal is rotated and folded back into
+    the snapshot on a background thread.
+    """
+
+    rewrites_snapshot = False
+
+    def __init__(self, path=DATA_FILE, journal_path=None,
+                 compact_threshold=JOURNAL_COMPACT_THRESHOLD):
+        super().__init__(path)
+        if journal_path is None:
+            journal_path = (
+                JOURNAL_FILE if path == DATA_FILE
+                else os.path.splitext(path)[0] + ".journal"
+            )
+        self.journal_path = journal_path
+        self.rotated_path = journal_path + ".1"
+        self.compact_threshold = compact_threshold
+        self._journal_entries = 0
+        self._compacting = False
+        # Bumped by save(), which makes a compaction in progress obsolete
+        self._saves = 0
+
+    def load(self):
+        with self._lock:
+            data = super().load()
+            self._journal_entries = 0
+            # A rotated journal is left behind if compaction was interrupted
+            for path in self.journal_files():
+                repair_journal(path)
+                for record in read_journal(path):
+                    apply_record(data, record)
+                    self._journal_entries += 1
+            self._note_write()
+            return data
+
+    def save(self, data):
+        with self._lock:
+            super().save(data)
+            # Snapshot now contains everything the journals recorded
+            for path in (self.rotated_path, self.journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._journal_entries = 0
+            self._saves += 1
+            self._note_write()
+
+    def apply(self, record):
+        self.apply_many([record])
+
+    def apply_many(self, records):
+        if not records:
+            return
+        with span('json.encode'):
+            lines = "".join(
+                json.dumps(record, ensure_ascii=False) + "\n" for record in records
+            )
+        with self._lock:
+            with span('disk.append'), open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_entries += len(records)
+            self._note_write()
+            start_compaction = (
+                self._journal_entries >= self.compact_threshold
+                and not self._compacting
+            )
+            if start_compaction:
+                self._compacting = True
+
+        if start_compaction:
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """Fold the journal into the snapshot file"""
+        try:
+            with self._lock:
+                if os.path.exists(self.journal_path):
+                    if os.path.exists(self.rotated_path):
+                        # Leftover from an interrupted compaction, keep order
+                        with open(self.rotated_path, 'a', encoding='utf-8') as dst, \
+                                open(self.journal_path, 'r', encoding='utf-8') as src:
+                            dst.write(src.read())
+                            dst.flush()
+                            os.fsync(dst.fileno())
+                        os.remove(self.journal_path)
+                    else:
+                        os.replace(self.journal_path, self.rotated_path)
+                self._journal_entries = 0
+                saves = self._saves
+                self._note_write()
+
+            if not os.path.exists(self.rotated_path):
+                return
+
+            # Rebuild from disk so the caller keeps sole use of its dict
+            if os.path.exists(self.path):
+                data, _ = self._read_snapshot()
+            else:
+                data = default_data()
+            for record in read_journal(self.rotated_path):
+                apply_record(data, record)
+
+            with self._lock:
+                if self._saves != saves or not os.path.exists(self.rotated_path):
+                    # save() wrote a newer snapshot meanwhile; this one is stale
+                    return
+                self._write_snapshot(data)
+                os.remove(self.rotated_path)
+                self._note_write()
+        finally:
+            self._compacting = False
+
+    def files(self):
+        return [self.path, self.journal_path, self.rotated_path]
+
+    def journal_files(self):
+        return [self.rotated_path, self.journal_path]
+
+
+class BinaryStorage(JournalStorage):
+    """Journal on top of the packed binary snapshot instead of data.json
+
+    The snapshot is read in one go, and a user's attendance is decoded the
+    first time it is read. On the first start an existing data.json (with
+    its journal) is imported once; `python -m comtrua export` still writes
+    JSON. Archived years live in data.bin-archive, copied from
+    data-archive on import so the two backends never share files.
+    """
+
+    def __init__(self, path=BINARY_FILE, journal_path=None, import_from=DATA_FILE,
+                 compact_threshold=JOURNAL_COMPACT_THRESHOLD):
+        super().__init__(path, journal_path or path + ".journal", compact_threshold)
+        self.import_from = import_from
+
+    def _initial_data(self):
+        source = JournalStorage(self.import_from) if self.import_from else None
+        if source and any(os.path.exists(p) for p in source.files()):
+            data = source.load()
+            # The imported archived months go along into our own directory
+            directory = archive.archive_dir(self.path)
+            archive.copy_archives(archive.archive_dir(self.import_from), directory)
+            archive.attach(data, directory)
+            return data
+        return default_data()
+
+    def _read_snapshot(self):
+        return binary.read_binary(self.path, self.journal_files())
+
+    def _write_snapshot(self, data):
+        binary.write_binary(data, self.path)
+
+
+class SqliteStorage(Storage):
+    """SQLite storage with one row per (user, date) and one transaction per edit"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS attendance (
+            user TEXT NOT NULL,
+            date TEXT NOT NULL,
+            attended INTEGER NOT NULL,
+            PRIMARY KEY (user, date)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS cell_versions (
+            user TEXT NOT NULL,
+            date TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            PRIMARY KEY (user, date)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path=DB_FILE, import_from=DATA_FILE):
+        self.path = path
+        self.import_from = import_from
+        import sqlite3
+
+        self._lock = threading.Lock()
+        self._signature = None
+        # The in-memory dict, whose sync versions are copied on each edit
+        self.data = None
+        # Flet runs handlers on worker threads; access is serialized by _lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            self.conn.executescript(self.SCHEMA)
+
+    def _note_write(self):
+        """Remember the files as we left them; call with _lock held"""
+        self._signature = file_signature(self.files())
+
+    def _get_setting(self, key, default=None):
+        row = self.conn.execute(
+            "SELECT value FROM settings WHERE key = ?", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _put_setting(self, key, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+
+    def load(self):
+        with self._lock:
+            self.migrations = migrations.upgrade_database(self.conn)
+            if self._get_setting('users') is None:
+                # Fresh database: take over data.json (and its journal) once
+                source = JournalStorage(self.import_from) if self.import_from else None
+                if source and any(os.path.exists(p) for p in source.files()):
+                    data = source.load()
+                else:
+                    data = default_data()
+                self._write_all(data)
+                self._note_write()
+                self.data = data
+                return data
+
+            data = {
+                'settings': {
+                    'users': UserRegistry.from_json(self._get_setting('users')),
+                    'meal_price': self._get_setting('meal_price'),
+                },
+                'attendance': AttendanceStore(),
+            }
+            attendance = data['attendance']
+            for user, date_str in self.conn.execute(
+                "SELECT user, date FROM attendance WHERE attended = 1"
+            ):
+                attendance.setdefault(user)[date_str] = True
+            data['sync'] = self._load_sync()
+            self._note_write()
+            self.data = data
+            return data
+
+    def _load_sync(self):
+        """Sync state: settings row plus one cell_versions row per cell"""
+        state = self._get_setting('sync')
+        cells = state['cells'] = {}
+        # Marks only write their cell row, so seq and clock are rebuilt here
+        for user, date_str, ts, seq in self.conn.execute(
+            "SELECT user, date, ts, seq FROM cell_versions"
+        ):
+            cells.setdefault(user, {})[date_str] = [ts, seq]
+            state['seq'] = max(state['seq'], seq)
+            state['clock'] = max(state['clock'], ts)
+        return state
+
+    def _put_sync_meta(self, state):
+        self._put_setting('sync', {k: v for k, v in state.items() if k != 'cells'})
+
+    def _write_all(self, data):
+        if isinstance(data.get('attendance'), AttendanceStore):
+            # Rows hold every year, so bring in any archived ones first
+            data['attendance'].load_all()
+        with self.conn:
+            self.conn.execute("DELETE FROM settings")
+            self.conn.execute("DELETE FROM attendance")
+            self.conn.execute("DELETE FROM cell_versions")
+            settings = data['settings']
+            self._put_setting('users', settings['users'].to_json())
+            self._put_setting('meal_price', settings['meal_price'])
+            if 'sync' in data:
+                self._put_sync_meta(data['sync'])
+                self.conn.executemany(
+                    "INSERT INTO cell_versions (user, date, ts, seq) VALUES (?, ?, ?, ?)",
+                    (
+                        (user, date_str, ts, seq)
+                        for user, cells in data['sync']['cells'].items()
+                        for date_str, (ts, seq) in cells.items()
+                    ),
+                )
+            self.conn.executemany(
+                "INSERT INTO attendance (user, date, attended) VALUES (?, ?, ?)",
+                (
+                    (user, date_str, int(bool(attended)))
+                    for user, days in data.get('attendance', {}).items()
+                    for date_str, attended in days.items()
+                ),
+            )
+
+    def save(self, data):
+        with self._lock:
+            self.data = data
+            self._write_all(data)
+            self._note_write()
+
+    def apply(self, record):
+        self.apply_many([record])
+
+    def apply_many(self, records):
+        with self._lock:
+            with self.conn:
+                for record in records:
+                    self._apply_one(record)
+            self._note_write()
+
+    def _apply_one(self, record):
+        op = record.get('op')
+        if op == 'mark':
+            self.conn.execute(
+                "INSERT OR REPLACE INTO attendance (user, date, attended) "
+                "VALUES (?, ?, ?)",
+                (record['user'], record['date'], int(bool(record['value']))),
+            )
+        elif op == 'mark_many':
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO attendance (user, date, attended) "
+                "VALUES (?, ?, ?)",
+                (
+                    (user_id, date_str, int(bool(record['value'])))
+                    for user_id in record['users']
+                    for date_str in record['dates']
+                ),
+            )
+        elif op in ('batch', 'sync'):
+            for sub_record in record['records']:
+                if op == 'batch' and 'ts' in record and 'ts' not in sub_record:
+                    sub_record = dict(sub_record, ts=record['ts'])
+                self._apply_one(sub_record)
+        elif op == 'user':
+            users = UserRegistry.from_json(self._get_setting('users', {}))
+            users.set(record['user'], record['name'], record['active'])
+            self._put_setting('users', users.to_json())
+        elif op == 'meal_price':
+            settings = {'meal_price': self._get_setting('meal_price')}
+            apply_record({'settings': settings}, record)
+            self._put_setting('meal_price', settings['meal_price'])
+        if 'ts' in record or op == 'sync':
+            self._apply_versions(record)
+
+    def _apply_versions(self, record):
+        """Copy the sync versions an edit set in memory into the database"""
+        if self.data is None or 'sync' not in self.data:
+            return
+        state = self.data['sync']
+        op = record['op']
+        if op in ('mark', 'mark_many'):
+            user_ids = [record['user']] if op == 'mark' else record['users']
+            dates = [record['date']] if op == 'mark' else record['dates']
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO cell_versions (user, date, ts, seq) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    (user_id, date_str, *state['cells'][user_id][date_str])
+                    for user_id in user_ids
+                    for date_str in dates
+                ),
+            )
+        elif op != 'batch':
+            self._put_sync_meta(state)
+
+    def files(self):
+        return [self.path, self.path + "-wal"]
+
+    def changed_on_disk(self):
+        with self._lock:
+            return file_signature(self.files()) != self._signature
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class WriteBehindStorage(Storage):
+    """Wrap a backend so edits return immediately and reach disk in batches.
+
+    Edits are queued in memory and an asyncio task on ``loop`` flushes them
+    to the wrapped backend once no edit has arrived for ``delay`` seconds,
+    or once the oldest queued edit is ``max_delay`` seconds old. A crash can
+    therefore lose at most ``max_delay`` seconds of edits; ``flush()`` (also
+    called on close) writes everything out immediately. Without a loop the
+    wrapper writes through synchronously.
+
+    ``data_lock`` (e.g. the app's ``locked``) is held while a batch goes to
+    a backend that rewrites the whole dict, since the flush runs on a
+    thread of its own.
+    """
+
+    def __init__(self, inner, loop=None, delay=FLUSH_DELAY,
+                 max_delay=FLUSH_MAX_DELAY, data_lock=nullcontext):
+        self.inner = inner
+        self.loop = loop
+        self.data_lock = data_lock
+        self.delay = delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._first_pending_at = 0.0
+        self._last_edit_at = 0.0
+        self._flush_scheduled = False
+
+    @property
+    def dirty(self):
+        return bool(self._pending)
+
+    @property
+    def migrations(self):
+        return self.inner.migrations
+
+    @property
+    def rewrites_snapshot(self):
+        # Only without a loop do edits go straight through
+        return self.inner.rewrites_snapshot and (self.loop is None or self.loop.is_closed())
+
+    def load(self):
+        return self.inner.load()
+
+    def save(self, data):
+        with self._flush_lock:
+            with self._lock:
+                # The full snapshot supersedes anything still queued
+                self._pending = []
+            self.inner.save(data)
+
+    def apply(self, record):
+        if self.loop is None or self.loop.is_closed():
+            self.inner.apply(record)
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                self._first_pending_at = now
+            self._pending.append(record)
+            self._last_edit_at = now
+            schedule = not self._flush_scheduled
+            self._flush_scheduled = True
+
+        if schedule:
+            import asyncio
+
+            asyncio.run_coroutine_threadsafe(self._flush_later(), self.loop)
+
+    def apply_many(self, records):
+        for record in records:
+            self.apply(record)
+
+    async def _flush_later(self):
+        """Wait for a quiet period (or the max delay), then flush"""
+        import asyncio
+
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._flush_scheduled = False
+                    return
+                now = time.monotonic()
+                wait = min(
+                    self._last_edit_at + self.delay,
+                    self._first_pending_at + self.max_delay,
+                ) - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            # Disk I/O runs on a worker thread, never on the event loop
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                with self._lock:
+                    self._flush_scheduled = False
+                raise
+
+    def flush(self):
+        # The data lock comes first, as it does for edits and reloads
+        guard = self.data_lock() if self.inner.rewrites_snapshot else nullcontext()
+        with guard, self._flush_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+            if not records:
+                return
+            try:
+                self.inner.apply_many(records)
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = records
+                raise
+            self.inner.flush()
+
+    def archive_closed_months(self, data):
+        self.flush()
+        return self.inner.archive_closed_months(data)
+
+    def files(self):
+        return self.inner.files()
+
+    def changed_on_disk(self):
+        # Queued edits go out first so a reload cannot drop them
+        self.flush()
+        return self.inner.changed_on_disk()
+
+    def close(self):
+        self.flush()
+        self.inner.close()
+
+
+def import_json(json_path=DATA_FILE, db_path=DB_FILE):
+    """One-shot import of a data.json file (any layout) into SQLite"""
+    data = JournalStorage(json_path).load()
+    storage = SqliteStorage(db_path, import_from=None)
+    try:
+        storage.save(data)
+    finally:
+        storage.close()
+    return data
+
+
+STORAGE_BACKENDS = {
+    'json': JsonStorage,
+    'journal': JournalStorage,
+    'sqlite': SqliteStorage,
+    'binary': BinaryStorage,
+}
+
+
+def open_storage(kind='journal'):
+    """Create a storage backend by name"""
+    return STORAGE_BACKENDS[kind]()
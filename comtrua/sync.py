@@ -0,0 +1,345 @@
+"""Merging data edited on several devices.
+
+Every edit is stamped with a hybrid logical clock ``ts``: wall-clock
+milliseconds shifted left 10 bits, with the low bits holding a tag derived
+from the device id. Timestamps grow on each device even if its clock goes
+back, and two devices never produce the same one.
+
+``data['sync']`` keeps ``[ts, seq]`` for every cell, user and price entry
+edited since tracking began, where ``seq`` counts changes applied on this
+device (local edits and merged ones alike). A delta for a peer is
+everything with a seq above what that peer has already received, minus
+the seq ranges that were merged from that very peer, so it is found
+without comparing whole files and nothing is echoed back. Merging keeps,
+per cell, the value with the larger ts (last writer wins) and records
+overwritten values in an audit list. Registry entries (a user's name and
+whether they are deleted) and price entries merge the same way.
+
+Data from before tracking has ts 0. Between two untracked values, days
+eaten and active users are united and the higher price wins, so both devices end
+up with the same result.
+"""
+import gzip
+import json
+import time
+import uuid
+import zlib
+from datetime import date
+
+# Audit entries kept in data['sync']['audit'], oldest dropped first
+AUDIT_LIMIT = 500
+
+TAG_BITS = 10
+
+# Entries of a delta's lists, as make_delta writes them
+DELTA_ENTRIES = {
+    'cells': (str, 'date', bool, int),      # user id, date, eaten, ts
+    'users': (str, str, bool, int),         # user id, name, active, ts
+    'prices': ('date', int, int),           # effective date, price, ts
+}
+
+
+def new_sync_state():
+    return {
+        'device': uuid.uuid4().hex,
+        'clock': 0,     # largest ts seen
+        'seq': 0,       # changes applied on this device
+        'cells': {},    # {user id: {date: [ts, seq]}}
+        'users': {},    # {user id: [ts, seq]}
+        'prices': {},   # {effective_date: [ts, seq]}
+        'peers': {},    # {device: {'seq', 'acked', 'received'}}, see note_merge
+        'audit': [],
+    }
+
+
+def device_tag(device):
+    return int(device[:4], 16) & ((1 << TAG_BITS) - 1)
+
+
+def next_timestamp(state):
+    """A ts later than any seen so far, ending in this device's tag"""
+    tag = device_tag(state['device'])
+    ts = (int(time.time() * 1000) << TAG_BITS) | tag
+    if ts <= state['clock']:
+        ts = (((state['clock'] >> TAG_BITS) + 1) << TAG_BITS) | tag
+    return ts
+
+
+def note_change(state, record, ts):
+    """Record the version of whatever a stamped edit touched"""
+    state['seq'] += 1
+    version = [ts, state['seq']]
+    if ts > state['clock']:
+        state['clock'] = ts
+    op = record['op']
+    if op == 'mark':
+        state['cells'].setdefault(record['user'], {})[record['date']] = version
+    elif op == 'mark_many':
+        for user_id in record['users']:
+            cells = state['cells'].setdefault(user_id, {})
+            for date_str in record['dates']:
+                cells[date_str] = version
+    elif op == 'user':
+        state['users'][record['user']] = version
+    elif op == 'meal_price' and 'from' in record:
+        state['prices'][record['from']] = version
+
+
+def note_merge(state, record, first_seq):
+    """Remember how far a peer's changes were merged, and keep the audit
+
+    Per peer, ``seq`` is the peer's seq merged here and ``acked`` ours the
+    peer says it has merged. ``first_seq`` is our seq before the merge, so
+    [first_seq + 1, seq] came from the peer and goes into ``received``,
+    which is never sent back to it.
+    """
+    peer = state['peers'].setdefault(record['peer'], new_peer())
+    peer['seq'] = max(peer['seq'], record['peer_seq'])
+    received = peer['received']
+    if state['seq'] > first_seq:
+        received.append([first_seq + 1, state['seq']])
+    # The peer has everything of ours up to ack; older ranges are moot
+    ack = record.get('ack', 0)
+    peer['acked'] = max(peer.get('acked', 0), ack)
+    received[:] = [r for r in received if r[1] > ack]
+    if record.get('audit'):
+        state['audit'].extend(record['audit'])
+        del state['audit'][:-AUDIT_LIMIT]
+
+
+def new_peer():
+    return {'seq': 0, 'acked': 0, 'received': []}
+
+
+def peer_state(state, device):
+    peer = state['peers'].get(device) or new_peer()
+    return dict(new_peer(), **peer)
+
+
+def make_delta(data, since=0, peer=None):
+    """Everything changed here after our seq ``since``, for device ``peer``"""
+    state = data['sync']
+    store = data['attendance']
+    users = data['settings']['users']
+    history = dict(data['settings']['meal_price'])
+    known = peer_state(state, peer)
+    received = known['received']
+    if since < state.get('archived_seq', 0):
+        # Some of what the peer lacks sits in archived months
+        store.load_all()
+
+    def wanted(seq):
+        if seq <= since:
+            return False
+        return not any(lo <= seq <= hi for lo, hi in received)
+
+    delta = {
+        'device': state['device'],
+        'seq': state['seq'],
+        'ack': known['seq'],
+        'cells': [],
+        'users': [],
+        'prices': [],
+    }
+    for user_id, cells in state['cells'].items():
+        days = store.get(user_id, {})
+        for date_str, (ts, seq) in cells.items():
+            if wanted(seq):
+                delta['cells'].append([user_id, date_str, bool(days.get(date_str)), ts])
+    for user_id, (ts, seq) in state['users'].items():
+        entry = users.get(user_id)
+        if wanted(seq) and entry is not None:
+            delta['users'].append([user_id, entry['name'], entry['active'], ts])
+    for date_str, (ts, seq) in state['prices'].items():
+        if wanted(seq) and date_str in history:
+            delta['prices'].append([date_str, history[date_str], ts])
+    if since == 0:
+        # Untracked data from before sync existed goes out with ts 0
+        for user_id in store:
+            cells = state['cells'].get(user_id, {})
+            for date_str in store[user_id]:
+                if date_str not in cells:
+                    delta['cells'].append([user_id, date_str, True, 0])
+        for user_id in users:
+            if user_id not in state['users']:
+                entry = users.get(user_id)
+                delta['users'].append([user_id, entry['name'], entry['active'], 0])
+        delta['prices'].extend(
+            [date_str, price, 0] for date_str, price in history.items()
+            if date_str not in state['prices']
+        )
+    return delta
+
+
+def _is_kind(value, kind):
+    if kind == 'date':
+        if not isinstance(value, str) or len(value) != 10:
+            return False
+        try:
+            date.fromisoformat(value)
+        except ValueError:
+            return False
+        return True
+    # bool is an int too, but not the other way round
+    return isinstance(value, kind) and (kind is bool or not isinstance(value, bool))
+
+
+def check_delta(delta):
+    """Raise ValueError unless delta is laid out as make_delta makes them
+
+    Run on anything received before merging it, so a malformed delta is
+    turned away instead of failing halfway through the merge.
+    """
+    if not isinstance(delta, dict):
+        raise ValueError("delta is not an object")
+    if not isinstance(delta.get('device'), str) or not delta['device']:
+        raise ValueError("delta has no device")
+    # ack may be left out, seq may not
+    for key, value in (('seq', delta.get('seq')), ('ack', delta.get('ack', 0))):
+        if not _is_kind(value, int):
+            raise ValueError(f"delta {key} is not an integer")
+    for key, kinds in DELTA_ENTRIES.items():
+        entries = delta.get(key)
+        if not isinstance(entries, list):
+            raise ValueError(f"delta {key} is not a list")
+        for entry in entries:
+            if not (isinstance(entry, list) and len(entry) == len(kinds)
+                    and all(_is_kind(v, kind) for v, kind in zip(entry, kinds))):
+                raise ValueError(f"bad entry in delta {key}: {entry!r:.80}")
+
+
+def resolve(delta, data):
+    """Records that apply a peer's delta last-writer-wins, plus the audit
+
+    Records carry the peer's ts so the versions stay comparable; a record
+    is also made when the value is already right but the peer's version
+    is newer, so later merges see the same versions on every device.
+    """
+    state = data['sync']
+    store = data['attendance']
+    users = data['settings']['users']
+    history = dict(data['settings']['meal_price'])
+    peer = delta['device']
+    records = []
+    audit = []
+    # Versions of archived cells come back with their year
+    store.load_years({int(date_str[:4]) for _, date_str, _, _ in delta['cells']})
+
+    def conflict(kind, key, local, remote, winner):
+        audit.append({
+            'kind': kind, 'key': key, 'local': local, 'remote': remote,
+            'kept': winner, 'peer': peer, 'at': int(time.time()),
+        })
+
+    # Users first, so the cells below belong to someone known here
+    for user_id, name, active, ts in delta['users']:
+        local_ts = state['users'].get(user_id, (0, 0))[0]
+        entry = users.get(user_id)
+        local = [entry['name'], entry['active']] if entry else None
+        remote = [name, active]
+        take = ts > local_ts or (
+            ts == local_ts == 0 and (local is None or (active and not local[1]))
+        )
+        if take:
+            if local_ts and local != remote:
+                conflict('user', user_id, local, remote, 'remote')
+            records.append({
+                'op': 'user', 'user': user_id, 'name': name,
+                'active': active, 'ts': ts,
+            })
+        elif ts and ts < local_ts and local != remote:
+            conflict('user', user_id, local, remote, 'local')
+
+    for user_id, date_str, value, ts in delta['cells']:
+        local_ts = state['cells'].get(user_id, {}).get(date_str, (0, 0))[0]
+        local = bool(store[user_id].get(date_str)) if user_id in store else False
+        if ts > local_ts or (ts == local_ts == 0 and value and not local):
+            if local_ts and local != value:
+                conflict('cell', [user_id, date_str], local, value, 'remote')
+            if ts > local_ts or local != value:
+                records.append({
+                    'op': 'mark', 'user': user_id, 'date': date_str,
+                    'value': value, 'ts': ts,
+                })
+        elif ts and ts < local_ts and local != value:
+            conflict('cell', [user_id, date_str], local, value, 'local')
+
+    for date_str, price, ts in delta['prices']:
+        local_ts = state['prices'].get(date_str, (0, 0))[0]
+        local = history.get(date_str)
+        take = ts > local_ts or (
+            ts == local_ts == 0 and (local is None or price > local)
+        )
+        if take:
+            if local is not None and local != price:
+                conflict('price', date_str, local, price, 'remote')
+            records.append({
+                'op': 'meal_price', 'value': price, 'from': date_str, 'ts': ts,
+            })
+        elif local != price:
+            conflict('price', date_str, local, price, 'local')
+
+    return records, audit
+
+
+def merge(app, delta):
+    """Merge a peer's delta into app as one atomic edit; returns the audit"""
+    with app.locked():
+        records, audit = resolve(delta, app.data)
+        known = peer_state(app.data['sync'], delta['device'])
+        ack = delta.get('ack', 0)
+        if not records and not audit and delta['seq'] <= known['seq'] and \
+                ack <= known['acked']:
+            return audit  # nothing new: don't write an empty record
+        app._commit({
+            'op': 'sync',
+            'peer': delta['device'],
+            'peer_seq': delta['seq'],
+            'ack': ack,
+            'records': records,
+            'audit': audit,
+        })
+    return audit
+
+
+def encode_body(obj, compress):
+    """A delta (or any JSON) as sent over HTTP, optionally gzipped"""
+    body = json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return gzip.compress(body) if compress else body
+
+
+class BodyTooLarge(ValueError):
+    """A body that decompresses to more than the limit given"""
+
+
+def decode_body(body, compressed, limit=None):
+    """Parse a body from encode_body; gzip output is capped at limit bytes"""
+    if compressed:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if limit is None:
+            body = decompressor.decompress(body)
+        else:
+            body = decompressor.decompress(body, limit + 1)
+            if decompressor.unconsumed_tail or len(body) > limit:
+                raise BodyTooLarge(f"body decompresses to over {limit} bytes")
+        if not decompressor.eof:
+            raise ValueError("truncated gzip body")
+    return json.loads(body.decode('utf-8'))
+
+
+def delta_for(app, peer, since=None):
+    """make_delta for device ``peer``, by default from what it acknowledged"""
+    with app.locked():
+        if since is None:
+            since = peer_state(app.data['sync'], peer)['acked']
+        return make_delta(app.data, since, peer)
+
+
+def sync_pair(app_a, app_b):
+    """Exchange deltas between two apps in both directions"""
+    device_a = app_a.data['sync']['device']
+    device_b = app_b.data['sync']['device']
+    to_b = delta_for(app_a, device_b)
+    audit = merge(app_b, to_b)
+    # B's reply acknowledges what it just merged from A
+    return audit + merge(app_a, delta_for(app_b, device_a))
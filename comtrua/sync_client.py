@@ -0,0 +1,136 @@
+"""Keep a LunchApp in sync with a comtrua.sync_server.
+
+``SyncClient.sync()`` does one round trip: it posts the changes made since
+the server last acknowledged this device and merges the server's reply.
+``BackgroundSync`` runs that from an asyncio task: edits wake it, a short
+pause lets a burst of edits go out as one request, the server is also
+polled every ``interval`` seconds, and failures are retried with
+exponential backoff. The blocking HTTP call runs in a worker thread, so
+the Flet event loop never waits on the network.
+"""
+import asyncio
+import logging
+import random
+import urllib.request
+
+from comtrua.sync import check_delta, decode_body, delta_for, encode_body, merge
+
+# Sync server URL, e.g. "http://192.168.1.10:8765"; None disables sync
+SYNC_URL = None
+# Seconds to wait after an edit so a burst of edits is sent together
+SYNC_DELAY = 1.0
+# Seconds between polls for other devices' changes
+SYNC_INTERVAL = 30.0
+# Retry after a failed sync: RETRY_MIN doubling up to RETRY_MAX seconds
+RETRY_MIN = 2.0
+RETRY_MAX = 300.0
+HTTP_TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+
+
+class SyncClient:
+    def __init__(self, app, url, timeout=HTTP_TIMEOUT):
+        self.app = app
+        self.url = url.rstrip('/') + '/sync'
+        self.timeout = timeout
+        self.server_device = None
+
+    def _request(self, body=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+            headers['Content-Encoding'] = 'gzip'
+        request = urllib.request.Request(self.url, data=body, headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            compressed = response.headers.get('Content-Encoding') == 'gzip'
+            raw = response.read()
+        return decode_body(raw, compressed), len(raw)
+
+    def sync(self):
+        """Push local changes, merge the server's; returns byte and cell counts
+
+        Raises OSError (including urllib's URLError) when the server can't
+        be reached, and ValueError on a garbled reply.
+        """
+        if self.server_device is None:
+            self.server_device = self._request()[0]['device']
+        delta = delta_for(self.app, self.server_device)
+        body = encode_body(delta, compress=True)
+        reply, received = self._request(body)
+        check_delta(reply)
+        if reply['device'] != self.server_device:
+            # The server was reset; start over with a full exchange
+            self.server_device = None
+            raise ValueError("sync server changed identity")
+        audit = merge(self.app, reply)
+        return {
+            'bytes_sent': len(body),
+            'bytes_received': received,
+            'cells_sent': len(delta['cells']),
+            'cells_received': len(reply['cells']),
+            'conflicts': len(audit),
+        }
+
+
+class BackgroundSync:
+    """Run SyncClient.sync() on an asyncio loop after edits and on a timer"""
+
+    def __init__(self, app, url, delay=SYNC_DELAY, interval=SYNC_INTERVAL):
+        self.client = SyncClient(app, url)
+        self.app = app
+        self.delay = delay
+        self.interval = interval
+        self.last_result = None
+        self.last_error = None
+        self._loop = None
+        self._wake = None
+        self._task = None
+
+    def start(self, loop):
+        """Start the sync task on loop; app edits (from any thread) wake it"""
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._task = asyncio.run_coroutine_threadsafe(self._run(), loop)
+        if hasattr(self.app, 'subscribe'):
+            self.app.subscribe(self._on_change)
+
+    def _on_change(self, record):
+        # Merges and reloads come from elsewhere; only local edits go out
+        if record['op'] not in ('sync', 'reload'):
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self):
+        failures = 0
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+                await asyncio.sleep(self.delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                self.last_result = await asyncio.to_thread(self.client.sync)
+                self.last_error = None
+                failures = 0
+                continue
+            except (OSError, ValueError, KeyError) as e:
+                # Server unreachable or a garbled reply
+                logger.warning("Sync failed: %s", e)
+                self.last_error = str(e)
+            except Exception as e:
+                # Anything else (e.g. http.client.HTTPException) must not
+                # end the task either; it is retried the same way
+                logger.exception("Sync failed")
+                self.last_error = f"{type(e).__name__}: {e}"
+            failures += 1
+            backoff = min(RETRY_MIN * 2 ** (failures - 1), RETRY_MAX)
+            # Jitter keeps devices that lost the server together apart
+            await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+
+    def stop(self):
+        if hasattr(self.app, 'unsubscribe'):
+            self.app.unsubscribe(self._on_change)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,135 @@
+"""A small HTTP server that devices sync through.
+
+The server keeps its own copy of the data and is just another peer to
+comtrua.sync: every device merges with it, and so with every other device.
+
+    GET  /sync  -> {"device": ..., "seq": ...}
+    POST /sync  <- the device's delta since the server last acknowledged it
+                -> the server's delta for that device, after merging
+
+Bodies are JSON, gzip-compressed when sent with ``Content-Encoding: gzip``;
+replies are compressed when the request accepts gzip. Run it with
+``python -m comtrua serve``; it listens on localhost unless given
+``--host``.
+"""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from comtrua.shared import SharedLunchApp
+from comtrua.storage import JournalStorage
+from comtrua.sync import (
+    BodyTooLarge, check_delta, decode_body, delta_for, encode_body, merge,
+)
+from comtrua.users import UserRegistry
+
+SERVER_DATA_FILE = "sync-server.json"
+SYNC_PORT = 8765
+# Largest request body accepted, both as sent and once decompressed
+MAX_BODY = 64 * 2**20
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    server_version = "ComTruaSync/1"
+
+    def do_GET(self):
+        if self.path != '/sync':
+            self.send_error(404)
+            return
+        state = self.server.app.data['sync']
+        self._reply({'device': state['device'], 'seq': state['seq']})
+
+    def do_POST(self):
+        if self.path != '/sync':
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            self.send_error(413)
+            return
+        try:
+            compressed = self.headers.get('Content-Encoding') == 'gzip'
+            delta = decode_body(self.rfile.read(length), compressed, MAX_BODY)
+            check_delta(delta)
+            peer = delta['device']
+        except BodyTooLarge:
+            self.send_error(413)
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.send_error(400, str(e))
+            return
+        app = self.server.app
+        with app.locked():
+            merge(app, delta)
+            # The device has what it sent plus what it acknowledged
+            reply = delta_for(app, peer, delta.get('ack', 0))
+        self._reply(reply)
+
+    def _reply(self, obj):
+        compress = 'gzip' in (self.headers.get('Accept-Encoding') or '')
+        body = encode_body(obj, compress)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def open_server_app(path=SERVER_DATA_FILE):
+    """The server's SharedLunchApp, kept in ``path`` (a journaled JSON file)"""
+    storage = JournalStorage(path)
+    fresh = not any(os.path.exists(p) for p in storage.files())
+    app = SharedLunchApp(storage, watch_interval=0)
+    if fresh:
+        # Start empty: default names and price would otherwise merge into
+        # every device as if someone had entered them
+        app.data['settings']['users'] = UserRegistry()
+        app.data['settings']['meal_price'] = []
+        app.save_data()
+    return app
+
+
+class SyncServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, app, host='127.0.0.1', port=SYNC_PORT, quiet=False):
+        self.app = app
+        self.quiet = quiet
+        super().__init__((host, port), SyncHandler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_server(app=None, host='127.0.0.1', port=0, quiet=True):
+    """Run a SyncServer on a daemon thread; port 0 picks a free one"""
+    if app is None:
+        app = open_server_app()
+    server = SyncServer(app, host, port, quiet)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve(path=SERVER_DATA_FILE, host='127.0.0.1', port=SYNC_PORT):
+    """Serve until interrupted, keeping the server's data in ``path``
+
+    The server has no authentication: only bind it to a trusted network.
+    """
+    app = open_server_app(path)
+    server = SyncServer(app, host, port)
+    print(f"Sync server on {server.url}, data in {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        app.close()
@@ -0,0 +1,130 @@
+"""User registry: stable ids behind the display names.
+
+Attendance, sync versions and edit records are keyed by a user id that
+never changes, so renaming someone or deleting them (a soft delete that
+keeps their history) touches one registry entry however many years they
+have. ``settings['users']`` holds ``{id: {"name": ..., "active": bool}}``
+in display order, and a {name: id} index answers lookups by name.
+
+An id is derived from the name it was created with, so devices that
+migrate the same names, or add the same person independently, agree on
+it. Only when that id already belongs to someone else (a renamed user)
+is a random one used.
+
+Data written before ids existed keys everything by name; a step in
+comtrua.migrations converts it once.
+"""
+import uuid
+
+# Namespace of the ids derived from names
+ID_NAMESPACE = uuid.UUID('2f6c1d1e-8f0b-4c3a-9a57-6f3b8a4e21c0')
+
+
+def name_id(name):
+    return uuid.uuid5(ID_NAMESPACE, name).hex[:12]
+
+
+class UserRegistry:
+    """{id: {'name', 'active'}} plus a name -> id index
+
+    A name belonging to several users (possible after merging devices)
+    maps to an active one if there is one.
+    """
+
+    def __init__(self, users=None):
+        self._users = users if users is not None else {}
+        self._by_name = {}
+        self._names = None  # active names in order, rebuilt when needed
+        for user_id, entry in self._users.items():
+            self._index(user_id, entry)
+
+    @classmethod
+    def from_json(cls, encoded):
+        return cls({
+            user_id: {'name': entry['name'], 'active': bool(entry['active'])}
+            for user_id, entry in encoded.items()
+        })
+
+    def to_json(self):
+        return {user_id: dict(entry) for user_id, entry in list(self._users.items())}
+
+    @classmethod
+    def from_names(cls, names, hidden=()):
+        """Registry of active ``names`` and deleted ``hidden`` ones, ids from names"""
+        registry = cls()
+        for active, group in ((True, names), (False, hidden)):
+            for name in group:
+                if registry.id_of(name) is None:
+                    registry.set(registry.new_id(name), name, active)
+        return registry
+
+    def _index(self, user_id, entry):
+        holder = self._by_name.get(entry['name'])
+        if holder is None or (entry['active'] and not self._users[holder]['active']):
+            self._by_name[entry['name']] = user_id
+
+    def __eq__(self, other):
+        if not isinstance(other, UserRegistry):
+            return NotImplemented
+        return self._users == other._users
+
+    def __contains__(self, user_id):
+        return user_id in self._users
+
+    def __iter__(self):
+        return iter(self._users)
+
+    def __len__(self):
+        return len(self._users)
+
+    def get(self, user_id):
+        """{'name', 'active'} of a user, or None"""
+        return self._users.get(user_id)
+
+    def id_of(self, name):
+        """Id of the user called name, deleted ones included, or None"""
+        return self._by_name.get(name)
+
+    def name_of(self, user_id):
+        entry = self._users.get(user_id)
+        return entry['name'] if entry else None
+
+    def is_active(self, user_id):
+        entry = self._users.get(user_id)
+        return bool(entry and entry['active'])
+
+    def names(self):
+        """Active names in display order"""
+        if self._names is None:
+            self._names = [
+                entry['name'] for entry in list(self._users.values()) if entry['active']
+            ]
+        return self._names
+
+    def new_id(self, name):
+        """Id for a new user called name"""
+        user_id = name_id(name)
+        while user_id in self._users:
+            user_id = uuid.uuid4().hex[:12]
+        return user_id
+
+    def set(self, user_id, name, active):
+        """Create, rename, delete or restore a user
+
+        A user coming back (deleted -> active) moves to the end of the
+        list, as a newly added name would.
+        """
+        old = self._users.get(user_id)
+        if old is not None:
+            if active and not old['active']:
+                del self._users[user_id]
+            if self._by_name.get(old['name']) == user_id:
+                del self._by_name[old['name']]
+                # Someone else with the old name (e.g. deleted) takes it back
+                for other_id, other in self._users.items():
+                    if other_id != user_id and other['name'] == old['name']:
+                        self._index(other_id, other)
+        entry = self._users[user_id] = {'name': name, 'active': bool(active)}
+        self._index(user_id, entry)
+        self._names = None
+
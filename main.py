@@ -1,138 +1,140 @@
 import flet as ft
-import json
+import logging
 import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import calendar
 import asyncio
 import time
+import unicodedata
+from functools import lru_cache
 
-# File to store data
-DATA_FILE = "data.json"
-MEAL_PRICE = 40000
+from comtrua import diagnostics
+from comtrua.analytics import Analytics
+from comtrua.core import WEEKDAYS_VN, format_date_with_weekday, monthly_report
+from comtrua.export import data_years, export, export_formats
+from comtrua.prices import FIRST_DATE
+from comtrua.reports import (
+    ReportCache, quarter_range, range_report, report_key, year_range,
+)
+from comtrua.diagnostics import timed
+from comtrua.shared import get_shared_app
 
-# Vietnamese day names
-WEEKDAYS_VN = {
-    0: "Thứ Hai",
-    1: "Thứ Ba",
-    2: "Thứ Tư",
-    3: "Thứ Năm",
-    4: "Thứ Sáu",
-    5: "Thứ Bảy",
-    6: "Chủ Nhật"
-}
+# Keep the splash visible at least this long (seconds), 0 to skip
+SPLASH_MIN_SECONDS = 1.0
 
-def format_date_with_weekday(date_obj):
-    """Format date as 'Thứ X, DD/MM/YYYY'"""
-    weekday_name = WEEKDAYS_VN[date_obj.weekday()]
-    date_str = date_obj.strftime("%d/%m/%Y")
-    return f"{weekday_name}, {date_str}"
+# Duration of each startup phase in seconds, filled in by main()
+STARTUP_TIMINGS = {}
 
-class LunchApp:
-    def __init__(self):
-        self.data = self.load_data()
-        
-    def load_data(self):
-        """Load data from JSON file with migration support"""
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            # Migrate old format to new format
-            if 'settings' not in data:
-                # Old format detected, migrate
-                old_attendance = data.copy()
-                data = {
-                    'settings': {
-                        'names': ["Anh Dương", "Anh Long", "Anh Vinh", "Hưng"],
-                        'meal_price': 40000
-                    },
-                    'attendance': old_attendance
-                }
-                self.data = data
-                self.save_data()  # Save migrated data
-                return data
-            
-            return data
-        
-        # New installation - return default structure
-        return {
-            'settings': {
-                'names': ["Anh Dương", "Anh Long", "Anh Vinh", "Hưng"],
-                'meal_price': 40000
-            },
-            'attendance': {}
-        }
+# Folder the export screen writes its files to
+EXPORT_DIR = "exports"
+
+# Column headings of the month grid, Monday first
+WEEKDAY_INITIALS = ["T2", "T3", "T4", "T5", "T6", "T7", "CN"]
+
+# Rows built per step in long name lists; more are built while scrolling
+ROW_BATCH = 40
+
+# Seconds without edits from other sessions before a report screen is
+# recomputed for them
+RECOMPUTE_DELAY = 0.3
+
+@lru_cache(maxsize=4096)
+def search_key(text):
+    """Lowercase text without Vietnamese accents, for accent-free search"""
+    text = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    return "".join(c for c in text if not unicodedata.combining(c)).casefold()
+
+def filter_names(names, query):
+    """Names containing query, ignoring case and accents"""
+    query = search_key(query.strip())
+    if not query:
+        return list(names)
+    return [name for name in names if query in search_key(name)]
+
+class LazyRows:
+    """ListView showing one row per name, building rows only as needed
     
-    def save_data(self):
-        """Save data to JSON file"""
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
-    
-    def get_names(self):
-        """Get list of user names"""
-        return self.data['settings']['names']
-    
-    def add_name(self, name):
-        """Add a new user name"""
-        if name and name not in self.data['settings']['names']:
-            self.data['settings']['names'].append(name)
-            self.save_data()
-            return True
-        return False
-    
-    def delete_name(self, name):
-        """Delete a user name (keeps attendance data)"""
-        if name in self.data['settings']['names']:
-            self.data['settings']['names'].remove(name)
-            self.save_data()
-            return True
-        return False
-    
-    def get_meal_price(self):
-        """Get current meal price"""
-        return self.data['settings']['meal_price']
-    
-    def set_meal_price(self, price):
-        """Set meal price"""
-        try:
-            price_int = int(price)
-            if price_int > 0:
-                self.data['settings']['meal_price'] = price_int
-                self.save_data()
-                return True
-        except ValueError:
-            pass
-        return False
+    Only the first ROW_BATCH rows are built when a list is shown; the next
+    batch is added as the user scrolls near the end. Built rows are kept
+    per name and reused, and fill_row(name, row) writes current values
+    into a row before it is displayed.
+    """
     
-    def get_user_data(self, name):
-        """Get user data or create new entry"""
-        if 'attendance' not in self.data:
-            self.data['attendance'] = {}
-        
-        if name not in self.data['attendance']:
-            self.data['attendance'][name] = {}
-        return self.data['attendance'][name]
-    
-    def mark_attendance(self, name, date_str, attended):
-        """Mark attendance for a specific date"""
-        user_data = self.get_user_data(name)
-        user_data[date_str] = attended
-        self.save_data()
-    
-    def get_monthly_report(self, name, month, year):
-        """Generate monthly report for a user"""
-        user_data = self.get_user_data(name)
-        month_key_prefix = f"{year}-{month:02d}"
-        
-        days_attended = 0
-        for date_str, attended in user_data.items():
-            if date_str.startswith(month_key_prefix) and attended:
-                days_attended += 1
-        
-        total_cost = days_attended * self.get_meal_price()
-        return days_attended, total_cost
+    def __init__(self, build_row, fill_row, spacing=10):
+        self.build_row = build_row
+        self.fill_row = fill_row
+        self.rows = {}
+        self.names = []
+        self.view = ft.ListView(
+            spacing=spacing,
+            expand=True,
+            on_scroll=self.on_scroll,
+            scroll_interval=100,
+        )
+    
+    def show(self, names):
+        """Display names from the top, building only the first batch"""
+        self.names = list(names)
+        self.view.controls.clear()
+        self.load_more()
+    
+    def load_more(self):
+        """Build and append the next batch; False when all are shown"""
+        shown = len(self.view.controls)
+        for name in self.names[shown:shown + ROW_BATCH]:
+            row = self.rows.get(name)
+            if row is None:
+                row = self.rows[name] = self.build_row(name)
+            self.fill_row(name, row)
+            self.view.controls.append(row)
+        return len(self.view.controls) > shown
+    
+    def refresh(self):
+        """Refill the rows currently on screen"""
+        for name, row in zip(self.names, self.view.controls):
+            self.fill_row(name, row)
+    
+    def add(self, name):
+        """Append a name, building its row only if the list end is loaded"""
+        self.names.append(name)
+        if len(self.view.controls) == len(self.names) - 1:
+            self.load_more()
+    
+    def remove(self, name):
+        """Drop a name and forget its row"""
+        row = self.rows.pop(name, None)
+        if name in self.names:
+            self.names.remove(name)
+        if row in self.view.controls:
+            self.view.controls.remove(row)
+    
+    def on_scroll(self, e):
+        if e.pixels >= e.max_scroll_extent - e.viewport_dimension and self.load_more():
+            self.view.update()
 
-def main(page: ft.Page):
+def search_field(on_search):
+    """Search box calling on_search() on every change"""
+    return ft.TextField(
+        label="Tìm tên",
+        prefix_icon=ft.Icons.SEARCH,
+        dense=True,
+        on_change=lambda _: on_search(),
+    )
+
+async def main(page: ft.Page):
+    startup_start = time.perf_counter()
+    phase_start = [startup_start]
+    if diagnostics.DIAGNOSTICS:
+        diagnostics.enable()
+    
+    def mark_phase(phase):
+        """Record how long a startup phase took"""
+        now = time.perf_counter()
+        STARTUP_TIMINGS[phase] = now - phase_start[0]
+        if diagnostics.is_enabled():
+            diagnostics.record(f"startup.{phase}", now - phase_start[0])
+        phase_start[0] = now
+    
     page.title = "App Cơm Trưa"
     page.theme_mode = ft.ThemeMode.LIGHT
     page.padding = 0
@@ -140,7 +142,31 @@ def main(page: ft.Page):
     page.window.width = 400
     page.window.height = 700
     
-    app = LunchApp()
+    def update_page():
+        """page.update(), timed apart from the handler that calls it"""
+        with diagnostics.span("page.update"):
+            page.update()
+    
+    app = None  # Loaded in the background while the splash is showing
+    
+    def on_lifecycle_change(e):
+        """Flush pending edits when the app goes to the background"""
+        if app is not None and e.state in (
+            ft.AppLifecycleState.INACTIVE,
+            ft.AppLifecycleState.HIDE,
+            ft.AppLifecycleState.PAUSE,
+            ft.AppLifecycleState.DETACH,
+        ):
+            app.flush()
+    
+    page.on_app_lifecycle_state_change = on_lifecycle_change
+    def on_session_close(e):
+        """The app is shared with other sessions: detach and flush, don't close"""
+        if app is not None:
+            app.unsubscribe(on_data_change)
+            app.flush()
+    
+    page.on_close = on_session_close
     
     # UI Components
     
@@ -174,14 +200,31 @@ def main(page: ft.Page):
         keyboard_type=ft.KeyboardType.NUMBER,
     )
     
-    attendance_container = ft.Column(spacing=10, scroll="auto")
-    report_container = ft.Column(spacing=10)
     main_container = ft.Column(spacing=15, expand=True)
     
+    # Screens are built once and stay mounted; navigating only flips
+    # `visible` and updates values, so page.update() sends just the diff
+    screens = {}
+    current_screen = [None]
+    
+    def show_screen(key, build):
+        """Show a cached screen, building it on first use"""
+        current_screen[0] = key
+        if key not in screens:
+            screens[key] = build()
+            main_container.controls.append(screens[key])
+        for screen_key, screen in screens.items():
+            screen.visible = screen_key == key
+        return screens[key]
+    
+    @timed("show_splash")
     def show_splash():
-        """Show splash screen with logo for 5 seconds"""
-        main_container.controls.clear()
-        
+        """Show splash screen with logo"""
+        show_screen("splash", build_splash)
+        update_page()
+    
+    def build_splash():
+        """Build the splash screen"""
         # Check if logo exists
         logo_path = "logo.png"
         logo_widget = None
@@ -215,480 +258,1543 @@ def main(page: ft.Page):
             alignment=ft.MainAxisAlignment.CENTER,
         )
         
-        main_container.controls.append(
-            ft.Container(
-                content=splash_content,
-                bgcolor=ft.Colors.ORANGE_50,
-                expand=True,
-            )
+        return ft.Container(
+            content=splash_content,
+            bgcolor=ft.Colors.ORANGE_50,
+            expand=True,
         )
-        page.update()
-        
-        # Wait 5 seconds then show home
-        time.sleep(5)
-        show_home()
     
+    today_text = ft.Text("", size=16, color=ft.Colors.GREY_700)
+    
+    @timed("show_home")
     def show_home():
         """Show home screen"""
-        main_container.controls.clear()
-        main_container.controls.extend([
-            ft.Container(
-                content=ft.Column([
-                    ft.Text(
-                        "🍱 App Cơm Trưa",
-                        size=32,
-                        weight=ft.FontWeight.BOLD,
-                        color=ft.Colors.BLUE_700,
-                    ),
-                    ft.Divider(height=20, thickness=2),
-                    ft.Text(
-                        f"Ngày hôm nay: {format_date_with_weekday(datetime.now())}",
-                        size=16,
-                        color=ft.Colors.GREY_700,
-                    ),
-                    ft.Row([month_dropdown, year_input], spacing=10),
-                    ft.Text("Chọn tháng/năm để xem báo cáo", size=14, color=ft.Colors.GREY_600),
-                    ft.Container(height=10),
-                    ft.Button(
-                        "📝 Điểm danh",
-                        icon=ft.Icons.CHECK_CIRCLE,
-                        on_click=lambda _: show_attendance(),
-                        bgcolor=ft.Colors.BLUE_400,
-                        color=ft.Colors.WHITE,
-                        expand=True,
-                    ),
-                    ft.Button(
-                        "📊 Xem báo cáo tháng",
-                        icon=ft.Icons.ASSESSMENT,
-                        on_click=lambda _: show_report(),
-                        bgcolor=ft.Colors.GREEN_400,
-                        color=ft.Colors.WHITE,
-                        expand=True,
-                    ),
-                    ft.Button(
-                        "⚙️ Cài đặt",
-                        icon=ft.Icons.SETTINGS,
-                        on_click=lambda _: show_settings(),
-                        bgcolor=ft.Colors.ORANGE_400,
-                        color=ft.Colors.WHITE,
-                        expand=True,
-                    ),
-                ]),
-                padding=20,
-            )
-        ])
-        page.update()
+        show_screen("home", build_home)
+        today_text.value = f"Ngày hôm nay: {format_date_with_weekday(datetime.now())}"
+        update_page()
+    
+    def build_home():
+        """Build the home screen"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Text(
+                    "🍱 App Cơm Trưa",
+                    size=32,
+                    weight=ft.FontWeight.BOLD,
+                    color=ft.Colors.BLUE_700,
+                ),
+                ft.Divider(height=20, thickness=2),
+                today_text,
+                ft.Row([month_dropdown, year_input], spacing=10),
+                ft.Text("Chọn tháng/năm để xem báo cáo", size=14, color=ft.Colors.GREY_600),
+                ft.Container(height=10),
+                ft.Button(
+                    "📝 Điểm danh",
+                    icon=ft.Icons.CHECK_CIRCLE,
+                    on_click=lambda _: show_attendance(),
+                    bgcolor=ft.Colors.BLUE_400,
+                    color=ft.Colors.WHITE,
+                    expand=True,
+                ),
+                ft.Button(
+                    "🗓️ Bảng điểm danh tháng",
+                    icon=ft.Icons.CALENDAR_VIEW_MONTH,
+                    on_click=lambda _: show_month_grid(),
+                    bgcolor=ft.Colors.INDIGO_400,
+                    color=ft.Colors.WHITE,
+                    expand=True,
+                ),
+                ft.Button(
+                    "📊 Xem báo cáo tháng",
+                    icon=ft.Icons.ASSESSMENT,
+                    on_click=lambda _: show_report(),
+                    bgcolor=ft.Colors.GREEN_400,
+                    color=ft.Colors.WHITE,
+                    expand=True,
+                ),
+                ft.Button(
+                    "📈 Báo cáo năm / quý",
+                    icon=ft.Icons.BAR_CHART,
+                    on_click=lambda _: show_range_report(),
+                    bgcolor=ft.Colors.TEAL_400,
+                    color=ft.Colors.WHITE,
+                    expand=True,
+                ),
+                ft.Button(
+                    "📉 Thống kê điểm danh",
+                    icon=ft.Icons.INSIGHTS,
+                    on_click=lambda _: show_analytics(),
+                    bgcolor=ft.Colors.PURPLE_400,
+                    color=ft.Colors.WHITE,
+                    expand=True,
+                ),
+                ft.Button(
+                    "⚙️ Cài đặt",
+                    icon=ft.Icons.SETTINGS,
+                    on_click=lambda _: show_settings(),
+                    bgcolor=ft.Colors.ORANGE_400,
+                    color=ft.Colors.WHITE,
+                    expand=True,
+                ),
+            ]),
+            padding=20,
+        )
     
+    @timed("show_settings")
     def show_settings():
         """Show settings menu"""
-        main_container.controls.clear()
-        main_container.controls.extend([
-            ft.Container(
-                content=ft.Column([
-                    ft.Row([
-                        ft.IconButton(
-                            icon=ft.Icons.ARROW_BACK,
-                            on_click=lambda _: show_home(),
-                        ),
-                        ft.Text(
+        show_screen("settings", build_settings)
+        settings_title_taps[0] = 0
+        update_page()
+    
+    # Tapping the settings title this many times opens the diagnostics
+    settings_title_taps = [0]
+    
+    def on_settings_title_tap():
+        settings_title_taps[0] += 1
+        if settings_title_taps[0] >= 5:
+            show_diagnostics()
+    
+    def build_settings():
+        """Build the settings menu"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_BACK,
+                        on_click=lambda _: show_home(),
+                    ),
+                    ft.Container(
+                        content=ft.Text(
                             "⚙️ Cài đặt",
                             size=24,
                             weight=ft.FontWeight.BOLD,
                             color=ft.Colors.ORANGE_700,
                         ),
-                    ]),
-                    ft.Divider(height=20, thickness=2),
-                    ft.Container(height=20),
-                    ft.Button(
-                        "👥 Quản lý tên",
-                        icon=ft.Icons.PEOPLE,
-                        on_click=lambda _: show_name_management(),
-                        bgcolor=ft.Colors.PURPLE_400,
-                        color=ft.Colors.WHITE,
-                        expand=True,
-                    ),
-                    ft.Button(
-                        "💰 Cài đặt tiền ăn",
-                        icon=ft.Icons.ATTACH_MONEY,
-                        on_click=lambda _: show_price_settings(),
-                        bgcolor=ft.Colors.AMBER_400,
-                        color=ft.Colors.WHITE,
-                        expand=True,
+                        on_click=lambda _: on_settings_title_tap(),
                     ),
                 ]),
-                padding=20,
+                ft.Divider(height=20, thickness=2),
+                ft.Container(height=20),
+                ft.Button(
+                    "👥 Quản lý tên",
+                    icon=ft.Icons.PEOPLE,
+                    on_click=lambda _: show_name_management(),
+                    bgcolor=ft.Colors.PURPLE_400,
+                    color=ft.Colors.WHITE,
+                    expand=True,
+                ),
+                ft.Button(
+                    "💰 Cài đặt tiền ăn",
+                    icon=ft.Icons.ATTACH_MONEY,
+                    on_click=lambda _: show_price_settings(),
+                    bgcolor=ft.Colors.AMBER_400,
+                    color=ft.Colors.WHITE,
+                    expand=True,
+                ),
+                ft.Button(
+                    "📤 Xuất dữ liệu",
+                    icon=ft.Icons.FILE_DOWNLOAD,
+                    on_click=lambda _: show_export(),
+                    bgcolor=ft.Colors.CYAN_400,
+                    color=ft.Colors.WHITE,
+                    expand=True,
+                ),
+            ]),
+            padding=20,
+        )
+    
+    # Export screen
+    export_kind_dropdown = ft.Dropdown(
+        label="Dữ liệu",
+        width=220,
+        options=[
+            ft.dropdown.Option("attendance", "Điểm danh từng ngày"),
+            ft.dropdown.Option("monthly", "Báo cáo tháng"),
+            ft.dropdown.Option("yearly", "Báo cáo năm"),
+        ],
+        value="monthly",
+    )
+    export_format_dropdown = ft.Dropdown(label="Định dạng", width=120, value="csv")
+    export_from_input = ft.TextField(
+        label="Từ năm",
+        width=120,
+        keyboard_type=ft.KeyboardType.NUMBER,
+    )
+    export_to_input = ft.TextField(
+        label="Đến năm",
+        width=120,
+        keyboard_type=ft.KeyboardType.NUMBER,
+    )
+    export_status_text = ft.Text("", size=14)
+    
+    @timed("export_handler")
+    async def export_handler(e):
+        """Write the chosen export to EXPORT_DIR on a worker thread"""
+        try:
+            first_year = int(export_from_input.value)
+            last_year = int(export_to_input.value)
+        except ValueError:
+            export_status_text.value = "⚠️ Năm không hợp lệ"
+            export_status_text.color = ft.Colors.RED_700
+            update_page()
+            return
+        path = os.path.join(
+            EXPORT_DIR,
+            f"{export_kind_dropdown.value}-{first_year}-{last_year}.{export_format_dropdown.value}",
+        )
+        export_status_text.value = "⏳ Đang xuất..."
+        export_status_text.color = ft.Colors.GREY_700
+        e.control.disabled = True
+        update_page()
+        try:
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            count = await asyncio.to_thread(
+                export, app, export_kind_dropdown.value, path, first_year, last_year
             )
+        except Exception as error:
+            # Whatever went wrong is shown, and the button comes back
+            logging.getLogger(__name__).exception("Export failed")
+            export_status_text.value = f"⚠️ Không xuất được: {error}"
+            export_status_text.color = ft.Colors.RED_700
+        else:
+            export_status_text.value = f"✅ Đã xuất {count - 1} dòng vào {os.path.abspath(path)}"
+            export_status_text.color = ft.Colors.GREEN_700
+        finally:
+            e.control.disabled = False
+        update_page()
+    
+    @timed("show_export")
+    def show_export():
+        """Show the export screen"""
+        show_screen("export", build_export)
+        first_year, last_year = data_years(app)
+        export_from_input.value = str(first_year)
+        export_to_input.value = str(last_year)
+        export_format_dropdown.options = [
+            ft.dropdown.Option(ext, ext.upper()) for ext in export_formats()
+        ]
+        export_status_text.value = ""
+        update_page()
+    
+    def build_export():
+        """Build the export screen"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_BACK,
+                        on_click=lambda _: show_settings(),
+                    ),
+                    ft.Text(
+                        "📤 Xuất dữ liệu",
+                        size=20,
+                        weight=ft.FontWeight.BOLD,
+                        color=ft.Colors.CYAN_700,
+                    ),
+                ]),
+                ft.Divider(height=10, thickness=2),
+                ft.Row([export_kind_dropdown, export_format_dropdown], wrap=True),
+                ft.Row([export_from_input, export_to_input], spacing=10),
+                ft.ElevatedButton(
+                    "📤 Xuất file",
+                    on_click=export_handler,
+                    bgcolor=ft.Colors.GREEN_400,
+                    color=ft.Colors.WHITE,
+                ),
+                export_status_text,
+            ]),
+            padding=20,
+        )
+    
+    # Diagnostics screen (hidden: tap the settings title 5 times)
+    diagnostics_switch = ft.Switch(
+        label="Đo thời gian xử lý",
+        on_change=lambda e: toggle_diagnostics(e.control.value),
+    )
+    diagnostics_rows = ft.Column(spacing=4)
+    diagnostics_status_text = ft.Text("", size=14)
+    
+    def toggle_diagnostics(on):
+        if on:
+            diagnostics.enable()
+        else:
+            diagnostics.disable()
+        show_diagnostics()
+    
+    def reset_diagnostics():
+        diagnostics.reset()
+        show_diagnostics()
+    
+    def diagnostics_line(label, value, bold=False):
+        weight = ft.FontWeight.BOLD if bold else None
+        return ft.Row([
+            ft.Text(label, size=12, expand=True, weight=weight),
+            ft.Text(value, size=12, weight=weight, font_family="monospace"),
         ])
-        page.update()
     
+    def fill_diagnostics():
+        """Timings, file sizes and entry counts as rows"""
+        report = diagnostics.report(app)
+        rows = [diagnostics_line("⏱️ Thời gian (ms)", "n   p50   p95   max", bold=True)]
+        for name, summary in report['timings'].items():
+            if 'p50_ms' in summary:
+                rows.append(diagnostics_line(
+                    name,
+                    f"{summary['count']}  {summary['p50_ms']:.1f}  "
+                    f"{summary['p95_ms']:.1f}  {summary['max_ms']:.1f}",
+                ))
+        if len(rows) == 1:
+            rows.append(ft.Text("Chưa có số liệu", size=12, color=ft.Colors.GREY_600))
+        rows.append(diagnostics_line("📁 Tệp dữ liệu", "KB", bold=True))
+        for path, size in report['files'].items():
+            rows.append(diagnostics_line(path, f"{size / 1024:,.1f}"))
+        rows.append(diagnostics_line("🔢 Số mục", "", bold=True))
+        for key, count in report['entries'].items():
+            rows.append(diagnostics_line(key, f"{count:,}"))
+        if report_cache[0] is not None:
+            cache = report_cache[0]
+            rows.append(diagnostics_line(
+                "Báo cáo đã lưu (trúng/trượt)",
+                f"{len(cache)}  {cache.hits}/{cache.misses}",
+            ))
+        if analytics[0] is not None:
+            stats = analytics[0]
+            rows.append(diagnostics_line(
+                "Thống kê đã lưu (trúng/trượt)",
+                f"{len(stats)}  {stats.hits}/{stats.misses}",
+            ))
+        diagnostics_rows.controls = rows
+    
+    async def export_diagnostics_handler(e):
+        """Write the diagnostics report as JSON to EXPORT_DIR"""
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(
+            EXPORT_DIR, f"diagnostics-{datetime.now():%Y%m%d-%H%M%S}.json"
+        )
+        await asyncio.to_thread(diagnostics.export_json, path, app)
+        diagnostics_status_text.value = f"✅ Đã lưu {os.path.abspath(path)}"
+        update_page()
+    
+    def show_diagnostics():
+        """Show the diagnostics screen"""
+        show_screen("diagnostics", build_diagnostics)
+        diagnostics_switch.value = diagnostics.is_enabled()
+        diagnostics_status_text.value = ""
+        fill_diagnostics()
+        update_page()
+    
+    def build_diagnostics():
+        """Build the diagnostics screen"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_BACK,
+                        on_click=lambda _: show_settings(),
+                    ),
+                    ft.Text(
+                        "🩺 Chẩn đoán",
+                        size=20,
+                        weight=ft.FontWeight.BOLD,
+                        color=ft.Colors.BLUE_GREY_700,
+                    ),
+                ]),
+                ft.Divider(height=10, thickness=2),
+                diagnostics_switch,
+                ft.Row([
+                    ft.ElevatedButton("🔄 Làm mới", on_click=lambda _: show_diagnostics()),
+                    ft.ElevatedButton("🗑️ Xóa số liệu", on_click=lambda _: reset_diagnostics()),
+                    ft.ElevatedButton("💾 Xuất JSON", on_click=export_diagnostics_handler),
+                ], wrap=True),
+                diagnostics_status_text,
+                diagnostics_rows,
+            ]),
+            padding=20,
+        )
+    
+    # Name management screen
+    name_input_field = ft.TextField(
+        label="Tên mới",
+        hint_text="Nhập tên người dùng",
+        expand=True,
+    )
+    name_status_text = ft.Text("", size=14)
+    
+    def build_name_row(name):
+        """Build the row for one name"""
+        return ft.Container(
+            content=ft.Row([
+                ft.Text(
+                    f"👤 {name}",
+                    size=18,
+                    expand=True,
+                ),
+                ft.IconButton(
+                    icon=ft.Icons.EDIT,
+                    icon_color=ft.Colors.BLUE_400,
+                    tooltip="Đổi thành tên đang nhập",
+                    on_click=lambda e, n=name: rename_name_handler(n),
+                ),
+                ft.IconButton(
+                    icon=ft.Icons.DELETE,
+                    icon_color=ft.Colors.RED_400,
+                    tooltip="Xóa",
+                    on_click=lambda e, n=name: delete_name_handler(n),
+                ),
+            ]),
+            padding=10,
+            bgcolor=ft.Colors.BLUE_50,
+            border_radius=5,
+        )
+    
+    name_list = LazyRows(build_name_row, lambda name, row: None, spacing=5)
+    name_search_field = search_field(lambda: on_name_search())
+    
+    def on_name_search():
+        name_list.show(filter_names(app.get_names(), name_search_field.value or ""))
+        update_page()
+    
+    def add_name_handler(e):
+        """Handle adding new name"""
+        new_name = name_input_field.value.strip()
+        if new_name:
+            if app.add_name(new_name):
+                name_input_field.value = ""
+                name_status_text.value = f"✅ Đã thêm '{new_name}'"
+                name_status_text.color = ft.Colors.GREEN_700
+                if filter_names([new_name], name_search_field.value or ""):
+                    name_list.add(new_name)
+            else:
+                name_status_text.value = f"⚠️ Tên '{new_name}' đã tồn tại"
+                name_status_text.color = ft.Colors.ORANGE_700
+        else:
+            name_status_text.value = "⚠️ Vui lòng nhập tên"
+            name_status_text.color = ft.Colors.RED_700
+        update_page()
+    
+    def rename_name_handler(name):
+        """Rename a user to the name typed in the input field"""
+        new_name = name_input_field.value.strip()
+        if not new_name:
+            name_status_text.value = "⚠️ Nhập tên mới vào ô trên rồi bấm ✏️"
+            name_status_text.color = ft.Colors.RED_700
+        elif app.rename_name(name, new_name):
+            # Attendance stays with the user, only the label changes
+            name_input_field.value = ""
+            name_status_text.value = f"✅ Đã đổi '{name}' thành '{new_name}'"
+            name_status_text.color = ft.Colors.GREEN_700
+            name_list.remove(name)
+            on_name_search()
+            return
+        else:
+            name_status_text.value = f"⚠️ Tên '{new_name}' đã tồn tại"
+            name_status_text.color = ft.Colors.ORANGE_700
+        update_page()
+    
+    def delete_name_handler(name):
+        """Handle deleting a name"""
+        if len(app.get_names()) > 1:
+            app.delete_name(name)
+            name_status_text.value = f"✅ Đã xóa '{name}'"
+            name_status_text.color = ft.Colors.GREEN_700
+            name_list.remove(name)
+        else:
+            name_status_text.value = "⚠️ Phải có ít nhất 1 tên"
+            name_status_text.color = ft.Colors.RED_700
+        update_page()
+    
+    @timed("show_name_management")
     def show_name_management():
         """Show name management screen"""
-        def refresh_names():
-            """Refresh the names list display"""
-            names_list.controls.clear()
-            for name in app.get_names():
-                names_list.controls.append(
-                    ft.Container(
-                        content=ft.Row([
-                            ft.Text(
-                                f"👤 {name}",
-                                size=18,
-                                expand=True,
-                            ),
-                            ft.IconButton(
-                                icon=ft.Icons.DELETE,
-                                icon_color=ft.Colors.RED_400,
-                                tooltip="Xóa",
-                                on_click=lambda e, n=name: delete_name_handler(n),
-                            ),
-                        ]),
-                        padding=10,
-                        bgcolor=ft.Colors.BLUE_50,
-                        border_radius=5,
-                        margin=ft.margin.only(bottom=5),
-                    )
-                )
-            page.update()
-        
-        def add_name_handler(e):
-            """Handle adding new name"""
-            new_name = name_input_field.value.strip()
-            if new_name:
-                if app.add_name(new_name):
-                    name_input_field.value = ""
-                    status_text.value = f"✅ Đã thêm '{new_name}'"
-                    status_text.color = ft.Colors.GREEN_700
-                    refresh_names()
-                else:
-                    status_text.value = f"⚠️ Tên '{new_name}' đã tồn tại"
-                    status_text.color = ft.Colors.ORANGE_700
-            else:
-                status_text.value = "⚠️ Vui lòng nhập tên"
-                status_text.color = ft.Colors.RED_700
-            page.update()
-        
-        def delete_name_handler(name):
-            """Handle deleting a name"""
-            if len(app.get_names()) > 1:
-                app.delete_name(name)
-                status_text.value = f"✅ Đã xóa '{name}'"
-                status_text.color = ft.Colors.GREEN_700
-                refresh_names()
-            else:
-                status_text.value = "⚠️ Phải có ít nhất 1 tên"
-                status_text.color = ft.Colors.RED_700
-            page.update()
-        
-        name_input_field = ft.TextField(
-            label="Tên mới",
-            hint_text="Nhập tên người dùng",
-            expand=True,
-        )
-        
-        status_text = ft.Text("", size=14)
-        names_list = ft.Column(spacing=5, scroll="auto")
-        
-        main_container.controls.clear()
-        main_container.controls.extend([
-            ft.Container(
-                content=ft.Column([
-                    ft.Row([
-                        ft.IconButton(
-                            icon=ft.Icons.ARROW_BACK,
-                            on_click=lambda _: show_settings(),
-                        ),
-                        ft.Text(
-                            "👥 Quản lý tên",
-                            size=20,
-                            weight=ft.FontWeight.BOLD,
-                            color=ft.Colors.PURPLE_700,
-                        ),
-                    ]),
-                    ft.Divider(height=10, thickness=2),
-                    ft.Row([
-                        name_input_field,
-                        ft.ElevatedButton(
-                            "➕ Thêm",
-                            on_click=add_name_handler,
-                            bgcolor=ft.Colors.GREEN_400,
-                            color=ft.Colors.WHITE,
-                        ),
-                    ]),
-                    status_text,
-                    ft.Container(height=10),
-                    ft.Text("Danh sách tên:", size=16, weight=ft.FontWeight.BOLD),
-                    ft.Container(
-                        content=names_list,
-                        expand=True,
+        show_screen("names", build_name_management)
+        name_status_text.value = ""
+        on_name_search()
+    
+    def build_name_management():
+        """Build the name management screen"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_BACK,
+                        on_click=lambda _: show_settings(),
+                    ),
+                    ft.Text(
+                        "👥 Quản lý tên",
+                        size=20,
+                        weight=ft.FontWeight.BOLD,
+                        color=ft.Colors.PURPLE_700,
                     ),
                 ]),
-                padding=20,
-                expand=True,
+                ft.Divider(height=10, thickness=2),
+                ft.Row([
+                    name_input_field,
+                    ft.ElevatedButton(
+                        "➕ Thêm",
+                        on_click=add_name_handler,
+                        bgcolor=ft.Colors.GREEN_400,
+                        color=ft.Colors.WHITE,
+                    ),
+                ]),
+                name_status_text,
+                ft.Container(height=10),
+                ft.Text("Danh sách tên:", size=16, weight=ft.FontWeight.BOLD),
+                name_search_field,
+                name_list.view,
+            ], expand=True),
+            padding=20,
+            expand=True,
+        )
+    
+    # Price settings screen
+    price_input_field = ft.TextField(
+        label="Giá tiền mới",
+        hint_text="Nhập giá tiền ăn",
+        keyboard_type=ft.KeyboardType.NUMBER,
+    )
+    effective_date_field = ft.TextField(
+        label="Áp dụng từ ngày",
+        hint_text="DD/MM/YYYY",
+    )
+    price_status_text = ft.Text("", size=14)
+    current_price_display = ft.Text(
+        "",
+        size=20,
+        weight=ft.FontWeight.BOLD,
+        color=ft.Colors.GREEN_700,
+    )
+    history_list = ft.Column(spacing=5)
+    
+    def refresh_price_history():
+        """Refresh the price history display"""
+        history_list.controls.clear()
+        for effective_date, price in reversed(app.get_price_history()):
+            if effective_date == FIRST_DATE:
+                label = "Từ đầu"
+            else:
+                label = "Từ " + datetime.strptime(effective_date, "%Y-%m-%d").strftime("%d/%m/%Y")
+            history_list.controls.append(
+                ft.Text(f"📅 {label}: {price:,} VND", size=16)
             )
-        ])
-        
-        refresh_names()
-        page.update()
     
+    def save_price_handler(e):
+        """Handle saving new price"""
+        new_price = price_input_field.value.strip()
+        try:
+            effective = datetime.strptime(effective_date_field.value.strip(), "%d/%m/%Y")
+        except ValueError:
+            price_status_text.value = "⚠️ Ngày áp dụng không hợp lệ (DD/MM/YYYY)"
+            price_status_text.color = ft.Colors.RED_700
+            update_page()
+            return
+        if app.set_meal_price(new_price, effective.strftime("%Y-%m-%d")):
+            price_status_text.value = (
+                f"✅ Đã cập nhật giá: {int(new_price):,} VND "
+                f"từ {effective.strftime('%d/%m/%Y')}"
+            )
+            price_status_text.color = ft.Colors.GREEN_700
+            current_price_display.value = f"Giá hiện tại: {app.get_meal_price():,} VND"
+            refresh_price_history()
+        else:
+            price_status_text.value = "⚠️ Giá không hợp lệ (phải là số > 0)"
+            price_status_text.color = ft.Colors.RED_700
+        update_page()
+    
+    @timed("show_price_settings")
     def show_price_settings():
         """Show price settings screen"""
+        show_screen("price", build_price_settings)
         current_price = app.get_meal_price()
-        
-        def save_price_handler(e):
-            """Handle saving new price"""
-            new_price = price_input_field.value.strip()
-            if app.set_meal_price(new_price):
-                status_text.value = f"✅ Đã cập nhật giá: {int(new_price):,} VND"
-                status_text.color = ft.Colors.GREEN_700
-                current_price_display.value = f"Giá hiện tại: {app.get_meal_price():,} VND"
-            else:
-                status_text.value = "⚠️ Giá không hợp lệ (phải là số > 0)"
-                status_text.color = ft.Colors.RED_700
-            page.update()
-        
-        price_input_field = ft.TextField(
-            label="Giá tiền mới",
-            hint_text="Nhập giá tiền ăn",
-            keyboard_type=ft.KeyboardType.NUMBER,
-            value=str(current_price),
-        )
-        
-        status_text = ft.Text("", size=14)
-        current_price_display = ft.Text(
-            f"Giá hiện tại: {current_price:,} VND",
-            size=20,
-            weight=ft.FontWeight.BOLD,
-            color=ft.Colors.GREEN_700,
-        )
-        
-        main_container.controls.clear()
-        main_container.controls.extend([
-            ft.Container(
-                content=ft.Column([
-                    ft.Row([
-                        ft.IconButton(
-                            icon=ft.Icons.ARROW_BACK,
-                            on_click=lambda _: show_settings(),
-                        ),
-                        ft.Text(
-                            "💰 Cài đặt tiền ăn",
-                            size=20,
-                            weight=ft.FontWeight.BOLD,
-                            color=ft.Colors.AMBER_700,
-                        ),
-                    ]),
-                    ft.Divider(height=10, thickness=2),
-                    ft.Container(height=20),
-                    current_price_display,
-                    ft.Container(height=30),
-                    price_input_field,
-                    ft.Container(height=10),
-                    ft.ElevatedButton(
-                        "💾 Lưu",
-                        on_click=save_price_handler,
-                        bgcolor=ft.Colors.GREEN_400,
-                        color=ft.Colors.WHITE,
-                        expand=True,
+        current_price_display.value = f"Giá hiện tại: {current_price:,} VND"
+        price_input_field.value = str(current_price)
+        effective_date_field.value = datetime.now().strftime("%d/%m/%Y")
+        price_status_text.value = ""
+        refresh_price_history()
+        update_page()
+    
+    def build_price_settings():
+        """Build the price settings screen"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_BACK,
+                        on_click=lambda _: show_settings(),
+                    ),
+                    ft.Text(
+                        "💰 Cài đặt tiền ăn",
+                        size=20,
+                        weight=ft.FontWeight.BOLD,
+                        color=ft.Colors.AMBER_700,
                     ),
-                    ft.Container(height=10),
-                    status_text,
                 ]),
-                padding=20,
+                ft.Divider(height=10, thickness=2),
+                ft.Container(height=20),
+                current_price_display,
+                ft.Container(height=30),
+                price_input_field,
+                effective_date_field,
+                ft.Container(height=10),
+                ft.ElevatedButton(
+                    "💾 Lưu",
+                    on_click=save_price_handler,
+                    bgcolor=ft.Colors.GREEN_400,
+                    color=ft.Colors.WHITE,
+                    expand=True,
+                ),
+                ft.Container(height=10),
+                price_status_text,
+                ft.Container(height=20),
+                ft.Text("Lịch sử giá:", size=16, weight=ft.FontWeight.BOLD),
+                history_list,
+            ]),
+            padding=20,
+        )
+    
+    # Attendance screen
+    attendance_date_text = ft.Text(
+        "",
+        size=18,
+        weight=ft.FontWeight.BOLD,
+        color=ft.Colors.BLUE_900,
+        text_align=ft.TextAlign.CENTER,
+    )
+    attendance_day = [None]  # "YYYY-MM-DD" shown on the attendance screen
+    
+    def build_checkbox(name):
+        """Build the attendance checkbox for one name"""
+        return ft.Checkbox(
+            label=name,
+            value=False,
+            data={"name": name, "date": None},
+            on_change=lambda e: app.mark_attendance(
+                e.control.data["name"],
+                e.control.data["date"],
+                e.control.value
             )
-        ])
-        page.update()
+        )
+    
+    def fill_checkbox(name, checkbox):
+        """Point a checkbox at the selected date"""
+        checkbox.value = app.get_user_data(name).get(attendance_day[0], False)
+        checkbox.data["date"] = attendance_day[0]
+    
+    attendance_list = LazyRows(build_checkbox, fill_checkbox)
+    attendance_search_field = search_field(lambda: on_attendance_search())
+    attendance_filter = ft.Dropdown(
+        label="Lọc",
+        width=150,
+        options=[
+            ft.dropdown.Option("all", "Tất cả"),
+            ft.dropdown.Option("ate", "Đã ăn"),
+            ft.dropdown.Option("absent", "Chưa ăn"),
+        ],
+        value="all",
+        on_select=lambda _: on_attendance_search(),
+    )
+    
+    def show_attendance_list():
+        """Show names matching the search box and filter"""
+        names = filter_names(app.get_names(), attendance_search_field.value or "")
+        if attendance_filter.value != "all":
+            ate = attendance_filter.value == "ate"
+            names = [
+                name for name in names
+                if app.get_user_data(name).get(attendance_day[0], False) == ate
+            ]
+        attendance_list.show(names)
+    
+    def on_attendance_search():
+        show_attendance_list()
+        update_page()
+    
+    def after_bulk_edit():
+        """Repaint checkboxes after an edit that touched many names"""
+        if attendance_filter.value == "all":
+            attendance_list.refresh()
+        else:
+            show_attendance_list()
+        update_page()
     
+    @timed("mark_all_shown")
+    def mark_all_shown(attended):
+        """Tick or clear everyone matching the search, in one write"""
+        app.mark_many(attendance_list.names, [attendance_day[0]], attended)
+        after_bulk_edit()
+    
+    @timed("copy_previous_day")
+    def copy_previous_day():
+        """Copy who ate on the previous day to the selected day"""
+        previous = (selected_date[0] - timedelta(days=1)).strftime("%Y-%m-%d")
+        app.copy_day(previous, attendance_day[0], attendance_list.names)
+        after_bulk_edit()
+    
+    @timed("show_attendance")
     def show_attendance():
         """Show attendance screen with date selection"""
+        show_screen("attendance", build_attendance)
+        
         # Get selected date
         current_date = selected_date[0]
-        date_str = current_date.strftime("%Y-%m-%d")
-        date_display = format_date_with_weekday(current_date)
+        attendance_day[0] = current_date.strftime("%Y-%m-%d")
+        attendance_date_text.value = format_date_with_weekday(current_date)
         
-        attendance_container.controls.clear()
-        
-        # Create checkboxes for each user for selected date
-        checkboxes = []
-        for name in app.get_names():
-            user_data = app.get_user_data(name)
-            is_checked = user_data.get(date_str, False)
-            
-            checkbox = ft.Checkbox(
-                label=name,
-                value=is_checked,
-                data={"name": name, "date": date_str},
-                on_change=lambda e: app.mark_attendance(
-                    e.control.data["name"],
-                    e.control.data["date"],
-                    e.control.value
-                )
-            )
-            checkboxes.append(checkbox)
-        
-        attendance_container.controls.extend(checkboxes)
-        
-        main_container.controls.clear()
-        main_container.controls.extend([
-            ft.Container(
-                content=ft.Column([
-                    ft.Row([
-                        ft.IconButton(
-                            icon=ft.Icons.ARROW_BACK,
-                            on_click=lambda _: show_home(),
-                        ),
-                        ft.Text(
-                            "Điểm danh",
-                            size=20,
-                            weight=ft.FontWeight.BOLD,
-                            color=ft.Colors.BLUE_700,
-                        ),
-                    ]),
-                    ft.Divider(height=10, thickness=2),
-                    
-                    # Date selection area
-                    ft.Container(
-                        content=ft.Column([
-                            ft.Text(
-                                date_display,
-                                size=18,
-                                weight=ft.FontWeight.BOLD,
-                                color=ft.Colors.BLUE_900,
-                                text_align=ft.TextAlign.CENTER,
-                            ),
-                            ft.Container(height=5),
-                            ft.Row([
-                                ft.IconButton(
-                                    icon=ft.Icons.ARROW_BACK_IOS,
-                                    icon_size=20,
-                                    on_click=lambda _: change_date(-1),
-                                    tooltip="Ngày trước",
-                                ),
-                                ft.ElevatedButton(
-                                    "📅 Chọn ngày",
-                                    icon=ft.Icons.CALENDAR_MONTH,
-                                    on_click=lambda _: date_picker.pick_date(),
-                                    bgcolor=ft.Colors.ORANGE_300,
-                                ),
-                                ft.IconButton(
-                                    icon=ft.Icons.ARROW_FORWARD_IOS,
-                                    icon_size=20,
-                                    on_click=lambda _: change_date(1),
-                                    tooltip="Ngày sau",
-                                ),
-                            ], alignment=ft.MainAxisAlignment.CENTER),
-                        ]),
-                        bgcolor=ft.Colors.BLUE_50,
-                        padding=15,
-                        border_radius=10,
-                        border=ft.border.all(2, ft.Colors.BLUE_200),
+        # Only the first batch of checkboxes is filled; the rest on scroll
+        show_attendance_list()
+        update_page()
+    
+    def build_attendance():
+        """Build the attendance screen"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_BACK,
+                        on_click=lambda _: show_home(),
                     ),
-                    
-                    ft.Container(height=10),
-                    ft.Text("Chọn người ăn:", size=16, weight=ft.FontWeight.BOLD),
-                    ft.Container(
-                        content=attendance_container,
-                        expand=True,
+                    ft.Text(
+                        "Điểm danh",
+                        size=20,
+                        weight=ft.FontWeight.BOLD,
+                        color=ft.Colors.BLUE_700,
                     ),
                 ]),
-                padding=20,
-                expand=True,
-            )
-        ])
-        page.update()
+                ft.Divider(height=10, thickness=2),
+                
+                # Date selection area
+                ft.Container(
+                    content=ft.Column([
+                        attendance_date_text,
+                        ft.Container(height=5),
+                        ft.Row([
+                            ft.IconButton(
+                                icon=ft.Icons.ARROW_BACK_IOS,
+                                icon_size=20,
+                                on_click=lambda _: change_date(-1),
+                                tooltip="Ngày trước",
+                            ),
+                            ft.ElevatedButton(
+                                "📅 Chọn ngày",
+                                icon=ft.Icons.CALENDAR_MONTH,
+                                on_click=lambda _: date_picker.pick_date(),
+                                bgcolor=ft.Colors.ORANGE_300,
+                            ),
+                            ft.IconButton(
+                                icon=ft.Icons.ARROW_FORWARD_IOS,
+                                icon_size=20,
+                                on_click=lambda _: change_date(1),
+                                tooltip="Ngày sau",
+                            ),
+                        ], alignment=ft.MainAxisAlignment.CENTER),
+                    ]),
+                    bgcolor=ft.Colors.BLUE_50,
+                    padding=15,
+                    border_radius=10,
+                    border=ft.border.all(2, ft.Colors.BLUE_200),
+                ),
+                
+                ft.Container(height=10),
+                ft.Text("Chọn người ăn:", size=16, weight=ft.FontWeight.BOLD),
+                ft.Row([
+                    ft.Container(content=attendance_search_field, expand=True),
+                    attendance_filter,
+                ]),
+                ft.Row([
+                    ft.TextButton(
+                        "☑️ Chọn tất cả",
+                        on_click=lambda _: mark_all_shown(True),
+                    ),
+                    ft.TextButton(
+                        "✖️ Bỏ chọn tất cả",
+                        on_click=lambda _: mark_all_shown(False),
+                    ),
+                    ft.TextButton(
+                        "📋 Như hôm qua",
+                        on_click=lambda _: copy_previous_day(),
+                    ),
+                ], wrap=True),
+                attendance_list.view,
+            ], expand=True),
+            padding=20,
+            expand=True,
+        )
     
+    @timed("change_date")
     def change_date(delta):
         """Change selected date by delta days"""
         selected_date[0] = selected_date[0] + timedelta(days=delta)
         show_attendance()
     
-    def show_report():
-        """Show monthly report for all users"""
+    # Month grid screen: one row per user, one cell per day
+    GRID_NAME_WIDTH = 110
+    GRID_CELL = 30
+    grid_month = [datetime.now().year, datetime.now().month]
+    grid_bits = {}  # {name: month bits} from one get_month_grid call
+    grid_title = ft.Text(
+        "",
+        size=18,
+        weight=ft.FontWeight.BOLD,
+        color=ft.Colors.INDIGO_700,
+    )
+    
+    def grid_cell_color(attended, day):
+        """Green when eaten, grey on weekends, white otherwise"""
+        if attended:
+            return ft.Colors.GREEN_400
+        year, month = grid_month
+        if calendar.weekday(year, month, day) >= 5:
+            return ft.Colors.GREY_200
+        return ft.Colors.WHITE
+    
+    def build_grid_row(name):
+        """Build a user's row with 31 day cells; fill_grid_row hides extras"""
+        cells = [
+            ft.Container(
+                content=ft.Text(str(day), size=11),
+                width=GRID_CELL,
+                height=GRID_CELL,
+                alignment=ft.Alignment.CENTER,
+                border=ft.border.all(1, ft.Colors.GREY_300),
+                data={"name": name, "day": day},
+                on_click=lambda e: toggle_grid_cell(e.control),
+            )
+            for day in range(1, 32)
+        ]
+        return ft.Row(
+            [ft.Text(name, width=GRID_NAME_WIDTH, no_wrap=True)] + cells,
+            spacing=0,
+        )
+    
+    def fill_grid_row(name, row):
+        """Colour a row's cells from its month bits"""
+        days_in_month = calendar.monthrange(*grid_month)[1]
+        bits = grid_bits.get(name, 0)
+        for day, cell in enumerate(row.controls[1:], start=1):
+            cell.visible = day <= days_in_month
+            if cell.visible:
+                cell.bgcolor = grid_cell_color((bits >> (day - 1)) & 1, day)
+    
+    grid_list = LazyRows(build_grid_row, fill_grid_row, spacing=0)
+    grid_search_field = search_field(lambda: on_grid_search())
+    grid_header = ft.Row(spacing=0)
+    
+    def grid_date(day):
+        year, month = grid_month
+        return f"{year:04d}-{month:02d}-{day:02d}"
+    
+    @timed("toggle_grid_cell")
+    def toggle_grid_cell(cell):
+        """Flip one day for one user and repaint only that cell"""
+        name, day = cell.data["name"], cell.data["day"]
+        bits = grid_bits.get(name, 0)
+        bit = 1 << (day - 1)
+        attended = not bits & bit
+        # Set (not flipped) before the commit, whose repaint may rebuild
+        # grid_bits from the store; both then agree on the new value
+        grid_bits[name] = bits | bit if attended else bits & ~bit
+        cell.bgcolor = grid_cell_color(attended, day)
+        app.mark_attendance(name, grid_date(day), attended)
+        cell.update()
+    
+    def on_grid_search():
+        grid_list.show(filter_names(app.get_names(), grid_search_field.value or ""))
+        update_page()
+    
+    def load_grid():
+        """Fetch the whole month in one call and redraw the visible rows"""
+        year, month = grid_month
+        grid_title.value = f"Tháng {month}/{year}"
+        days_in_month = calendar.monthrange(year, month)[1]
+        grid_bits.clear()
+        grid_bits.update(app.get_month_grid(year, month))
+        grid_header.controls = [ft.Container(width=GRID_NAME_WIDTH)] + [
+            ft.Container(
+                content=ft.Text(
+                    WEEKDAY_INITIALS[calendar.weekday(year, month, day)],
+                    size=10,
+                    weight=ft.FontWeight.BOLD,
+                ),
+                width=GRID_CELL,
+                alignment=ft.Alignment.CENTER,
+            )
+            for day in range(1, days_in_month + 1)
+        ]
+        grid_list.show(filter_names(app.get_names(), grid_search_field.value or ""))
+    
+    @timed("change_grid_month")
+    def change_grid_month(delta):
+        year, month = grid_month
+        month += delta
+        if month == 0:
+            year, month = year - 1, 12
+        elif month == 13:
+            year, month = year + 1, 1
+        grid_month[:] = [year, month]
+        load_grid()
+        update_page()
+    
+    @timed("show_month_grid")
+    def show_month_grid():
+        """Show the month grid for the month chosen on the home screen"""
+        show_screen("grid", build_month_grid)
+        grid_month[:] = [int(year_input.value), int(month_dropdown.value)]
+        load_grid()
+        update_page()
+    
+    def build_month_grid():
+        """Build the month grid screen"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_BACK,
+                        on_click=lambda _: show_home(),
+                    ),
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_BACK_IOS,
+                        icon_size=20,
+                        tooltip="Tháng trước",
+                        on_click=lambda _: change_grid_month(-1),
+                    ),
+                    grid_title,
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_FORWARD_IOS,
+                        icon_size=20,
+                        tooltip="Tháng sau",
+                        on_click=lambda _: change_grid_month(1),
+                    ),
+                ]),
+                grid_search_field,
+                ft.Text("Chạm vào ô để đánh dấu / bỏ đánh dấu", size=12, color=ft.Colors.GREY_600),
+                # Wide grid scrolls sideways as a whole, the list scrolls down
+                ft.Row([
+                    ft.Container(
+                        content=ft.Column(
+                            [grid_header, grid_list.view],
+                            spacing=0,
+                            expand=True,
+                        ),
+                        width=GRID_NAME_WIDTH + 31 * GRID_CELL,
+                    ),
+                ],
+                    scroll="auto",
+                    expand=True,
+                    vertical_alignment=ft.CrossAxisAlignment.STRETCH,
+                ),
+            ], expand=True),
+            padding=20,
+            expand=True,
+        )
+    
+    # Monthly report screen
+    report_title = ft.Text(
+        "",
+        size=20,
+        weight=ft.FontWeight.BOLD,
+        color=ft.Colors.BLUE_700,
+    )
+    report_total_text = ft.Text(
+        "",
+        size=22,
+        weight=ft.FontWeight.BOLD,
+        color=ft.Colors.RED_700,
+    )
+    # Each month's report keeps its numbers and its own list of rows, so
+    # going back to a month unchanged since shows it without rebuilding
+    report_cache = [None]  # ReportCache, created once the app is loaded
+    report_shown = [None]  # cached entry on screen
+    report_list_holder = ft.Container(expand=True)
+    
+    def build_report_row(name):
+        """Build the report card for one user; texts are filled in later"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Text(f"👤 {name}", size=18, weight=ft.FontWeight.BOLD),
+                ft.Text("", size=16),
+                ft.Text(
+                    "",
+                    size=16,
+                    weight=ft.FontWeight.BOLD,
+                    color=ft.Colors.GREEN_700,
+                ),
+            ]),
+            padding=15,
+            bgcolor=ft.Colors.BLUE_50,
+            border_radius=10,
+            border=ft.border.all(2, ft.Colors.BLUE_200),
+            margin=ft.margin.only(bottom=10),
+        )
+    
+    def fill_report_row(name, row):
+        days_attended, total_cost = report_shown[0]['values'][name]
+        _, days_text, cost_text = row.content.controls
+        days_text.value = f"Số ngày ăn: {days_attended} ngày"
+        cost_text.value = f"Tổng tiền: {total_cost:,} VND"
+    
+    report_search_field = search_field(lambda: on_report_search())
+    
+    def on_report_search():
+        entry = report_shown[0]
+        query = report_search_field.value or ""
+        # Rows already filled for this search are shown as they are
+        if entry['query'] != query:
+            entry['query'] = query
+            entry['rows'].show(filter_names(entry['values'], query))
+        update_page()
+    
+    def compute_report_entry(month, year):
+        rows, total_all_users = monthly_report(app, month, year)
+        return {
+            'values': {name: (days, cost) for name, days, cost in rows},
+            'total': total_all_users,
+            'rows': None,  # LazyRows, built on the event loop when shown
+            'query': None,
+        }
+    
+    def report_request():
+        """(month, year, cache key, months) of the report chosen"""
         month = int(month_dropdown.value)
         year = int(year_input.value)
-        
-        report_container.controls.clear()
-        
-        # Create report for each user
-        user_reports = []
-        total_all_users = 0
-        
-        for name in app.get_names():
-            days_attended, total_cost = app.get_monthly_report(name, month, year)
-            total_all_users += total_cost
-            
-            user_reports.append(
+        if report_cache[0] is None:
+            report_cache[0] = ReportCache(app)
+        start = date(year, month, 1)
+        end = date(year, month, calendar.monthrange(year, month)[1])
+        key, months = report_key(app, "month", start, end, app.get_names())
+        return month, year, key, months
+    
+    def report_entry(request):
+        """The report's cached entry, computed if stale; safe off the loop"""
+        month, year, key, months = request
+        return report_cache[0].get_or_compute(
+            key, months, lambda: compute_report_entry(month, year)
+        )
+    
+    def show_report_entry(request, entry):
+        month, year, _, _ = request
+        report_title.value = f"BÁO CÁO THÁNG {month}/{year}"
+        if entry['rows'] is None:
+            entry['rows'] = LazyRows(build_report_row, fill_report_row)
+        report_shown[0] = entry
+        report_list_holder.content = entry['rows'].view
+        report_total_text.value = f"{entry['total']:,} VND"
+        on_report_search()
+    
+    @timed("show_report")
+    def show_report():
+        """Show monthly report for all users"""
+        show_screen("report", build_report)
+        request = report_request()
+        show_report_entry(request, report_entry(request))
+    
+    def build_report():
+        """Build the monthly report screen"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_BACK,
+                        on_click=lambda _: show_home(),
+                    ),
+                    report_title,
+                ]),
+                ft.Divider(height=20, thickness=2),
+                report_search_field,
+                report_list_holder,
+                
+                # Total summary at bottom
                 ft.Container(
                     content=ft.Column([
-                        ft.Text(f"👤 {name}", size=18, weight=ft.FontWeight.BOLD),
-                        ft.Text(f"Số ngày ăn: {days_attended} ngày", size=16),
                         ft.Text(
-                            f"Tổng tiền: {total_cost:,} VND",
-                            size=16,
+                            "TỔNG TẤT CẢ",
+                            size=18,
                             weight=ft.FontWeight.BOLD,
-                            color=ft.Colors.GREEN_700,
+                            color=ft.Colors.BLUE_900,
                         ),
+                        report_total_text,
                     ]),
                     padding=15,
-                    bgcolor=ft.Colors.BLUE_50,
+                    bgcolor=ft.Colors.AMBER_50,
                     border_radius=10,
-                    border=ft.border.all(2, ft.Colors.BLUE_200),
-                    margin=ft.margin.only(bottom=10),
-                )
+                    border=ft.border.all(3, ft.Colors.AMBER_400),
+                ),
+            ], expand=True),
+            padding=20,
+            expand=True,
+        )
+    
+    # Yearly / quarterly / custom range report screen
+    today = datetime.now()
+    period_dropdown = ft.Dropdown(
+        label="Kỳ báo cáo",
+        width=150,
+        options=[ft.dropdown.Option("year", "Cả năm")]
+        + [ft.dropdown.Option(str(q), f"Quý {q}") for q in range(1, 5)]
+        + [ft.dropdown.Option("custom", "Tùy chọn")],
+        value="year",
+        on_select=lambda _: on_period_change(),
+    )
+    range_year_input = ft.TextField(
+        label="Năm",
+        value=str(today.year),
+        width=150,
+        keyboard_type=ft.KeyboardType.NUMBER,
+    )
+    from_input = ft.TextField(
+        label="Từ ngày",
+        value=f"01/01/{today.year}",
+        width=150,
+    )
+    to_input = ft.TextField(
+        label="Đến ngày",
+        value=today.strftime("%d/%m/%Y"),
+        width=150,
+    )
+    custom_row = ft.Row([from_input, to_input], spacing=10, visible=False)
+    range_status_text = ft.Text("", size=14, color=ft.Colors.GREY_700)
+    range_state = [None, []]  # RangeReport on screen and its month labels
+    range_month_totals = ft.Column(spacing=2)
+    range_total_text = ft.Text(
+        "",
+        size=22,
+        weight=ft.FontWeight.BOLD,
+        color=ft.Colors.RED_700,
+    )
+    
+    def build_range_row(name):
+        """Build the range report card for one user; texts are filled in later"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Text(f"👤 {name}", size=18, weight=ft.FontWeight.BOLD),
+                ft.Text("", size=13, color=ft.Colors.GREY_700),
+                ft.Text("", size=16),
+                ft.Text(
+                    "",
+                    size=16,
+                    weight=ft.FontWeight.BOLD,
+                    color=ft.Colors.GREEN_700,
+                ),
+            ]),
+            padding=15,
+            bgcolor=ft.Colors.BLUE_50,
+            border_radius=10,
+            border=ft.border.all(2, ft.Colors.BLUE_200),
+            margin=ft.margin.only(bottom=10),
+        )
+    
+    def fill_range_row(name, row):
+        report, month_labels = range_state
+        _, months_text, days_text, cost_text = row.content.controls
+        months_text.value = " · ".join(
+            f"{label}: {days}" for label, days in zip(month_labels, report.days[name])
+        )
+        days_text.value = f"Số ngày ăn: {report.user_days(name)} ngày"
+        cost_text.value = f"Tổng tiền: {report.user_cost(name):,} VND"
+    
+    range_list = LazyRows(build_range_row, fill_range_row)
+    range_search_field = search_field(lambda: on_range_search())
+    
+    def on_range_search():
+        if range_state[0] is not None:
+            range_list.show(
+                filter_names(range_state[0].names, range_search_field.value or "")
             )
+        update_page()
+    
+    def parse_day(value):
+        return datetime.strptime(value.strip(), "%d/%m/%Y").date()
+    
+    def range_request():
+        """(start, end) of the period chosen, or None after saying why not"""
+        if period_dropdown.value == "custom":
+            try:
+                start, end = parse_day(from_input.value), parse_day(to_input.value)
+            except ValueError:
+                range_status_text.value = "⚠️ Ngày không hợp lệ (DD/MM/YYYY)"
+                update_page()
+                return None
+        else:
+            try:
+                year = int(range_year_input.value)
+                if period_dropdown.value == "year":
+                    start, end = year_range(year)
+                else:
+                    start, end = quarter_range(year, int(period_dropdown.value))
+            except ValueError:
+                range_status_text.value = "⚠️ Năm không hợp lệ"
+                update_page()
+                return None
+        if start > end:
+            range_status_text.value = "⚠️ Ngày bắt đầu phải trước ngày kết thúc"
+            update_page()
+            return None
+        return start, end
+    
+    def range_report_for(request):
+        return range_report(app, *request)
+    
+    @timed("compute_range_report")
+    def compute_range_report():
+        """Recompute the range report for the chosen period"""
+        request = range_request()
+        if request is not None:
+            show_range_result(request, range_report_for(request))
+    
+    def show_range_result(request, report):
+        start, end = request
+        range_status_text.value = (
+            f"Từ {start.strftime('%d/%m/%Y')} đến {end.strftime('%d/%m/%Y')}"
+        )
+        month_labels = [f"T{month}" for _, month in report.months]
+        range_state[:] = [report, month_labels]
         
-        report_container.controls.extend(user_reports)
-        
-        # Add total summary at bottom
-        report_container.controls.append(
-            ft.Container(
-                content=ft.Column([
-                    ft.Text(
-                        f"TỔNG TẤT CẢ",
-                        size=18,
-                        weight=ft.FontWeight.BOLD,
-                        color=ft.Colors.BLUE_900,
+        month_texts = range_month_totals.controls
+        while len(month_texts) < len(month_labels):
+            month_texts.append(ft.Text("", size=14))
+        del month_texts[len(month_labels):]
+        for i, label in enumerate(month_labels):
+            month_texts[i].value = (
+                f"{label}: {report.month_days(i)} suất - {report.month_cost(i):,} VND"
+            )
+        range_total_text.value = f"{report.total_cost:,} VND"
+        on_range_search()
+    
+    def on_period_change():
+        custom_row.visible = period_dropdown.value == "custom"
+        compute_range_report()
+    
+    @timed("show_range_report")
+    def show_range_report():
+        """Show yearly, quarterly or custom range report for all users"""
+        show_screen("range_report", build_range_report)
+        compute_range_report()
+    
+    def build_range_report():
+        """Build the range report screen"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_BACK,
+                        on_click=lambda _: show_home(),
                     ),
                     ft.Text(
-                        f"{total_all_users:,} VND",
-                        size=22,
+                        "📈 Báo cáo năm / quý",
+                        size=20,
                         weight=ft.FontWeight.BOLD,
-                        color=ft.Colors.RED_700,
+                        color=ft.Colors.TEAL_700,
                     ),
                 ]),
-                padding=15,
-                bgcolor=ft.Colors.AMBER_50,
-                border_radius=10,
-                border=ft.border.all(3, ft.Colors.AMBER_400),
+                ft.Divider(height=20, thickness=2),
+                ft.Row([
+                    period_dropdown,
+                    range_year_input,
+                    ft.IconButton(
+                        icon=ft.Icons.REFRESH,
+                        tooltip="Xem",
+                        on_click=lambda _: compute_range_report(),
+                    ),
+                ], spacing=10),
+                custom_row,
+                range_status_text,
+                range_search_field,
+                range_list.view,
+                ft.Container(
+                    content=ft.Column([
+                        ft.Text(
+                            "TỔNG TẤT CẢ",
+                            size=18,
+                            weight=ft.FontWeight.BOLD,
+                            color=ft.Colors.BLUE_900,
+                        ),
+                        range_month_totals,
+                        range_total_text,
+                    ]),
+                    padding=15,
+                    bgcolor=ft.Colors.AMBER_50,
+                    border_radius=10,
+                    border=ft.border.all(3, ft.Colors.AMBER_400),
+                ),
+            ], expand=True),
+            padding=20,
+            expand=True,
+        )
+    
+    # Analytics screen: streaks, weekdays, participation and trends
+    analytics = [None]  # Analytics, created once the app is loaded
+    analytics_state = [None]  # Overview on screen
+    analytics_year_input = ft.TextField(
+        label="Năm",
+        value=str(today.year),
+        width=150,
+        keyboard_type=ft.KeyboardType.NUMBER,
+    )
+    analytics_status_text = ft.Text("", size=14, color=ft.Colors.GREY_700)
+    analytics_weekday_totals = ft.Column(spacing=2)
+    analytics_month_totals = ft.Column(spacing=2)
+    
+    def build_analytics_row(name):
+        """Build the analytics card for one user; texts are filled in later"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Text(f"👤 {name}", size=18, weight=ft.FontWeight.BOLD),
+                ft.Text("", size=16),
+                ft.Text("", size=14, color=ft.Colors.DEEP_ORANGE_700),
+                ft.Text("", size=13, color=ft.Colors.GREY_700),
+            ]),
+            padding=15,
+            bgcolor=ft.Colors.PURPLE_50,
+            border_radius=10,
+            border=ft.border.all(2, ft.Colors.PURPLE_200),
+            margin=ft.margin.only(bottom=10),
+        )
+    
+    def trend_text(now, before):
+        if now > before:
+            return f"↑ {now - before}"
+        if now < before:
+            return f"↓ {before - now}"
+        return "="
+    
+    def fill_analytics_row(name, row):
+        overview = analytics_state[0]
+        person = overview.people[name]
+        _, days_text, streak_text, trend = row.content.controls
+        days_text.value = (
+            f"Số ngày ăn: {person.days} ngày · Tham gia {person.rate:.0%}"
+        )
+        streak_text.value = (
+            f"🔥 Chuỗi hiện tại: {person.current_streak} ngày · "
+            f"Dài nhất: {person.longest_streak} ngày"
+        )
+        month = overview.month
+        previous = month - 1 if month > 1 else 12
+        trend.value = (
+            f"T{month}: {person.month} ngày "
+            f"({trend_text(person.month, person.previous_month)} so với T{previous})"
+        )
+    
+    analytics_list = LazyRows(build_analytics_row, fill_analytics_row)
+    analytics_search_field = search_field(lambda: on_analytics_search())
+    
+    def on_analytics_search():
+        if analytics_state[0] is not None:
+            analytics_list.show(
+                filter_names(analytics_state[0].names, analytics_search_field.value or "")
             )
+        update_page()
+    
+    def set_lines(column, lines):
+        """Show lines as the texts of column, reusing its Text controls"""
+        texts = column.controls
+        while len(texts) < len(lines):
+            texts.append(ft.Text("", size=14))
+        del texts[len(lines):]
+        for text, line in zip(texts, lines):
+            text.value = line
+    
+    def analytics_request():
+        """The year chosen, or None after saying it is invalid"""
+        try:
+            year = int(analytics_year_input.value)
+        except ValueError:
+            analytics_status_text.value = "⚠️ Năm không hợp lệ"
+            update_page()
+            return None
+        if analytics[0] is None:
+            analytics[0] = Analytics(app)
+        return year
+    
+    def analytics_overview(year):
+        return analytics[0].overview(year)
+    
+    @timed("compute_analytics")
+    def compute_analytics():
+        """Recompute the analytics of the chosen year"""
+        year = analytics_request()
+        if year is not None:
+            show_overview(year, analytics_overview(year))
+    
+    def show_overview(year, overview):
+        analytics_state[0] = overview
+        analytics_status_text.value = (
+            f"Năm {year}: {overview.days} suất · "
+            f"Tỷ lệ tham gia ngày làm việc: {overview.rate:.0%}"
         )
-        
-        main_container.controls.clear()
-        main_container.controls.extend([
-            ft.Container(
-                content=ft.Column([
-                    ft.Row([
-                        ft.IconButton(
-                            icon=ft.Icons.ARROW_BACK,
-                            on_click=lambda _: show_home(),
+        total = sum(overview.weekdays)
+        set_lines(analytics_weekday_totals, [
+            f"{WEEKDAYS_VN[day]}: {count} suất"
+            + (f" ({count / total:.0%})" if total else "")
+            for day, count in enumerate(overview.weekdays)
+        ])
+        month_lines = []
+        for i, count in enumerate(overview.months[:overview.month]):
+            change = overview.month_change(i)
+            month_lines.append(
+                f"T{i + 1}: {count} suất" + ("" if change is None else f" ({change:+.0%})")
+            )
+        set_lines(analytics_month_totals, month_lines)
+        on_analytics_search()
+    
+    @timed("show_analytics")
+    def show_analytics():
+        """Show attendance analytics for all users"""
+        show_screen("analytics", build_analytics)
+        compute_analytics()
+    
+    def build_analytics():
+        """Build the analytics screen"""
+        return ft.Container(
+            content=ft.Column([
+                ft.Row([
+                    ft.IconButton(
+                        icon=ft.Icons.ARROW_BACK,
+                        on_click=lambda _: show_home(),
+                    ),
+                    ft.Text(
+                        "📉 Thống kê điểm danh",
+                        size=20,
+                        weight=ft.FontWeight.BOLD,
+                        color=ft.Colors.PURPLE_700,
+                    ),
+                ]),
+                ft.Divider(height=20, thickness=2),
+                ft.Row([
+                    analytics_year_input,
+                    ft.IconButton(
+                        icon=ft.Icons.REFRESH,
+                        tooltip="Xem",
+                        on_click=lambda _: compute_analytics(),
+                    ),
+                ], spacing=10),
+                analytics_status_text,
+                analytics_search_field,
+                analytics_list.view,
+                ft.Container(
+                    content=ft.Column([
+                        ft.Text(
+                            "THEO THỨ",
+                            size=18,
+                            weight=ft.FontWeight.BOLD,
+                            color=ft.Colors.BLUE_900,
                         ),
+                        analytics_weekday_totals,
                         ft.Text(
-                            f"BÁO CÁO THÁNG {month}/{year}",
-                            size=20,
+                            "THEO THÁNG",
+                            size=18,
                             weight=ft.FontWeight.BOLD,
-                            color=ft.Colors.BLUE_700,
+                            color=ft.Colors.BLUE_900,
                         ),
+                        analytics_month_totals,
                     ]),
-                    ft.Divider(height=20, thickness=2),
-                    report_container,
-                ]),
-                padding=20,
-            )
-        ])
-        page.update()
+                    padding=15,
+                    bgcolor=ft.Colors.AMBER_50,
+                    border_radius=10,
+                    border=ft.border.all(3, ft.Colors.AMBER_400),
+                ),
+            ], expand=True),
+            padding=20,
+            expand=True,
+        )
+    
+    # Edits from other sessions (or a reload after another process wrote
+    # the files) arrive here; only the screen on display is repainted
+    def on_data_change(record):
+        page.loop.call_soon_threadsafe(repaint_after_change, record)
+    
+    @timed("repaint_after_change")
+    def repaint_after_change(record):
+        screen = current_screen[0]
+        if record['op'] == 'mark' and screen == "attendance":
+            if record['date'] != attendance_day[0]:
+                return
+            checkbox = attendance_list.rows.get(app.user_name(record['user']))
+            if checkbox is None or checkbox.value == record['value']:
+                return
+            checkbox.value = record['value']
+            update_page()
+        elif screen == "attendance" and record['op'] in ('mark_many', 'batch', 'sync'):
+            after_bulk_edit()
+        elif screen == "attendance":
+            show_attendance_list()
+            update_page()
+        elif screen == "grid" and record['op'] == 'mark':
+            year, month = grid_month
+            if record['date'][:7] != f"{year:04d}-{month:02d}":
+                return
+            day = int(record['date'][8:10])
+            name = app.user_name(record['user'])
+            bits = grid_bits.get(name, 0)
+            if ((bits >> (day - 1)) & 1) == bool(record['value']):
+                return
+            grid_bits[name] = bits ^ (1 << (day - 1))
+            row = grid_list.rows.get(name)
+            if row is not None:
+                row.controls[day].bgcolor = grid_cell_color(record['value'], day)
+            update_page()
+        elif screen == "grid":
+            grid_bits.update(app.get_month_grid(*grid_month))
+            grid_list.refresh()
+            update_page()
+        elif screen == "names" and record['op'] != 'mark':
+            on_name_search()
+        elif screen == "price" and record['op'] in ('meal_price', 'reload'):
+            current_price_display.value = f"Giá hiện tại: {app.get_meal_price():,} VND"
+            refresh_price_history()
+            update_page()
+        elif screen in recomputed_screens:
+            schedule_recompute()
     
-    # Initialize with splash screen
+    # Report screens computed again after edits elsewhere, as (read what
+    # is asked on the loop, compute it on a worker thread, show it)
+    recomputed_screens = {
+        "report": (report_request, report_entry, show_report_entry),
+        "range_report": (range_request, range_report_for, show_range_result),
+        "analytics": (analytics_request, analytics_overview, show_overview),
+    }
+    recompute_pending = [None]  # task waiting for edits to pause
+    
+    def schedule_recompute():
+        """Recompute the screen on display once edits pause, off the loop"""
+        if recompute_pending[0] is None:
+            recompute_pending[0] = asyncio.create_task(recompute_screen())
+    
+    async def recompute_screen():
+        await asyncio.sleep(RECOMPUTE_DELAY)
+        # Edits arriving from here on schedule another round
+        recompute_pending[0] = None
+        screen = current_screen[0]
+        if screen not in recomputed_screens:
+            return
+        read_request, compute, show = recomputed_screens[screen]
+        request = read_request()
+        if request is None:
+            return
+        result = await asyncio.to_thread(compute, request)
+        # The user may have moved on meanwhile and repainted it themselves
+        if current_screen[0] == screen and read_request() == request:
+            show(request, result)
+    
+    # Initialize with splash screen, load data behind it
     page.add(main_container)
     show_splash()
+    mark_phase("splash")
+    
+    app = await asyncio.to_thread(get_shared_app, page.loop)
+    app.subscribe(on_data_change)
+    mark_phase("load_data")
+    
+    remaining = SPLASH_MIN_SECONDS - (time.perf_counter() - startup_start)
+    if remaining > 0:
+        await asyncio.sleep(remaining)
+    mark_phase("splash_wait")
+    
+    show_home()
+    mark_phase("home")
+    STARTUP_TIMINGS["total"] = time.perf_counter() - startup_start
+    logging.getLogger(__name__).debug("Startup: " + ", ".join(
+        f"{phase}={seconds * 1000:.0f}ms" for phase, seconds in STARTUP_TIMINGS.items()
+    ))
 
 if __name__ == "__main__":
     ft.run(main)